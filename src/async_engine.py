@@ -0,0 +1,214 @@
+"""Insert/delete/flush through AsyncMilvusClient, keeping up to `concurrency` requests in flight
+from one event loop instead of one thread per request.
+
+python -m src.async_engine -c test1 -s 1024 --concurrency 256
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Iterable
+
+import pymilvus
+from pydantic import BaseModel
+from pymilvus import AsyncMilvusClient, CollectionSchema
+
+from .common_func import estimate_count_by_size
+from .data_utils import gen_rows
+from .generate_segment import split_size
+from .metrics import add_metrics_args, registry, setup_metrics
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+
+class AsyncEngineStats(BaseModel):
+    requests: int = 0
+    rows: int = 0
+    deleted: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    duration: float = 0.0
+
+    def __str__(self):
+        rate = self.rows / self.duration if self.duration > 0 else 0.0
+        return (
+            f"{self.requests} requests, {self.rows} rows inserted, {self.deleted} rows deleted "
+            f"in {self.duration:.2f}s, {rate:.0f} rows/s, max in flight {self.max_in_flight}"
+        )
+
+
+async def _staged(name: str, coro: Awaitable, rows: int = 0):
+    """Time the request itself, not the wait for a slot"""
+    with registry.stage(name, rows=rows):
+        return await coro
+
+
+class AsyncInsertEngine:
+    """Usage:
+    async with AsyncInsertEngine("coll", concurrency=256, uri=...) as engine:
+        pks = await engine.insert_stream(schema, 1024 * 1024 * 1024)
+        await engine.flush()
+
+    The first failed request cancels the ones still in flight and is raised to the caller.
+    """
+
+    def __init__(self, collection_name: str, concurrency: int = 64, **connection_config):
+        self.collection_name = collection_name
+        self.concurrency = concurrency
+        self.connection_config = connection_config
+        self.stats = AsyncEngineStats()
+        self.client: AsyncMilvusClient | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    async def __aenter__(self):
+        self.client = AsyncMilvusClient(**self.connection_config)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.close()
+        self.client = None
+
+    async def _request(self, coro: Awaitable, slot_acquired: bool = False):
+        if not slot_acquired:
+            await self._slots.acquire()
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+        try:
+            return await coro
+        finally:
+            self.stats.in_flight -= 1
+            self._slots.release()
+
+    async def schema(self) -> CollectionSchema:
+        desc = await self.client.describe_collection(self.collection_name)
+        return CollectionSchema.construct_from_dict(desc)
+
+    async def insert(self, data: list[dict]) -> list:
+        rt = await self._request(
+            _staged("insert", self.client.insert(self.collection_name, data), rows=len(data))
+        )
+        self.stats.rows += rt["insert_count"]
+        return list(rt["ids"])
+
+    async def delete(self, expr: str) -> int:
+        rt = await self._request(
+            _staged("delete", self.client.delete(self.collection_name, filter=expr))
+        )
+        self.stats.deleted += rt["delete_count"]
+        return rt["delete_count"]
+
+    async def flush(self):
+        with registry.stage("flush"):
+            await self.client.flush(self.collection_name)
+
+    async def _gather(self, make_coros: Iterable[Awaitable]) -> list:
+        """Run the coroutines with at most `concurrency` in flight, results in input order.
+
+        A slot is taken before each coroutine is scheduled, so a lazy iterable is only pulled
+        as fast as requests complete.
+        """
+        tasks: list[asyncio.Task] = []
+        failed: list[asyncio.Task] = []
+
+        def on_done(t: asyncio.Task):
+            if not t.cancelled() and t.exception() is not None:
+                failed.append(t)
+
+        start = time.perf_counter()
+        try:
+            for coro in make_coros:
+                try:
+                    await self._slots.acquire()
+                    if failed:
+                        self._slots.release()
+                        raise failed[0].exception()
+                except BaseException:
+                    coro.close()
+                    raise
+                task = asyncio.create_task(self._request(coro, slot_acquired=True))
+                task.add_done_callback(on_done)
+                tasks.append(task)
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self.stats.duration += time.perf_counter() - start
+
+    async def insert_batches(self, batches: Iterable[list[dict]]) -> list[list]:
+        async def _insert(data: list[dict]) -> list:
+            with registry.stage("insert", rows=len(data)):
+                rt = await self.client.insert(self.collection_name, data)
+            self.stats.rows += rt["insert_count"]
+            return list(rt["ids"])
+
+        return await self._gather(_insert(data) for data in batches)
+
+    async def insert_stream(
+        self,
+        schema: pymilvus.CollectionSchema,
+        size: int,
+        partition_key: int | None = None,
+    ) -> list[list]:
+        """Insert `size`(Bytes) of generated rows in 5MB batches"""
+
+        async def _gen_insert(batch_size: int, start_id: int) -> list:
+            count = estimate_count_by_size(batch_size, schema)
+            with registry.stage("generate", rows=count, nbytes=batch_size):
+                data = await asyncio.to_thread(gen_rows, schema, count, start_id, partition_key)
+            with registry.stage("insert", rows=count, nbytes=batch_size):
+                rt = await self.client.insert(self.collection_name, data)
+            self.stats.rows += rt["insert_count"]
+            return list(rt["ids"])
+
+        def _coros():
+            start_id = 0
+            for batch_size in split_size(size):
+                yield _gen_insert(batch_size, start_id)
+                start_id += estimate_count_by_size(batch_size, schema)
+
+        pks = await self._gather(_coros())
+        logger.info(f"Async insert {self.collection_name}: {self.stats}")
+        return pks
+
+    async def delete_many(self, exprs: Iterable[str]) -> int:
+        async def _delete(expr: str) -> int:
+            with registry.stage("delete"):
+                rt = await self.client.delete(self.collection_name, filter=expr)
+            self.stats.deleted += rt["delete_count"]
+            return rt["delete_count"]
+
+        return sum(await self._gather(_delete(expr) for expr in exprs))
+
+
+async def async_stream_insert(
+    collection_name: str, size: int, concurrency: int = 64, flush: bool = True, **connection_config
+) -> list[list]:
+    async with AsyncInsertEngine(collection_name, concurrency, **connection_config) as engine:
+        pks = await engine.insert_stream(await engine.schema(), size)
+        if flush:
+            await engine.flush()
+    return pks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", type=str, default="http://localhost:19530", help="uri to connect")
+    parser.add_argument("-c", "--collection", type=str, required=True, help="collection name")
+    parser.add_argument("-s", "--size", type=int, default=1024, help="MB to insert")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    add_metrics_args(parser)
+
+    flags = parser.parse_args()
+    setup_metrics(flags)
+    asyncio.run(
+        async_stream_insert(
+            flags.collection, flags.size * 1024 * 1024, flags.concurrency, uri=flags.uri
+        )
+    )
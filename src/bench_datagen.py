@@ -0,0 +1,274 @@
+"""Offline microbenchmarks of the client side hot paths, to tell whether the load client or the
+server is the bottleneck. Nothing here talks to Milvus.
+
+    python -m src.bench_datagen -o bench.json
+    python -m src.bench_datagen -o new.json --baseline bench.json --threshold 0.1
+
+Every case runs a function on one schema of the matrix, best of `--repeat` timed runs, and
+a separate run under tracemalloc for the peak memory. Exits 1 if any case got slower than
+the baseline by more than the threshold.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pymilvus
+from pydantic import BaseModel
+from pymilvus import CollectionSchema, DataType, FieldSchema
+
+from .common_func import estimate_count_by_size, estimate_size_by_count
+from .data_utils import gen_batch_columns, gen_coloumn_data, gen_one_row, gen_rows
+from .dtype_registry import register, varchar_spec
+from .generate_segment import generate_segment_by_size, stream_batches
+from .text_dist import add_text_args, text_dist_from_flags
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+DIMS = (8, 128, 768, 1536)
+
+
+class BenchResult(BaseModel):
+    bench: str
+    schema_name: str
+    rows: int
+    bytes: int
+    seconds: float
+    peak_bytes: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.bench}/{self.schema_name}"
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.bytes / 1024 / 1024 / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.key:<48} {self.rows_per_sec:>14,.0f} rows/s {self.mb_per_sec:>10.1f} MB/s "
+            f"peak {self.peak_bytes / 1024 / 1024:>8.1f}MB"
+        )
+
+
+def schema_matrix(dims: tuple[int, ...] = DIMS) -> dict[str, CollectionSchema]:
+    """int64 pk + vector in every dim, and with a varchar/double payload, a partition key or a
+    compact vector type, plus a text heavy schema and every scalar type with a sparse vector
+    """
+    schemas = {}
+    for dim in dims:
+        pk = FieldSchema("pk", DataType.INT64, is_primary=True)
+        vector = FieldSchema("embeddings", DataType.FLOAT_VECTOR, dim=dim)
+        schemas[f"int64_vec{dim}"] = CollectionSchema([pk, vector])
+        schemas[f"scalars_vec{dim}"] = CollectionSchema(
+            [
+                pk,
+                FieldSchema("name", DataType.VARCHAR, max_length=300),
+                FieldSchema("score", DataType.DOUBLE),
+                vector,
+            ]
+        )
+        schemas[f"partkey_vec{dim}"] = CollectionSchema(
+            [pk, FieldSchema("key", DataType.INT64, is_partition_key=True), vector]
+        )
+        # the compact vector types, same dim as the float32 cases
+        for name, dtype in (
+            ("fp16", DataType.FLOAT16_VECTOR),
+            ("bf16", DataType.BFLOAT16_VECTOR),
+            ("int8", DataType.INT8_VECTOR),
+            ("binary", DataType.BINARY_VECTOR),
+        ):
+            schemas[f"int64_{name}{dim}"] = CollectionSchema(
+                [pk, FieldSchema("embeddings", dtype, dim=dim)]
+            )
+    schemas["varchar_pk_vec128"] = CollectionSchema(
+        [
+            FieldSchema("pk", DataType.VARCHAR, is_primary=True, max_length=64),
+            FieldSchema("embeddings", DataType.FLOAT_VECTOR, dim=128),
+        ]
+    )
+    schemas["text_vec128"] = CollectionSchema(
+        [
+            FieldSchema("pk", DataType.INT64, is_primary=True),
+            FieldSchema("title", DataType.VARCHAR, max_length=256),
+            FieldSchema("body", DataType.VARCHAR, max_length=8192),
+            FieldSchema("embeddings", DataType.FLOAT_VECTOR, dim=128),
+        ]
+    )
+    schemas["all_scalars_sparse"] = CollectionSchema(
+        [
+            FieldSchema("pk", DataType.INT64, is_primary=True),
+            FieldSchema("flag", DataType.BOOL),
+            FieldSchema("i8", DataType.INT8),
+            FieldSchema("i16", DataType.INT16),
+            FieldSchema("i32", DataType.INT32),
+            FieldSchema("f32", DataType.FLOAT),
+            FieldSchema("meta", DataType.JSON),
+            FieldSchema("tags", DataType.ARRAY, element_type=DataType.INT32, max_capacity=16),
+            FieldSchema("sparse", DataType.SPARSE_FLOAT_VECTOR),
+        ]
+    )
+    return schemas
+
+
+def bench_cases(
+    schema: CollectionSchema, size: int
+) -> dict[str, tuple[Callable[[], object], int, int]]:
+    """name -> (run, rows, bytes) of the functions benchmarked on `schema`"""
+    count = estimate_count_by_size(size, schema)
+    one_row_count = min(count, 1000)
+    return {
+        "gen_coloumn_data": (lambda: len(gen_coloumn_data(schema, count)[0]), count, size),
+        "gen_batch_columns": (lambda: len(gen_batch_columns(schema, count)), count, size),
+        "gen_rows": (lambda: len(gen_rows(schema, count, 0)), count, size),
+        "gen_one_row": (
+            lambda: len([gen_one_row(schema, i) for i in range(one_row_count)]),
+            one_row_count,
+            estimate_size_by_count(one_row_count, schema),
+        ),
+        "generate_segment_by_size": (
+            lambda: sum(len(b) for b in generate_segment_by_size(size, schema)),
+            count,
+            size,
+        ),
+        "stream_batches": (
+            lambda: sum(batch_size for batch_size, _ in stream_batches(size, schema)),
+            count,
+            size,
+        ),
+        # the estimators are per call, 10k calls count as 10k rows
+        "estimate_count_by_size": (
+            lambda: [estimate_count_by_size(size, schema) for _ in range(10_000)],
+            10_000,
+            0,
+        ),
+        "estimate_size_by_count": (
+            lambda: [estimate_size_by_count(count, schema) for _ in range(10_000)],
+            10_000,
+            0,
+        ),
+    }
+
+
+def run_case(
+    bench: str,
+    schema_name: str,
+    run: Callable[[], object],
+    rows: int,
+    size: int,
+    repeat: int,
+) -> BenchResult:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    # traced separately, tracemalloc slows the allocations down
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return BenchResult(
+        bench=bench, schema_name=schema_name, rows=rows, bytes=size, seconds=best, peak_bytes=peak
+    )
+
+
+def run_benchmarks(
+    size: int = 5 * 1024 * 1024,
+    repeat: int = 3,
+    benches: list[str] | None = None,
+    dims: tuple[int, ...] = DIMS,
+) -> list[BenchResult]:
+    results = []
+    for schema_name, schema in schema_matrix(dims).items():
+        for bench, (run, rows, nbytes) in bench_cases(schema, size).items():
+            if benches and bench not in benches:
+                continue
+            result = run_case(bench, schema_name, run, rows, nbytes, repeat)
+            logger.info(str(result))
+            results.append(result)
+    return results
+
+
+def compare(results: list[BenchResult], baseline: list[BenchResult], threshold: float) -> list[str]:
+    """Cases slower than baseline * (1 - threshold) in rows/s"""
+    base = {r.key: r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get(r.key)
+        if b is None or b.rows_per_sec == 0:
+            continue
+        change = r.rows_per_sec / b.rows_per_sec - 1
+        if change < -threshold:
+            regressions.append(
+                f"{r.key}: {r.rows_per_sec:,.0f} rows/s vs {b.rows_per_sec:,.0f} baseline, "
+                f"{change:+.1%}"
+            )
+    return regressions
+
+
+def save(path: str, results: list[BenchResult], size: int):
+    report = {
+        "env": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pymilvus": pymilvus.__version__,
+            "machine": platform.machine(),
+            "batch_bytes": size,
+        },
+        "results": [
+            {**r.model_dump(), "rows_per_sec": r.rows_per_sec, "mb_per_sec": r.mb_per_sec}
+            for r in results
+        ],
+    }
+    with Path(path).open("w") as f:
+        json.dump(report, f, indent=2)
+
+
+def load(path: str) -> list[BenchResult]:
+    with Path(path).open() as f:
+        return [BenchResult.model_validate(r) for r in json.load(f)["results"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", type=str, default="bench_datagen.json", help="json out")
+    parser.add_argument("-s", "--size_mb", type=float, default=5, help="MB generated per case")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs, best one kept")
+    parser.add_argument("-b", "--bench", type=str, nargs="*", help="only these functions")
+    parser.add_argument("-d", "--dims", type=int, nargs="*", default=DIMS, help="vector dims")
+    parser.add_argument("--baseline", type=str, help="json of a previous run to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="allowed slow down against the baseline"
+    )
+    add_text_args(parser)
+
+    flags = parser.parse_args()
+    register(DataType.VARCHAR, varchar_spec(text_dist_from_flags(flags)))
+    size = int(flags.size_mb * 1024 * 1024)
+    results = run_benchmarks(size, flags.repeat, flags.bench, tuple(flags.dims))
+    save(flags.output, results, size)
+    logger.info(f"Saved {len(results)} results to {flags.output}")
+
+    if flags.baseline:
+        regressions = compare(results, load(flags.baseline), flags.threshold)
+        for line in regressions:
+            logger.error(f"Regression {line}")
+        if regressions:
+            sys.exit(1)
+        logger.info(f"No regression over {flags.threshold:.0%} against {flags.baseline}")
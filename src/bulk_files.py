@@ -0,0 +1,331 @@
+"""Write a SegmentDistribution as local files for Milvus bulk import instead of inserting it.
+
+Every planned segment becomes one or more import files(`max_file_size` each at most), generated
+in parallel across processes, plus a `manifest.json` mapping the files to their target segment:
+
+    files/test1/
+        manifest.json
+        seg_000/part_000.parquet            # parquet: one file per import file
+        seg_001/part_000/pk.npy, ...        # numpy: one .npy per field per import file
+
+Point the directory at a local path mounted from the object storage(e.g. a MinIO bucket) the
+server reads, then `import_manifest` submits one bulk insert per import file.
+
+Notes:
+    Parquet needs pyarrow, `pip install milvus-script[bulk]`, numpy has no extra dependency.
+    JSON and SPARSE values are written as json strings, BINARY and BFLOAT16 vectors as uint8
+    rows. ARRAY and SPARSE fields can only go to parquet.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+from types import ModuleType
+
+import numpy as np
+import pymilvus
+from pymilvus import CollectionSchema, DataType, FieldSchema, connections, utility
+
+from .common_func import Unit, estimate_count_by_size
+from .data_utils import gen_batch_columns
+from .generate_segment import split_size
+from .segment_distribution import SegmentDistribution, Size
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+MAX_FILE_SIZE = 1024 * 1024 * 1024  # 1GB
+CHUNK_SIZE = 64 * 1024 * 1024  # 64MB generated at a time, bounds the memory of a worker
+MANIFEST = "manifest.json"
+# chars of a JSON value in the fixed width numpy files, the generated ones are about 80
+JSON_WIDTH = 256
+
+
+class FileFormat(str, Enum):
+    PARQUET = "parquet"
+    NUMPY = "numpy"
+
+
+def _bytes_rows(col: list[bytes]) -> np.ndarray:
+    """BINARY/BFLOAT16 vectors, python bytes per row, as one (rows, nbytes) uint8 array"""
+    return np.frombuffer(b"".join(col), dtype=np.uint8).reshape(len(col), -1)
+
+
+def _parquet_column(pa: ModuleType, fs: FieldSchema, col: np.ndarray | list):
+    if fs.dtype in (DataType.BINARY_VECTOR, DataType.BFLOAT16_VECTOR):
+        col = _bytes_rows(col)
+    elif fs.dtype in (DataType.JSON, DataType.SPARSE_FLOAT_VECTOR):
+        # sparse dict keys become strings
+        col = [json.dumps(v) for v in col]
+    if isinstance(col, np.ndarray) and col.ndim == 2:
+        # vectors are list<float>, offsets every dim values
+        offsets = np.arange(0, col.size + 1, col.shape[1], dtype=np.int32)
+        return pa.ListArray.from_arrays(offsets, col.reshape(-1))
+    return pa.array(col)
+
+
+def _write_parquet(
+    path: Path, chunks: Iterable[dict[str, np.ndarray | list]], fields: dict[str, FieldSchema]
+) -> list[Path]:
+    try:
+        import pyarrow as pa  # noqa: PLC0415
+        import pyarrow.parquet as pq  # noqa: PLC0415
+    except ImportError as e:
+        msg = "Writing parquet needs pyarrow, pip install milvus-script[bulk]"
+        raise ImportError(msg) from e
+
+    writer = None
+    try:
+        for columns in chunks:
+            table = pa.table(
+                {name: _parquet_column(pa, fields[name], col) for name, col in columns.items()}
+            )
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return [path]
+
+
+def _numpy_column(fs: FieldSchema, col: np.ndarray | list) -> np.ndarray:
+    """`col` as a fixed width array, its dtype given by the schema so every chunk has the same"""
+    if fs.dtype == DataType.VARCHAR:
+        return np.asarray(col, dtype=f"U{fs.max_length}")
+    if fs.dtype == DataType.JSON:
+        values = np.asarray([json.dumps(v) for v in col], dtype=f"U{JSON_WIDTH + 1}")
+        if len(values) > 0 and np.char.str_len(values).max() > JSON_WIDTH:
+            msg = f"JSON values of {fs.name} are longer than {JSON_WIDTH} chars"
+            raise ValueError(msg)
+        return values.astype(f"U{JSON_WIDTH}")
+    if fs.dtype in (DataType.BINARY_VECTOR, DataType.BFLOAT16_VECTOR):
+        return _bytes_rows(col)
+    if fs.dtype in (DataType.ARRAY, DataType.SPARSE_FLOAT_VECTOR):
+        msg = f"Bulk import of numpy files doesn't take {fs.dtype.name} field {fs.name}"
+        raise ValueError(msg)
+    return col
+
+
+def _write_numpy(
+    path: Path,
+    chunks: Iterable[dict[str, np.ndarray | list]],
+    count: int,
+    fields: dict[str, FieldSchema],
+) -> list[Path]:
+    path.mkdir(parents=True, exist_ok=True)
+    files, written = {}, 0
+    for columns in chunks:
+        for name, raw in columns.items():
+            col = _numpy_column(fields[name], raw)
+            if name not in files:
+                files[name] = np.lib.format.open_memmap(
+                    path / f"{name}.npy", mode="w+", dtype=col.dtype, shape=(count, *col.shape[1:])
+                )
+            files[name][written : written + len(col)] = col
+        written += len(next(iter(columns.values())))
+    for f in files.values():
+        f.flush()
+    return [path / f"{name}.npy" for name in files]
+
+
+def write_file(
+    schema_dict: dict,
+    path: str,
+    file_format: FileFormat,
+    count: int,
+    pk_start: int,
+    seed: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> list[str]:
+    """Generate `count` rows with pks from `pk_start` into one import file. Runs in a worker.
+
+    The schema comes as a dict, CollectionSchema doesn't pickle.
+    """
+    schema = CollectionSchema.construct_from_dict(schema_dict)
+    rng = np.random.default_rng(seed)
+    chunk_rows = max(1, estimate_count_by_size(chunk_size, schema))
+
+    def chunks():
+        for start in range(0, count, chunk_rows):
+            rows = min(chunk_rows, count - start)
+            yield gen_batch_columns(schema, rows, pk_start + start, rng=rng, sequential_pk=True)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fields = {fs.name: fs for fs in schema.fields}
+    if file_format == FileFormat.PARQUET:
+        paths = _write_parquet(path, chunks(), fields)
+    else:
+        paths = _write_numpy(path, chunks(), count, fields)
+    return [str(p) for p in paths]
+
+
+def write_segments(
+    dist: SegmentDistribution,
+    schema: pymilvus.CollectionSchema,
+    directory: str | Path,
+    file_format: FileFormat = FileFormat.PARQUET,
+    workers: int | None = None,
+    max_file_size: int = MAX_FILE_SIZE,
+    pk_start: int = 0,
+    seed: int | None = None,
+) -> dict:
+    """Write every segment in `dist.size_dist` as import files under `directory`.
+
+    INT64 pks are sequential from `pk_start` across all segments, so they never collide.
+    Returns the manifest, also saved as `directory/manifest.json`, its paths relative to
+    `directory`.
+    """
+    if any(fs.dtype == DataType.INT64 and fs.is_primary and fs.auto_id for fs in schema.fields):
+        logger.warning("Bulk import ignores the files' pks of an auto_id collection")
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = ".parquet" if file_format == FileFormat.PARQUET else ""
+    seeds = np.random.SeedSequence(seed).spawn(
+        sum(len(split_size(s.as_bytes(), max_file_size)) for s in dist.size_dist)
+    )
+
+    segments, tasks, offset = [], [], pk_start
+    for i, size in enumerate(dist.size_dist):
+        segment = {"segment": i, "target_size": size.as_bytes(), "files": []}
+        for j, file_size in enumerate(split_size(segment["target_size"], max_file_size)):
+            count = estimate_count_by_size(file_size, schema)
+            path = directory / f"seg_{i:03d}" / f"part_{j:03d}{suffix}"
+            tasks.append((segment, path, count, offset, seeds[len(tasks)]))
+            offset += count
+        segments.append(segment)
+
+    total = sum(t[2] for t in tasks)
+    logger.info(
+        f"Writing {len(segments)} segments, {total} rows in {len(tasks)} {file_format.value} files "
+        f"to {directory} by {workers or os.cpu_count()} processes"
+    )
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                write_file, schema.to_dict(), str(path), file_format, count, offset, seed
+            )
+            for _, path, count, offset, seed in tasks
+        ]
+        for (segment, _, count, offset, _), future in zip(tasks, futures, strict=True):
+            paths = future.result()
+            segment["files"].append(
+                {
+                    "paths": [str(Path(p).relative_to(directory)) for p in paths],
+                    "num_rows": count,
+                    "pk_start": offset,
+                    "bytes": sum(Path(p).stat().st_size for p in paths),
+                }
+            )
+
+    for segment in segments:
+        segment["num_rows"] = sum(f["num_rows"] for f in segment["files"])
+    duration = time.perf_counter() - start
+    written = sum(f["bytes"] for s in segments for f in s["files"])
+    logger.info(
+        f"Wrote {total} rows, {written / 1024 / 1024:.2f}MB on disk in {duration:.2f}s, "
+        f"{total / duration:.0f} rows/s"
+    )
+
+    manifest = {
+        "collection_name": dist.collection_name,
+        "partition_name": dist.partition_name,
+        "format": file_format.value,
+        "segments": segments,
+    }
+    with (directory / MANIFEST).open("w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def import_manifest(
+    directory: str | Path,
+    remote_prefix: str = "",
+    wait: bool = True,
+    timeout: float = 3600,
+) -> list[int]:
+    """Submit one bulk insert per import file of the manifest in `directory`, returns the task ids.
+
+    `remote_prefix` is where `directory` is found in the server's bucket, e.g. "bulk/test1".
+    """
+    with (Path(directory) / MANIFEST).open() as f:
+        manifest = json.load(f)
+
+    task_ids = []
+    for segment in manifest["segments"]:
+        for file in segment["files"]:
+            # numpy takes the .npy of all fields as one file, parquet one file per request
+            files = [f"{remote_prefix}/{p}" if remote_prefix else p for p in file["paths"]]
+            task_id = utility.do_bulk_insert(
+                manifest["collection_name"], files, partition_name=manifest["partition_name"]
+            )
+            logger.info(f"Bulk insert task {task_id}: segment {segment['segment']}, {files}")
+            task_ids.append(task_id)
+
+    if not wait:
+        return task_ids
+
+    start = time.time()
+    pending = set(task_ids)
+    while pending:
+        for task_id in list(pending):
+            state = utility.get_bulk_insert_state(task_id)
+            if state.state == pymilvus.BulkInsertState.ImportFailed:
+                msg = f"Bulk insert task {task_id} failed: {state.failed_reason}"
+                raise RuntimeError(msg)
+            if state.state in (
+                pymilvus.BulkInsertState.ImportPersisted,
+                pymilvus.BulkInsertState.ImportCompleted,
+            ):
+                logger.info(f"Bulk insert task {task_id} done, {state.row_count} rows")
+                pending.remove(task_id)
+        if pending and time.time() - start > timeout:
+            msg = f"Bulk insert tasks {sorted(pending)} not done in {timeout}s"
+            raise TimeoutError(msg)
+        if pending:
+            time.sleep(2)
+    return task_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", type=str, default="http://localhost:19530", help="uri to connect")
+    parser.add_argument("-c", "--collection", type=str, required=True, help="collection name")
+    parser.add_argument("-o", "--output", type=str, required=True, help="directory to write to")
+    parser.add_argument(
+        "-s", "--segment_mb", type=int, nargs="+", required=True, help="size of each segment in MB"
+    )
+    parser.add_argument(
+        "-f", "--format", type=FileFormat, default=FileFormat.PARQUET, help="parquet or numpy"
+    )
+    parser.add_argument("-w", "--workers", type=int, help="num of writer processes, default ncpu")
+    parser.add_argument(
+        "--import_prefix",
+        type=str,
+        help="also bulk import the files, found under this prefix in the server's bucket",
+    )
+
+    flags = parser.parse_args()
+    connections.connect(uri=flags.uri)
+    dist = SegmentDistribution(
+        collection_name=flags.collection,
+        size_dist=tuple(Size(count=mb, unit=Unit.MB) for mb in flags.segment_mb),
+    )
+    write_segments(
+        dist,
+        pymilvus.Collection(flags.collection).schema,
+        flags.output,
+        flags.format,
+        flags.workers,
+    )
+    if flags.import_prefix is not None:
+        import_manifest(flags.output, flags.import_prefix)
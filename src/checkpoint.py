@@ -0,0 +1,68 @@
+"""Append-only journal of a long running load, so it can resume after a failure.
+
+One JSON record per line, fsynced before the next step starts:
+    {"event": "start", "params": {...}}
+    {"event": "begin", "batch": 0, "pk_start": 0, "pk_end": 100000}
+    {"event": "done", "batch": 0, "pk_start": 0, "pk_end": 100000, "rows": 99987, "deleted": 19997}
+
+A batch with "begin" but without "done" was interrupted, its pk range has to be cleaned up
+before loading it again.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+
+class LoadJournal:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def _append(self, record: dict):
+        with self.path.open("a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def records(self) -> list[dict]:
+        if not self.path.exists():
+            return []
+        with self.path.open() as f:
+            # a crash may leave the last line half written
+            return [json.loads(line) for line in f if line.endswith("\n")]
+
+    def start(self, **params):
+        """Begin a new load, dropping the records of the previous one"""
+        self.path.unlink(missing_ok=True)
+        self._append({"event": "start", "params": params})
+
+    def params(self) -> dict | None:
+        starts = [r for r in self.records() if r["event"] == "start"]
+        return starts[-1]["params"] if starts else None
+
+    def begin_batch(self, batch: int, pk_start: int, pk_end: int):
+        self._append({"event": "begin", "batch": batch, "pk_start": pk_start, "pk_end": pk_end})
+
+    def complete_batch(self, batch: int, pk_start: int, pk_end: int, rows: int, deleted: int):
+        self._append(
+            {
+                "event": "done",
+                "batch": batch,
+                "pk_start": pk_start,
+                "pk_end": pk_end,
+                "rows": rows,
+                "deleted": deleted,
+            }
+        )
+
+    def completed(self) -> dict[int, dict]:
+        return {r["batch"]: r for r in self.records() if r["event"] == "done"}
+
+    def interrupted(self) -> list[dict]:
+        done = self.completed()
+        begun = {r["batch"]: r for r in self.records() if r["event"] == "begin"}
+        return [r for batch, r in begun.items() if batch not in done]
@@ -0,0 +1,134 @@
+"""A process wide pool of MilvusClient shared by the scripts, so short cycles don't pay for
+connection setup and don't storm the server with reconnects.
+
+    pool = get_pool(size=8, uri="http://localhost:19530")
+    pool.get().insert(name, rows)  # the client pinned to the current thread
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from pymilvus import MilvusClient
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+DEFAULT_POOL_SIZE = 4
+
+
+class MilvusClientPool:
+    def __init__(
+        self,
+        size: int = DEFAULT_POOL_SIZE,
+        health_check_interval: float = 30.0,
+        **connection_config,
+    ):
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self.connection_config = connection_config
+
+        self._clients: list[MilvusClient] = []
+        self._last_used: dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next = 0
+        self._closed = False
+
+    def _create(self) -> MilvusClient:
+        # clients of the same config share one gRPC channel unless dedicated, a pool of them
+        # would be one connection and a replacement wouldn't reconnect
+        c = MilvusClient(**self.connection_config, dedicated=True)
+        self._last_used[id(c)] = time.monotonic()
+        return c
+
+    def _healthy(self, c: MilvusClient) -> bool:
+        if time.monotonic() - self._last_used.get(id(c), 0) < self.health_check_interval:
+            return True
+        try:
+            c.get_server_version()
+        except Exception as e:
+            logger.warning(f"Drop unhealthy connection to {self.connection_config}, e={e}")
+            return False
+        return True
+
+    def _replace(self, c: MilvusClient) -> MilvusClient:
+        with self._lock:
+            # another thread sharing this client may have replaced it already
+            if c not in self._clients:
+                return self._clients[self._next % len(self._clients)]
+            self._clients.remove(c)
+            self._last_used.pop(id(c), None)
+            try:
+                c.close()
+            except Exception as e:
+                logger.warning(f"Failed to close connection, e={e}")
+            new = self._create()
+            self._clients.append(new)
+            return new
+
+    def _assign(self) -> MilvusClient:
+        with self._lock:
+            if self._closed:
+                msg = "MilvusClientPool is closed"
+                raise RuntimeError(msg)
+            if len(self._clients) < self.size:
+                c = self._create()
+                self._clients.append(c)
+            else:
+                c = self._clients[self._next % len(self._clients)]
+            self._next += 1
+            return c
+
+    def get(self) -> MilvusClient:
+        """The client pinned to the current thread.
+
+        The first `size` threads get one connection each, later threads share them round robin,
+        MilvusClient is thread safe. A connection idle longer than `health_check_interval` is
+        checked before being handed out again, and replaced if the check fails.
+        """
+        c = getattr(self._local, "client", None)
+        if c is None or c not in self._clients:
+            c = self._assign()
+        elif not self._healthy(c):
+            c = self._replace(c)
+        self._last_used[id(c)] = time.monotonic()
+        self._local.client = c
+        return c
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for c in self._clients:
+                try:
+                    c.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close connection, e={e}")
+            self._clients.clear()
+            self._last_used.clear()
+        logger.info(f"Closed connection pool to {self.connection_config}")
+
+
+_pools: dict[tuple, MilvusClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(size: int = DEFAULT_POOL_SIZE, **connection_config) -> MilvusClientPool:
+    """The shared pool for this connection config, created on first use"""
+    key = tuple(sorted((k, str(v)) for k, v in connection_config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = MilvusClientPool(size, **connection_config)
+            _pools[key] = pool
+        return pool
+
+
+@atexit.register
+def close_all_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            if not pool._closed:
+                pool.close()
+        _pools.clear()
@@ -1,75 +1,104 @@
 import logging
-import uuid
+from typing import TYPE_CHECKING
 
 import numpy as np
 import pymilvus
-from pymilvus import DataType
 
-logger = logging.getLogger("pymilvus")
-logger.setLevel(logging.INFO)
-
-pre_sur = "{} Vector databases are specialized systems designed for managing and retrieving unstructured data through vector embeddings and numerical representations that capture the essence of data items like images, audio, videos"
+from .dtype_registry import GenContext, compile_schema
 
+if TYPE_CHECKING:
+    from .vector_dist import VectorDistribution
 
-def gen_coloumn_data(schema: pymilvus.CollectionSchema, count: int) -> list[list]:
-    rng = np.random.default_rng()
-    data = []
-    for fs in schema.fields:
-        if fs.dtype == DataType.INT64:
-            if fs.is_primary and not fs.auto_id:
-                data.append([uuid.uuid1().int >> 65 for _ in range(count)])
-            else:
-                data.append(list(range(count)))
-
-        elif fs.dtype == DataType.VARCHAR:
-            if fs.is_primary and not fs.auto_id:
-                data.append([str(uuid.uuid4()) for _ in range(count)])
-            else:
-                data.append([pre_sur.format(str(uuid.uuid4())) for i in range(count)])
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
 
-        elif fs.dtype == DataType.FLOAT_VECTOR:
-            data.append(rng.random((count, fs.dim)))
 
-        elif fs.dtype == DataType.DOUBLE:
-            data.append(rng.random(count))
+def gen_coloumn_data(
+    schema: pymilvus.CollectionSchema,
+    count: int,
+    pk_offset: int | None = None,
+    vector_dist: "VectorDistribution | None" = None,
+) -> list[list]:
+    """`pk_offset` makes INT64 primary keys pk_offset ... pk_offset + count - 1 instead of random.
 
-        else:
-            msg = f"Unsupported data type: {fs.dtype.name}, please impl in generate_segment.py yourself"
-            raise ValueError(msg)
-    return data
+    `vector_dist` draws the FLOAT_VECTOR fields from it instead of uniform [0, 1).
+    """
+    columns = gen_batch_columns(
+        schema,
+        count,
+        start_id=0 if pk_offset is None else pk_offset,
+        sequential_pk=pk_offset is not None,
+        vector_dist=vector_dist,
+    )
+    return list(columns.values())
 
 
 def gen_one_row(
     schema: pymilvus.CollectionSchema, row_id: int, partition_key: int | None = None
 ) -> dict:
-    rng = np.random.default_rng()
-    data = {}
-    for fs in schema.fields:
-        if fs.dtype == DataType.INT64:
-            if fs.is_primary and not fs.auto_id:
-                data[fs.name] = uuid.uuid1().int >> 65
-            if fs.is_partition_key:
-                data[fs.name] = row_id if partition_key is None else partition_key
-
-        elif fs.dtype == DataType.VARCHAR:
-            if fs.is_primary and not fs.auto_id:
-                data[fs.name] = str(uuid.uuid4())
-            else:
-                data[fs.name] = pre_sur.format(str(uuid.uuid4()))
-
-        elif fs.dtype == DataType.FLOAT_VECTOR:
-            data[fs.name] = rng.random((1, fs.dim))[0]
-
-        elif fs.dtype == DataType.DOUBLE:
-            data[fs.name] = rng.random(row_id)
-
-        else:
-            msg = f"Unsupported data type: {fs.dtype.name}, please impl in generate_segment.py yourself"
-            raise ValueError(msg)
-    return data
+    return gen_rows(schema, 1, row_id, partition_key)[0]
+
+
+def alloc_batch_buffers(schema: pymilvus.CollectionSchema, count: int) -> dict[str, np.ndarray]:
+    """Buffers of `count` rows for every fixed width field, for `gen_batch_columns(out=...)`"""
+    return compile_schema(schema).alloc(count)
+
+
+def gen_batch_columns(
+    schema: pymilvus.CollectionSchema,
+    count: int,
+    start_id: int = 0,
+    partition_key: int | None = None,
+    rng: np.random.Generator | None = None,
+    sequential_pk: bool = False,
+    out: dict[str, np.ndarray] | None = None,
+    vector_dist: "VectorDistribution | None" = None,
+) -> dict[str, np.ndarray | list]:
+    """Generate every field of `count` rows at once, keyed by field name.
+
+    Auto id primary keys are skipped. INT64 primary keys are random 63 bits ints unless
+    `sequential_pk`, then they're `start_id ... start_id + count - 1`. Other INT64 fields,
+    partition key included, are row ids starting from `start_id`, or `partition_key` if given.
+    Every type is generated by its spec in dtype_registry, from the schema's compiled plan.
+
+    Fields found in `out` are written into the first `count` rows of its buffer and returned as
+    views of it, see `alloc_batch_buffers`. FLOAT_VECTOR buffers are float32 (>= count, dim),
+    e.g. allocated once per worker, and filled in place, uniform in [0, 1) unless drawn from
+    `vector_dist`.
+    """
+    ctx = GenContext(
+        rng=np.random.default_rng() if rng is None else rng,
+        count=count,
+        start_id=start_id,
+        partition_key=partition_key,
+        sequential_pk=sequential_pk,
+        vector_dist=vector_dist,
+    )
+    return compile_schema(schema).columns(ctx, out)
+
+
+def columns_to_rows(columns: dict[str, np.ndarray | list]) -> list[dict]:
+    """Turn `gen_batch_columns` output into the row dicts `MilvusClient.insert` expects"""
+    names = list(columns)
+    # scalars become python objects in one tolist call, vectors stay as numpy row views,
+    # columns of python objects(JSON, ARRAY...) are already rows
+    values = [
+        col if isinstance(col, list) else col.tolist() if col.ndim == 1 else list(col)
+        for col in columns.values()
+    ]
+    return [dict(zip(names, row, strict=True)) for row in zip(*values, strict=True)]
 
 
 def gen_rows(
-    schema: pymilvus.CollectionSchema, count: int, start_id: int, partition_key: int | None = None
-) -> list[dict]:
-    return [gen_one_row(schema, start_id + i, partition_key) for i in range(count)]
+    schema: pymilvus.CollectionSchema,
+    count: int,
+    start_id: int,
+    partition_key: int | None = None,
+    columnar: bool = False,
+    vector_dist: "VectorDistribution | None" = None,
+) -> list[dict] | list[np.ndarray]:
+    """Rows for `MilvusClient.insert`, or with `columnar` the columns `Collection.insert` takes"""
+    columns = gen_batch_columns(schema, count, start_id, partition_key, vector_dist=vector_dist)
+    if columnar:
+        return list(columns.values())
+    return columns_to_rows(columns)
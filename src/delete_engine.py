@@ -0,0 +1,133 @@
+"""Delete by primary keys with size capped expressions sent concurrently.
+
+Sorted contiguous int pks collapse into ranges, the rest go into `in` lists:
+    [1, 2, 3, 4, 5, 9, 12] -> ['(pk >= 1 and pk < 6)', 'pk in [9, 12]']
+"""
+
+import json
+import logging
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pydantic import BaseModel
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+MAX_EXPR_BYTES = 1024 * 1024  # 1MB
+
+
+class DeleteStats(BaseModel):
+    pks: int = 0
+    exprs: int = 0
+    expr_bytes: int = 0
+    deleted: int = 0
+    duration: float = 0.0
+
+    @property
+    def deletes_per_sec(self) -> float:
+        return self.deleted / self.duration if self.duration > 0 else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.pks} pks in {self.exprs} exprs of {self.expr_bytes / 1024:.2f}KB, "
+            f"deleted {self.deleted} in {self.duration:.2f}s, {self.deletes_per_sec:.0f} deletes/s"
+        )
+
+
+def _chunk_by_bytes(lengths: np.ndarray, max_bytes: int) -> list[int]:
+    """Split points so that each chunk's sum of `lengths` stays under `max_bytes`"""
+    splits, start, total = [], 0, np.cumsum(lengths)
+    while start < len(lengths):
+        base = total[start - 1] if start > 0 else 0
+        end = int(np.searchsorted(total, base + max_bytes, side="right"))
+        end = max(end, start + 1)  # a single value larger than the cap still goes alone
+        splits.append(end)
+        start = end
+    return splits[:-1]
+
+
+def build_delete_exprs(
+    field: str,
+    pks: Sequence[int | str] | np.ndarray,
+    max_expr_bytes: int = MAX_EXPR_BYTES,
+    min_run: int = 4,
+) -> list[str]:
+    """Delete expressions covering `pks`, each at most about `max_expr_bytes` long.
+
+    Int pks in runs of at least `min_run` consecutive values become `field >= a and field < b`.
+    """
+    pks = np.asarray(pks)
+    if len(pks) == 0:
+        return []
+
+    terms: list[str] = []
+    if np.issubdtype(pks.dtype, np.integer):
+        pks = np.sort(pks.astype(np.int64))
+        pks = pks[np.concatenate(([True], pks[1:] != pks[:-1]))]
+        run_starts = np.concatenate(([0], np.flatnonzero(np.diff(pks) != 1) + 1))
+        run_ends = np.concatenate((run_starts[1:], [len(pks)]))
+        is_range = run_ends - run_starts >= min_run
+
+        terms.extend(
+            f"({field} >= {pks[s]} and {field} < {pks[e - 1] + 1})"
+            for s, e in zip(run_starts[is_range], run_ends[is_range], strict=True)
+        )
+        in_range = np.repeat(is_range, run_ends - run_starts)
+        singles = pks[~in_range]
+        # decimal digits, and ", " between values
+        lengths = np.log10(np.maximum(np.abs(singles), 1)).astype(np.int64) + 3 + (singles < 0)
+    else:
+        singles = np.unique(pks.astype(str))
+        # quotes, and ", " between values
+        lengths = np.char.str_len(singles) + 4
+
+    exprs = []
+    if terms:
+        term_lengths = np.array([len(t) + 4 for t in terms])  # joined by " or "
+        bounds = [0, *_chunk_by_bytes(term_lengths, max_expr_bytes), len(terms)]
+        exprs.extend(" or ".join(terms[b:e]) for b, e in zip(bounds, bounds[1:]))
+
+    if len(singles) > 0:
+        for chunk in np.split(singles, _chunk_by_bytes(lengths, max_expr_bytes - len(field) - 8)):
+            # python list repr is the quickest way to print ints, json quotes the strings
+            values = chunk.tolist() if chunk.dtype.kind == "i" else json.dumps(chunk.tolist())
+            exprs.append(f"{field} in {values}")
+    return exprs
+
+
+class DeleteEngine:
+    """Usage:
+    engine = DeleteEngine(lambda expr: collection.delete(expr).delete_count)
+    engine.delete("pk", pks)
+    """
+
+    def __init__(
+        self,
+        delete_func: Callable[[str], int],
+        concurrency: int = 4,
+        max_expr_bytes: int = MAX_EXPR_BYTES,
+        min_run: int = 4,
+    ):
+        self.delete_func = delete_func
+        self.concurrency = concurrency
+        self.max_expr_bytes = max_expr_bytes
+        self.min_run = min_run
+        self.stats = DeleteStats()
+
+    def delete(self, field: str, pks: Sequence[int | str] | np.ndarray) -> int:
+        """Returns the delete count reported by the server"""
+        start = time.perf_counter()
+        exprs = build_delete_exprs(field, pks, self.max_expr_bytes, self.min_run)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            deleted = sum(executor.map(self.delete_func, exprs))
+
+        self.stats.pks += len(pks)
+        self.stats.exprs += len(exprs)
+        self.stats.expr_bytes += sum(len(e) for e in exprs)
+        self.stats.deleted += deleted
+        self.stats.duration += time.perf_counter() - start
+        logger.info(f"Delete by {field}: {self.stats}")
+        return deleted
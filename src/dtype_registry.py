@@ -0,0 +1,310 @@
+"""Per DataType generators and row size models, compiled once per schema into a SchemaPlan.
+
+    plan = compile_schema(schema)             # cached per schema object
+    plan.row_nbytes                           # what estimate_count_by_size divides by
+    columns = plan.columns(GenContext(rng, count=5000))
+
+A new type, or another way to generate one, is one `register` call:
+
+    register(DataType.FLOAT, DTypeSpec(nbytes=lambda fs: 4, generate=my_floats))
+
+Columns are numpy arrays for the fixed width types, which `buffer` can preallocate, and lists
+of python objects(str, dict, bytes, list) for VARCHAR, JSON, ARRAY, BFLOAT16, BINARY and
+SPARSE vectors. VARCHAR primary keys are the exception, a numpy array of hex ids.
+"""
+
+import threading
+import weakref
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+import pymilvus
+from pymilvus import DataType, FieldSchema
+
+from .text_dist import TextDistribution
+
+if TYPE_CHECKING:
+    from .vector_dist import VectorDistribution
+
+# VARCHAR primary keys are uuid4-like hex ids
+HEX_ID_NBYTES = 32
+
+# nonzeros per row of SPARSE_FLOAT_VECTOR fields, and the dimensions they're drawn from
+SPARSE_NNZ = 64
+SPARSE_DIM = 30_000
+# serialized size of one generated JSON value
+JSON_NBYTES = 64
+
+
+@dataclass
+class GenContext:
+    rng: np.random.Generator
+    count: int
+    # first row id, INT64 fields that aren't random pks count from it
+    start_id: int = 0
+    partition_key: int | None = None
+    sequential_pk: bool = False
+    vector_dist: "VectorDistribution | None" = None
+
+
+@dataclass(frozen=True)
+class DTypeSpec:
+    # expected Bytes per row of a field
+    nbytes: Callable[[FieldSchema], int]
+    # the column of `ctx.count` rows, into `out[:count]` if a buffer is given
+    generate: Callable[[FieldSchema, GenContext, np.ndarray | None], Any]
+    # preallocated buffer of `count` rows, None for the types generated as python objects
+    buffer: Callable[[FieldSchema, int], np.ndarray] | None = None
+
+
+_REGISTRY: dict[DataType, DTypeSpec] = {}
+_plans: dict[int, tuple[weakref.ref, tuple[int, ...], "SchemaPlan"]] = {}
+_plans_lock = threading.Lock()
+
+
+def register(dtype: DataType, spec: DTypeSpec):
+    _REGISTRY[dtype] = spec
+    with _plans_lock:
+        _plans.clear()
+
+
+def spec_of(dtype: DataType) -> DTypeSpec:
+    spec = _REGISTRY.get(dtype)
+    if spec is None:
+        msg = f"Unsupported data type: {dtype.name}, please register it in dtype_registry.py"
+        raise ValueError(msg)
+    return spec
+
+
+def _head(out: np.ndarray | None, count: int) -> np.ndarray | None:
+    return None if out is None else out[:count]
+
+
+def _into(out: np.ndarray | None, values: np.ndarray) -> np.ndarray:
+    if out is None:
+        return values
+    out[...] = values
+    return out
+
+
+def _gen_hex_ids(rng: np.random.Generator, count: int) -> np.ndarray:
+    """uuid4-like 32 chars hex strings for the whole batch in one call"""
+    raw = rng.bytes(HEX_ID_NBYTES // 2 * count).hex().encode()
+    return np.frombuffer(raw, dtype=f"S{HEX_ID_NBYTES}").astype(str)
+
+
+def _gen_int64(fs: FieldSchema, ctx: GenContext, out: np.ndarray | None) -> np.ndarray:
+    out = _head(out, ctx.count)
+    if fs.is_primary and not ctx.sequential_pk:
+        return _into(out, ctx.rng.integers(0, np.iinfo(np.int64).max, ctx.count, dtype=np.int64))
+    if fs.is_partition_key and ctx.partition_key is not None:
+        if out is None:
+            return np.full(ctx.count, ctx.partition_key, dtype=np.int64)
+        out.fill(ctx.partition_key)
+        return out
+    return _into(out, np.arange(ctx.start_id, ctx.start_id + ctx.count, dtype=np.int64))
+
+
+def _int_spec(dtype: np.dtype) -> DTypeSpec:
+    info = np.iinfo(dtype)
+
+    def generate(_fs: FieldSchema, ctx: GenContext, out: np.ndarray | None) -> np.ndarray:
+        values = ctx.rng.integers(info.min, info.max, ctx.count, dtype=dtype, endpoint=True)
+        return _into(_head(out, ctx.count), values)
+
+    return DTypeSpec(
+        nbytes=lambda fs: dtype.itemsize,
+        generate=generate,
+        buffer=lambda fs, count: np.empty(count, dtype=dtype),
+    )
+
+
+def _gen_bool(_fs: FieldSchema, ctx: GenContext, out: np.ndarray | None) -> np.ndarray:
+    return _into(_head(out, ctx.count), ctx.rng.random(ctx.count) < 0.5)
+
+
+def _gen_float(_fs: FieldSchema, ctx: GenContext, out: np.ndarray | None) -> np.ndarray:
+    return ctx.rng.random(ctx.count, dtype=np.float32, out=_head(out, ctx.count))
+
+
+def _gen_double(_fs: FieldSchema, ctx: GenContext, out: np.ndarray | None) -> np.ndarray:
+    return ctx.rng.random(ctx.count, out=_head(out, ctx.count))
+
+
+def varchar_spec(
+    dist: TextDistribution | None = None, fields: dict[str, TextDistribution] | None = None
+) -> DTypeSpec:
+    """VARCHAR values drawn from `dist`, or from `fields[fs.name]` for the fields in it, and
+    charged their expected length. Primary keys stay unique hex ids.
+
+        register(DataType.VARCHAR, varchar_spec(TextDistribution(mean_length=64, spread=16)))
+    """
+    default = TextDistribution() if dist is None else dist
+    fields = {} if fields is None else fields
+
+    def nbytes(fs: FieldSchema) -> int:
+        if fs.is_primary:
+            return HEX_ID_NBYTES
+        return round(fields.get(fs.name, default).expected_length(fs.max_length))
+
+    def generate(fs: FieldSchema, ctx: GenContext, _out: np.ndarray | None) -> np.ndarray | list:
+        if fs.is_primary:
+            return _gen_hex_ids(ctx.rng, ctx.count)
+        return fields.get(fs.name, default).generate(ctx.rng, ctx.count, fs.max_length)
+
+    return DTypeSpec(nbytes, generate)
+
+
+def _gen_json(_fs: FieldSchema, ctx: GenContext, _out: np.ndarray | None) -> list[dict]:
+    ids = np.arange(ctx.start_id, ctx.start_id + ctx.count).tolist()
+    tags = ctx.rng.integers(0, 100, ctx.count).tolist()
+    scores = ctx.rng.random(ctx.count).tolist()
+    return [
+        {"id": i, "tag": f"tag_{t}", "score": s} for i, t, s in zip(ids, tags, scores, strict=True)
+    ]
+
+
+def _array_nbytes(fs: FieldSchema) -> int:
+    """Rows have max_capacity / 2 elements on average, see `_gen_array`"""
+    element = FieldSchema(f"{fs.name}_element", fs.element_type, **fs.params)
+    return round(fs.params["max_capacity"] / 2 * spec_of(fs.element_type).nbytes(element))
+
+
+def _gen_array(fs: FieldSchema, ctx: GenContext, _out: np.ndarray | None) -> list[list]:
+    """Rows of [0, max_capacity] elements, generated as one flat column then split"""
+    element = FieldSchema(f"{fs.name}_element", fs.element_type, **fs.params)
+    lengths = ctx.rng.integers(0, fs.params["max_capacity"], ctx.count, endpoint=True)
+    flat_ctx = GenContext(ctx.rng, int(lengths.sum()), ctx.start_id)
+    flat = spec_of(fs.element_type).generate(element, flat_ctx, None)
+    flat = flat.tolist() if isinstance(flat, np.ndarray) else flat
+    ends = np.cumsum(lengths).tolist()
+    return [flat[end - n : end] for n, end in zip(lengths.tolist(), ends, strict=True)]
+
+
+def _float_vectors(fs: FieldSchema, ctx: GenContext, out: np.ndarray | None) -> np.ndarray:
+    if ctx.vector_dist is not None:
+        return ctx.vector_dist.generate(ctx.rng, ctx.count, fs.dim, out)
+    if out is not None:
+        return ctx.rng.random(dtype=np.float32, out=out[: ctx.count])
+    return ctx.rng.random((ctx.count, fs.dim), dtype=np.float32)
+
+
+def _gen_float16(fs: FieldSchema, ctx: GenContext, out: np.ndarray | None) -> np.ndarray:
+    return _into(_head(out, ctx.count), _float_vectors(fs, ctx, None).astype(np.float16))
+
+
+def _gen_bfloat16(fs: FieldSchema, ctx: GenContext, _out: np.ndarray | None) -> list[bytes]:
+    """bfloat16 is the high half of float32, numpy has no dtype for it so rows are bytes"""
+    halves = (_float_vectors(fs, ctx, None).view(np.uint32) >> 16).astype("<u2")
+    return [row.tobytes() for row in halves]
+
+
+def _gen_binary(fs: FieldSchema, ctx: GenContext, _out: np.ndarray | None) -> list[bytes]:
+    bits = ctx.rng.integers(0, 256, (ctx.count, fs.dim // 8), dtype=np.uint8)
+    return [row.tobytes() for row in bits]
+
+
+def _gen_int8_vector(fs: FieldSchema, ctx: GenContext, out: np.ndarray | None) -> np.ndarray:
+    values = ctx.rng.integers(-128, 127, (ctx.count, fs.dim), dtype=np.int8, endpoint=True)
+    return _into(_head(out, ctx.count), values)
+
+
+def _gen_sparse(_fs: FieldSchema, ctx: GenContext, _out: np.ndarray | None) -> list[dict]:
+    indices = ctx.rng.integers(0, SPARSE_DIM, (ctx.count, SPARSE_NNZ)).tolist()
+    values = ctx.rng.random((ctx.count, SPARSE_NNZ), dtype=np.float32).tolist()
+    return [dict(zip(i, v, strict=True)) for i, v in zip(indices, values, strict=True)]
+
+
+def _vector_buffer(dtype: type) -> Callable[[FieldSchema, int], np.ndarray]:
+    return lambda fs, count: np.empty((count, fs.dim), dtype=dtype)
+
+
+register(
+    DataType.BOOL,
+    DTypeSpec(lambda fs: 1, _gen_bool, lambda fs, count: np.empty(count, dtype=np.bool_)),
+)
+register(DataType.INT8, _int_spec(np.dtype(np.int8)))
+register(DataType.INT16, _int_spec(np.dtype(np.int16)))
+register(DataType.INT32, _int_spec(np.dtype(np.int32)))
+register(
+    DataType.INT64,
+    DTypeSpec(lambda fs: 8, _gen_int64, lambda fs, count: np.empty(count, dtype=np.int64)),
+)
+register(
+    DataType.FLOAT,
+    DTypeSpec(lambda fs: 4, _gen_float, lambda fs, count: np.empty(count, dtype=np.float32)),
+)
+register(
+    DataType.DOUBLE,
+    DTypeSpec(lambda fs: 8, _gen_double, lambda fs, count: np.empty(count, dtype=np.float64)),
+)
+register(DataType.VARCHAR, varchar_spec())
+register(DataType.JSON, DTypeSpec(lambda fs: JSON_NBYTES, _gen_json))
+register(DataType.ARRAY, DTypeSpec(_array_nbytes, _gen_array))
+register(
+    DataType.FLOAT_VECTOR,
+    DTypeSpec(lambda fs: fs.dim * 4, _float_vectors, _vector_buffer(np.float32)),
+)
+register(
+    DataType.FLOAT16_VECTOR,
+    DTypeSpec(lambda fs: fs.dim * 2, _gen_float16, _vector_buffer(np.float16)),
+)
+register(DataType.BFLOAT16_VECTOR, DTypeSpec(lambda fs: fs.dim * 2, _gen_bfloat16))
+register(DataType.BINARY_VECTOR, DTypeSpec(lambda fs: fs.dim // 8, _gen_binary))
+register(
+    DataType.INT8_VECTOR,
+    DTypeSpec(lambda fs: fs.dim, _gen_int8_vector, _vector_buffer(np.int8)),
+)
+register(DataType.SPARSE_FLOAT_VECTOR, DTypeSpec(lambda fs: SPARSE_NNZ * 8, _gen_sparse))
+
+
+@dataclass(frozen=True)
+class FieldPlan:
+    field: FieldSchema
+    spec: DTypeSpec
+    nbytes: int
+
+
+class SchemaPlan:
+    """The fields of a schema resolved to their specs, auto id primary keys left out of the
+    generated columns but not of the row size
+    """
+
+    def __init__(self, schema: pymilvus.CollectionSchema):
+        self.fields = [
+            FieldPlan(fs, spec_of(fs.dtype), spec_of(fs.dtype).nbytes(fs)) for fs in schema.fields
+        ]
+        self.row_nbytes = sum(f.nbytes for f in self.fields)
+        self.generated = [f for f in self.fields if not (f.field.is_primary and f.field.auto_id)]
+
+    def alloc(self, count: int) -> dict[str, np.ndarray]:
+        """Buffers of `count` rows for the fields that can be preallocated"""
+        return {
+            f.field.name: f.spec.buffer(f.field, count)
+            for f in self.generated
+            if f.spec.buffer is not None
+        }
+
+    def columns(self, ctx: GenContext, out: dict[str, np.ndarray] | None = None) -> dict[str, Any]:
+        out = {} if out is None else out
+        return {
+            f.field.name: f.spec.generate(f.field, ctx, out.get(f.field.name))
+            for f in self.generated
+        }
+
+
+def compile_schema(schema: pymilvus.CollectionSchema) -> SchemaPlan:
+    """The plan of `schema`, built again only if fields were added or replaced since"""
+    fingerprint = tuple(id(fs) for fs in schema.fields)
+    with _plans_lock:
+        cached = _plans.get(id(schema))
+        if cached is not None and cached[0]() is schema and cached[1] == fingerprint:
+            return cached[2]
+
+    plan = SchemaPlan(schema)
+    key = id(schema)
+    with _plans_lock:
+        _plans[key] = (weakref.ref(schema, lambda _: _plans.pop(key, None)), fingerprint, plan)
+    return plan
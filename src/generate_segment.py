@@ -11,124 +11,218 @@ Notes:
 
 import logging
 import math
+from collections.abc import Iterator
+from functools import partial
 from typing import Union
 
+import numpy as np
 import pymilvus
 from pymilvus import Collection, Partition, connections, utility
 from tqdm import tqdm
 
-from .common_func import estimate_count_by_size
-from .data_utils import gen_coloumn_data, gen_rows
+from .common_func import estimate_count_by_size, estimate_size_by_count
+from .data_utils import alloc_batch_buffers, columns_to_rows, gen_batch_columns, gen_coloumn_data
+from .insert_pipeline import PipelineConfig, pipelined_insert
+from .metrics import registry
+from .pk_ledger import PKLedger
 from .segment_distribution import SegmentDistribution
+from .sinks import InsertSink
+from .vector_dist import VectorDistribution
 
 logger = logging.getLogger("pymilvus")
 logger.setLevel(logging.INFO)
 
-
-def generate_segment_by_size(
-    size: int, schema: pymilvus.CollectionSchema, partition_key: int | None = None
-) -> list[dict]:
-    max_size = 5 * 1024 * 1024  # 5MB
+MAX_BATCH_SIZE = 5 * 1024 * 1024  # 5MB
+
+
+def split_size(size: int, max_size: int = MAX_BATCH_SIZE) -> list[int]:
+    """Split `size`(Bytes) into batches of `max_size`, the last one takes the tail"""
+    if size <= max_size:
+        return [size]
+    batch = math.ceil(size / max_size)
+    return [max_size] * (batch - 1) + [size - (batch - 1) * max_size]
+
+
+def stream_batches(
+    size: int,
+    schema: pymilvus.CollectionSchema,
+    partition_key: int | None = None,
+    pk_start: int | None = None,
+    vector_dist: VectorDistribution | None = None,
+    max_size: int = MAX_BATCH_SIZE,
+) -> Iterator[tuple[int, dict[str, np.ndarray]]]:
+    """(Bytes, columns) of `size` Bytes in batches of `max_size`, generated in place.
+
+    The buffers are allocated once for the first, largest, batch and every batch is a view of
+    them, so memory stays at one batch whatever `size` is. A batch is only valid until the next
+    one is pulled: insert, or copy, it first. With `pk_start` INT64 primary keys are sequential
+    from it, otherwise random.
+    """
+    sizes = split_size(size, max_size)
+    buffers = alloc_batch_buffers(schema, estimate_count_by_size(sizes[0], schema))
+    rng = np.random.default_rng()
     total_count = 0
+    for batch_size in sizes:
+        count = estimate_count_by_size(batch_size, schema)
+        start_id = total_count if pk_start is None else pk_start + total_count
+        with registry.stage("generate", rows=count, nbytes=batch_size):
+            columns = gen_batch_columns(
+                schema,
+                count,
+                start_id,
+                partition_key,
+                rng=rng,
+                sequential_pk=pk_start is not None,
+                out=buffers,
+                vector_dist=vector_dist,
+            )
+        total_count += count
+        yield batch_size, columns
 
-    max_count = estimate_count_by_size(max_size, schema)
-    if size > max_size:
-        batch = size // max_size
-        tail = size - batch * max_size
 
-        for _ in range(batch):
-            data = gen_rows(schema, max_count, total_count, partition_key)
-            total_count += max_count
-            yield data
-    else:
-        tail = size
-    if tail > 0:
-        count = estimate_count_by_size(tail, schema)
-        data = gen_rows(schema, count, total_count, partition_key)
+def generate_segment_by_size(
+    size: int,
+    schema: pymilvus.CollectionSchema,
+    partition_key: int | None = None,
+    vector_dist: VectorDistribution | None = None,
+) -> Iterator[list[dict]]:
+    """Rows for `MilvusClient.insert` in 5MB batches, vectors are views valid until the next
+    batch like in `stream_batches`
+    """
+    for batch_size, columns in stream_batches(size, schema, partition_key, None, vector_dist):
+        count = len(next(iter(columns.values())))
+        with registry.stage("serialize", rows=count, nbytes=batch_size):
+            rows = columns_to_rows(columns)
+        yield rows
+
+
+def generate_segment_by_count(
+    count: int,
+    schema: pymilvus.CollectionSchema,
+    partition_key: int | None = None,
+    vector_dist: VectorDistribution | None = None,
+) -> Iterator[list[dict]]:
+    """Exactly `count` rows for `MilvusClient.insert`, in batches of the rows 5MB holds, the last
+    one takes the remainder. Vectors are views valid until the next batch like in `stream_batches`
+    """
+    batch = max(1, estimate_count_by_size(MAX_BATCH_SIZE, schema))
+    buffers = alloc_batch_buffers(schema, min(batch, count))
+    rng = np.random.default_rng()
+    for start_id in range(0, count, batch):
+        rows = min(batch, count - start_id)
+        nbytes = estimate_size_by_count(rows, schema)
+        with registry.stage("generate", rows=rows, nbytes=nbytes):
+            columns = gen_batch_columns(
+                schema,
+                rows,
+                start_id,
+                partition_key,
+                rng=rng,
+                out=buffers,
+                vector_dist=vector_dist,
+            )
+        with registry.stage("serialize", rows=rows, nbytes=nbytes):
+            data = columns_to_rows(columns)
         yield data
 
 
 # TODO: remove
-def generate_segments(dist: SegmentDistribution) -> list[int | str]:
-    if not utility.has_collection(dist.collection_name):
-        msg = f"Collection {dist.collection_name} does not exist"
-        raise ValueError(msg)
-
-    c = Collection(dist.collection_name)
-    p = c.partition(dist.partition_name)
+def generate_segments(
+    dist: SegmentDistribution,
+    pipeline: PipelineConfig | None = None,
+    ledger: PKLedger | None = None,
+    sink: InsertSink | None = None,
+    schema: pymilvus.CollectionSchema | None = None,
+    vector_dist: VectorDistribution | None = None,
+) -> list[int | str]:
+    """With `sink` and `schema`, segments go to the sink instead of the collection's partition"""
+    if sink is None:
+        if not utility.has_collection(dist.collection_name):
+            msg = f"Collection {dist.collection_name} does not exist"
+            raise ValueError(msg)
+
+        c = Collection(dist.collection_name)
+        sink, schema = c.partition(dist.partition_name), c.schema
 
     pks = []
     for size in dist.size_dist:
-        pks.append(generate_one_segment(p, c.schema, dist.as_bytes(size)))
+        pks.append(
+            generate_one_segment(sink, schema, size.as_bytes(), pipeline, ledger, vector_dist)
+        )
 
     return pks
 
 
 def generate_one_segment(
-    c: Union[Collection, Partition], schema: pymilvus.CollectionSchema, size: int
+    c: Union[Collection, Partition, InsertSink],
+    schema: pymilvus.CollectionSchema,
+    size: int,
+    pipeline: PipelineConfig | None = None,
+    ledger: PKLedger | None = None,
+    vector_dist: VectorDistribution | None = None,
 ) -> list:
-    max_size = 5 * 1024 * 1024
-    total_count = 0
-    pks = []
-
-    if size > max_size:
-        batch = size // (5 * 1024 * 1024)
-        tail = size - batch * max_size
-
-        for i in range(batch):
-            count = estimate_count_by_size(max_size, schema)
-            data = gen_coloumn_data(schema, count)
-            rt = c.insert(data)
-            logger.info(
-                f"inserted {max_size * (i + 1)}/{size}Bytes entities in batch 5MB, nun rows: {count}"
-            )
-            pks.extend(rt.primary_keys)
-            total_count += count
+    """Returns the segment's pks, or with `ledger` the memory-mapped copy persisted in it"""
+    if pipeline is not None:
+        gen_func = partial(gen_coloumn_data, vector_dist=vector_dist)
+        batch_pks, _ = pipelined_insert(c, schema, split_size(size), pipeline, gen_func)
+        pks = [pk for batch in batch_pks for pk in batch]
     else:
-        tail = size
-
-    if tail > 0:
-        count = estimate_count_by_size(tail, schema)
-        data = gen_coloumn_data(schema, count)
-        c.insert(data)
-        logger.info(
-            f"inserted entities size: {tail}Bytes, {tail / 1024 / 1024}MB, nun rows: {count}"
-        )
-        pks.extend(rt.primary_keys)
-        total_count += count
+        pks = []
+        inserted = 0
+        for batch_size, columns in stream_batches(size, schema, vector_dist=vector_dist):
+            count = len(next(iter(columns.values())))
+            with registry.stage("insert", rows=count, nbytes=batch_size):
+                rt = c.insert(list(columns.values()))
+            inserted += batch_size
+            logger.info(f"inserted {inserted}/{size}Bytes entities in batch 5MB, nun rows: {count}")
+            pks.extend(rt.primary_keys)
 
-    c.flush()
+    with registry.stage("flush"):
+        c.flush()
     logger.info(
         f"One segment num rows: {c.num_entities}, size: {size}Bytes, {size / 1024 / 1024}MB"
     )
+    if ledger is not None:
+        return ledger[ledger.append(pks)]
     return pks
 
 
 def stream_insert(
-    c: Union[Collection, Partition], schema: pymilvus.CollectionSchema, size: int
+    c: Union[Collection, Partition, InsertSink],
+    schema: pymilvus.CollectionSchema,
+    size: int,
+    pipeline: PipelineConfig | None = None,
+    ledger: PKLedger | None = None,
+    pk_start: int | None = None,
+    vector_dist: VectorDistribution | None = None,
 ) -> list[list]:
-    max_size = 5 * 1024 * 1024
-    total_count = 0
-    pks = []
+    """Returns pks per batch, or with `ledger` the memory-mapped copies persisted in it.
 
+    With `pk_start`, INT64 primary keys are sequential from it instead of random.
+    """
     logger.info(f"Try to load {size / 1024 / 1024:.2f}MB data in batch 5MB")
-    if size > max_size:
-        batch = math.ceil(size / (5 * 1024 * 1024))
-        tail = size - (batch - 1) * max_size
+    if pipeline is not None:
+        gen_func = partial(gen_coloumn_data, vector_dist=vector_dist)
+        pks, stats = pipelined_insert(
+            c, schema, split_size(size), pipeline, gen_func, pk_start=pk_start
+        )
+        total_count = stats.rows
     else:
-        batch = 1
-        tail = size
-
-    for i in tqdm(range(batch)):
-        batch_size = max_size if i < batch - 1 else tail
-
-        count = estimate_count_by_size(batch_size, schema)
-        data = gen_coloumn_data(schema, count)
-        rt = c.insert(data)
-        pks.append(rt.primary_keys)
-        total_count += count
+        total_count = 0
+        pks = []
+        batches = stream_batches(size, schema, pk_start=pk_start, vector_dist=vector_dist)
+        for batch_size, columns in tqdm(batches, total=len(split_size(size))):
+            count = len(next(iter(columns.values())))
+            with registry.stage("insert", rows=count, nbytes=batch_size):
+                rt = c.insert(list(columns.values()))
+            pks.append(
+                rt.primary_keys if ledger is None else ledger[ledger.append(rt.primary_keys)]
+            )
+            total_count += count
 
     logger.info(f"Loaded num rows: {total_count}, size: {size:.2f}B, {size / 1024 / 1024:.2f}MB")
+    if pipeline is not None and ledger is not None:
+        return [ledger[ledger.append(batch_pks)] for batch_pks in pks]
     return pks
 
 
@@ -1,19 +1,77 @@
-"""Giving a rate and target segment size, generating segment forever"""
+"""Giving a rate and target segment size, generating segment forever
 
+python -m src.generate_segments_by_rate --mb_per_sec 10 --duration 3600
+"""
+
+import argparse
 import logging
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
 
 import pymilvus
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, model_validator
 from pymilvus import DataType, MilvusClient
 
-from common_func import Unit
-from generate_segment import generate_segment_by_size
-from segment_distribution import Size
+from .common_func import Unit, estimate_size_by_count
+from .connection_pool import DEFAULT_POOL_SIZE, get_pool
+from .generate_segment import generate_segment_by_size
+from .metrics import add_metrics_args, registry, setup_metrics
+from .rate_limiter import RateLimit, TokenBucket
+from .segment_distribution import Size
+from .sinks import InsertSink, MilvusClientSink, add_sink_args, sink_from_flags
+from .vector_dist import VectorDistribution, add_vector_args, vector_dist_from_flags
 
 logger = logging.getLogger("pymilvus")
 logger.setLevel(logging.INFO)
 
 
+class FlushPolicy(str, Enum):
+    PER_KEY = "per_key"  # flush after every partition key
+    PER_ROUND = "per_round"  # flush once after each round of `concurrent_keys` keys
+    # flush once after as many keys as possible, all of them hashed into different partitions
+    ALL_KEYS = "all_keys"
+
+
+def _murmur3_int64(value: int) -> int:
+    """murmur3 32 bits, seed 0, of the 8 little endian Bytes of `value`"""
+    h = 0
+    for (block,) in struct.iter_unpack("<I", struct.pack("<q", value)):
+        k = (block * 0xCC9E2D51) & 0xFFFFFFFF
+        k = ((k << 15) | (k >> 17)) & 0xFFFFFFFF
+        h ^= (k * 0x1B873593) & 0xFFFFFFFF
+        h = ((h << 13) | (h >> 19)) & 0xFFFFFFFF
+        h = (h * 5 + 0xE6546B64) & 0xFFFFFFFF
+    h ^= 8
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & 0xFFFFFFFF
+    return h ^ (h >> 16)
+
+
+def partition_of_key(key: int, num_partitions: int) -> int:
+    """Index of the partition an INT64 partition key goes to, hashed like the server does"""
+    return (_murmur3_int64(key) & 0x7FFFFFFF) % num_partitions
+
+
+def flush_groups(keys: list[int], num_partitions: int, max_keys: int) -> list[list[int]]:
+    """`keys` in groups of at most `max_keys`, no two keys of a group in the same partition, so
+    flushing once per group still gives every key its own segment
+    """
+    groups: list[tuple[set[int], list[int]]] = []
+    for key in keys:
+        partition = partition_of_key(key, num_partitions)
+        for used, group in groups:
+            if partition not in used and len(group) < max_keys:
+                used.add(partition)
+                group.append(key)
+                break
+        else:
+            groups.append(({partition}, [key]))
+    return [group for _, group in groups]
+
+
 class BuildRowsByRate(BaseModel):
     collection_name: str = "test_segment_rate_coll"
     partition_key: bool = True
@@ -21,43 +79,131 @@ class BuildRowsByRate(BaseModel):
     connection_config: dict = {"uri": "http://localhost:19530"}
     cschema: pymilvus.CollectionSchema | None = None
 
+    pool_size: int = DEFAULT_POOL_SIZE
+    # None inserts two rounds of segments as fast as possible
+    rate: RateLimit | None = None
+    # partition keys generated and inserted at the same time, never two hashed into the same
+    # partition before a flush, they'd share a segment
+    concurrent_keys: int = 1
+    flush_policy: FlushPolicy = FlushPolicy.PER_KEY
+    # None inserts into Milvus, another sink runs the whole load without a server
+    sink: InsertSink | None = None
+    # None draws uniform vectors
+    vector_dist: VectorDistribution | None = None
+
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
+    @model_validator(mode="after")
+    def check_flush_policy(self):
+        if self.concurrent_keys > 1 and self.flush_policy == FlushPolicy.PER_KEY:
+            msg = "Flush per key mixes concurrent keys into one segment, flush per round instead"
+            raise ValueError(msg)
+        return self
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.connection_config = kwargs
+        # kwargs other than the fields above are connection params
+        conn_kwargs = {k: v for k, v in kwargs.items() if k not in type(self).model_fields}
+        if conn_kwargs:
+            self.connection_config = conn_kwargs
+
+    def client(self) -> MilvusClient:
+        return get_pool(self.pool_size, **self.connection_config).get()
+
+    def insert_sink(self) -> InsertSink:
+        if self.sink is None:
+            self.sink = MilvusClientSink(self.client, self.collection_name)
+        return self.sink
 
     def run(self, size: Size, drop_old: bool = True):
-        self.prep_collection(drop_old)
+        if isinstance(self.insert_sink(), MilvusClientSink):
+            self.prep_collection(drop_old)
+        else:
+            self.cschema = self.build_schema()
         self.insert_work(size)
 
-    def load_one_segment_for_all_partitionkey(self, size: Size):
-        c = MilvusClient(**self.connection_config)
-        for part_key_id in range(self.num_partitions):
-            for data in generate_segment_by_size(size.as_bytes(), self.cschema, part_key_id):
-                logger.info(f"Inserting {len(data)} rows for partition_key={part_key_id}")
-                c.insert(self.collection_name, data)
+    def load_one_segment_for_all_partitionkey(self, size: Size, limiter: TokenBucket | None = None):
+        keys = list(range(self.num_partitions))
+        # keys of a round are flushed together, they must be in different partitions to still
+        # get a segment each
+        max_keys = len(keys) if self.flush_policy == FlushPolicy.ALL_KEYS else self.concurrent_keys
+        rounds = flush_groups(keys, self.num_partitions, max_keys)
+        with ThreadPoolExecutor(max_workers=self.concurrent_keys) as executor:
+            for round_keys in rounds:
+                # consume the results so a failed key raises here
+                list(
+                    executor.map(lambda k: self.load_one_partitionkey(size, k, limiter), round_keys)
+                )
+                if self.flush_policy != FlushPolicy.PER_KEY:
+                    logger.info(f"Flush {self.collection_name} for partition_keys={round_keys}")
+                    with registry.stage("flush"):
+                        self.insert_sink().flush()
+                if self._expired(limiter):
+                    break
+
+    def load_one_partitionkey(
+        self, size: Size, part_key_id: int, limiter: TokenBucket | None = None
+    ):
+        sink = self.insert_sink()
+        for data in generate_segment_by_size(
+            size.as_bytes(), self.cschema, part_key_id, self.vector_dist
+        ):
+            if self._expired(limiter):
+                break
+            self._throttle(limiter, len(data))
+            logger.info(f"Inserting {len(data)} rows for partition_key={part_key_id}")
+            nbytes = estimate_size_by_count(len(data), self.cschema)
+            with registry.stage("insert", rows=len(data), nbytes=nbytes):
+                sink.insert(data)
+
+        if self.flush_policy == FlushPolicy.PER_KEY:
             logger.info(f"Flush {self.collection_name} for partition_key={part_key_id}")
-            c.flush(self.collection_name)
+            with registry.stage("flush"):
+                sink.flush()
+
+    def _throttle(self, limiter: TokenBucket | None, num_rows: int):
+        if limiter is not None:
+            amount = (
+                num_rows if self.rate.by_rows else estimate_size_by_count(num_rows, self.cschema)
+            )
+            limiter.acquire(amount)
+
+    def _expired(self, limiter: TokenBucket | None) -> bool:
+        if limiter is None or self.rate.duration is None:
+            return False
+        return limiter.elapsed >= self.rate.duration
 
     def insert_work(self, size: Size):
-        self.load_one_segment_for_all_partitionkey(size)
-        self.load_one_segment_for_all_partitionkey(size)
+        if self.rate is None:
+            self.load_one_segment_for_all_partitionkey(size)
+            self.load_one_segment_for_all_partitionkey(size)
+            return
+
+        limiter = self.rate.bucket()
+        until = "forever" if self.rate.duration is None else f"for {self.rate.duration}s"
+        logger.info(
+            f"Generating {size} segments at {self.rate.rate:.2f} {self.rate.unit}/s {until}"
+        )
+        rounds = 0
+        try:
+            while not self._expired(limiter):
+                self.load_one_segment_for_all_partitionkey(size, limiter)
+                rounds += 1
+                logger.info(f"Round {rounds}: {limiter.report(self.rate.unit)}")
+        finally:
+            logger.info(f"Insert rate {limiter.report(self.rate.unit)}")
+            logger.info(f"Sink {type(self.insert_sink()).__name__}: {self.insert_sink().stats}")
 
     def delete_by_partition_key(self, partition_key: int):
-        c = MilvusClient(**self.connection_config)
+        c = self.client()
         expr = f"session_id == {partition_key}"
 
         logger.info(f"Deleting {expr}")
         c.delete(self.collection_name, filter=expr)
         c.flush(self.collection_name)
 
-    def prep_collection(self, drp_old: bool):
-        c = MilvusClient(**self.connection_config)
-        if c.has_collection(self.collection_name):
-            c.drop_collection(self.collection_name)
-
-        schema = c.create_schema(
+    def build_schema(self) -> pymilvus.CollectionSchema:
+        schema = MilvusClient.create_schema(
             auto_id=False,
             enable_dynamic_field=True,
             partition_key_field="session_id",
@@ -67,6 +213,14 @@ class BuildRowsByRate(BaseModel):
         schema.add_field(field_name="id", datatype=DataType.INT64, is_primary=True)
         schema.add_field(field_name="vector", datatype=DataType.FLOAT_VECTOR, dim=128)
         schema.add_field(field_name="session_id", datatype=DataType.INT64)
+        return schema
+
+    def prep_collection(self, drp_old: bool):
+        c = self.client()
+        if c.has_collection(self.collection_name):
+            c.drop_collection(self.collection_name)
+
+        schema = self.build_schema()
         self.cschema = schema
 
         index_params = MilvusClient.prepare_index_params()
@@ -81,7 +235,52 @@ class BuildRowsByRate(BaseModel):
 
 
 if __name__ == "__main__":
-    runner = BuildRowsByRate()
-    size = Size(count=100, unit=Unit.MB)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", type=str, default="http://localhost:19530", help="uri to connect")
+    parser.add_argument("-s", "--segment_size", type=int, default=100, help="segment size in MB")
+    parser.add_argument("--mb_per_sec", type=float, help="target insert rate in MB/s")
+    parser.add_argument("--rows_per_sec", type=float, help="target insert rate in rows/s")
+    parser.add_argument("--burst", type=float, help="MB or rows allowed above the rate")
+    parser.add_argument("--duration", type=float, help="seconds to run, forever if not set")
+    parser.add_argument(
+        "--concurrent_keys", type=int, default=1, help="partition keys inserted at the same time"
+    )
+    parser.add_argument(
+        "--flush_policy",
+        type=FlushPolicy,
+        choices=list(FlushPolicy),
+        help="per_key by default, per_round if --concurrent_keys > 1",
+    )
+    add_sink_args(parser)
+    add_vector_args(parser)
+    add_metrics_args(parser)
+    flags = parser.parse_args()
+    setup_metrics(flags)
+
+    rate = None
+    if flags.mb_per_sec is not None or flags.rows_per_sec is not None:
+        by_size = flags.mb_per_sec is not None
+        rate = RateLimit(
+            size_per_sec=(Size(count=int(flags.mb_per_sec * 1024 * 1024)) if by_size else None),
+            rows_per_sec=flags.rows_per_sec,
+            burst=(
+                flags.burst * 1024 * 1024 if by_size and flags.burst is not None else flags.burst
+            ),
+            duration=flags.duration,
+        )
+
+    flush_policy = flags.flush_policy
+    if flush_policy is None:
+        flush_policy = FlushPolicy.PER_KEY if flags.concurrent_keys == 1 else FlushPolicy.PER_ROUND
+    runner = BuildRowsByRate(
+        uri=flags.uri,
+        rate=rate,
+        concurrent_keys=flags.concurrent_keys,
+        flush_policy=flush_policy,
+        pool_size=max(DEFAULT_POOL_SIZE, flags.concurrent_keys),
+        sink=sink_from_flags(flags),
+        vector_dist=vector_dist_from_flags(flags),
+    )
+    size = Size(count=flags.segment_size, unit=Unit.MB)
     runner.run(size, False)
     #  runner.delete_by_partition_key(1)
@@ -0,0 +1,378 @@
+"""Exact nearest neighbors of the loaded vectors, to put recall@k next to search latency.
+
+`DatasetRecorder` wraps whatever the loaders insert into and appends every batch's pks and
+vectors to raw files, read back memory-mapped by `Dataset`:
+
+    recorder = DatasetRecorder(c.partition("_default"), "datasets/test1", schema)
+    generate_segments(dist, sink=recorder, schema=schema)
+    delete_n_percent(name, pks, 20, deleted=PKLedger("deleted_pks/test1"))
+
+    gt = compute_ground_truth(Dataset("datasets/test1"), queries, k=100,
+                              deleted=PKLedger("deleted_pks/test1"), memory_limit=1 << 30)
+    recall_at_k(search_ids, gt.ids, k=10)
+
+Brute force runs in blocks of base rows over a process pool, each worker keeping its query x
+block distances and block of vectors under `memory_limit / workers`, so the dataset can be
+larger than memory. Deleted pks are masked out before the top-k.
+"""
+
+import argparse
+import json
+import logging
+import math
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pymilvus
+from pydantic import BaseModel, ConfigDict
+from pymilvus import DataType
+
+from .pk_ledger import PKLedger
+from .sinks import InsertSink, SinkResult
+from .vector_dist import add_vector_args, vector_dist_from_flags
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+VECTORS_FILE = "vectors.f32"
+PKS_FILE = "pks.i64"
+META_FILE = "meta.json"
+
+# query rows per matrix multiply, bounds the distance block with the base rows per block
+QUERY_BLOCK = 1024
+
+
+class Metric(str, Enum):
+    L2 = "L2"
+    IP = "IP"
+    COSINE = "COSINE"
+
+
+class DatasetRecorder(InsertSink):
+    """Inserts into `inner`, then appends the batch's pks and `vector_field` to `directory`.
+
+    pks are taken from the insert result so auto id works, they must be INT64.
+    Batches are row dicts or columns in schema order, auto id field included or not.
+    """
+
+    def __init__(
+        self,
+        inner: Any,
+        directory: str | Path,
+        schema: pymilvus.CollectionSchema,
+        vector_field: str | None = None,
+        clear: bool = True,
+    ):
+        super().__init__()
+        self.inner = inner
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        fields = [fs for fs in schema.fields if fs.dtype == DataType.FLOAT_VECTOR]
+        if vector_field is not None:
+            fields = [fs for fs in fields if fs.name == vector_field]
+        if not fields:
+            msg = f"No FLOAT_VECTOR field {vector_field or ''} in the schema"
+            raise ValueError(msg)
+        self.vector_field = fields[0].name
+        self.dim = fields[0].dim
+        self._index_all = [fs.name for fs in schema.fields].index(self.vector_field)
+        self._index_no_auto = [
+            fs.name for fs in schema.fields if not (fs.is_primary and fs.auto_id)
+        ].index(self.vector_field)
+        self._num_fields = len(schema.fields)
+
+        mode = "wb" if clear else "ab"
+        self._vectors = (self.directory / VECTORS_FILE).open(mode)
+        self._pks = (self.directory / PKS_FILE).open(mode)
+        with (self.directory / META_FILE).open("w") as f:
+            json.dump({"dim": self.dim, "vector_field": self.vector_field}, f)
+        self._write_lock = threading.Lock()
+
+    def _batch_vectors(self, data: Sequence) -> np.ndarray:
+        if isinstance(data[0], dict):
+            vectors = [row[self.vector_field] for row in data]
+        else:
+            index = self._index_all if len(data) == self._num_fields else self._index_no_auto
+            vectors = data[index]
+        return np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+
+    def insert(self, data: Sequence) -> SinkResult:
+        self._count(data)
+        rt = self.inner.insert(data)
+        pks = np.asarray(rt.primary_keys)
+        if pks.dtype.kind not in "iu":
+            msg = f"Ground truth needs INT64 pks, got {pks.dtype}"
+            raise TypeError(msg)
+
+        vectors = self._batch_vectors(data)
+        with self._write_lock:
+            self._vectors.write(vectors.tobytes())
+            self._pks.write(pks.astype(np.int64).tobytes())
+        return SinkResult(primary_keys=list(rt.primary_keys), insert_count=len(pks))
+
+    def delete(self, expr: str) -> SinkResult:
+        return self.inner.delete(expr)
+
+    def flush(self):
+        super().flush()
+        with self._write_lock:
+            self._vectors.flush()
+            self._pks.flush()
+        self.inner.flush()
+
+    @property
+    def num_entities(self) -> int:
+        return self.inner.num_entities
+
+    def close(self):
+        with self._write_lock:
+            self._vectors.close()
+            self._pks.close()
+
+
+class Dataset:
+    """The pks and vectors a DatasetRecorder wrote, memory-mapped"""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        with (self.directory / META_FILE).open() as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.num_rows = (self.directory / PKS_FILE).stat().st_size // 8
+
+    @property
+    def pks(self) -> np.ndarray:
+        return np.memmap(self.directory / PKS_FILE, np.int64, "r", shape=(self.num_rows,))
+
+    @property
+    def vectors(self) -> np.ndarray:
+        shape = (self.num_rows, self.dim)
+        return np.memmap(self.directory / VECTORS_FILE, np.float32, "r", shape=shape)
+
+
+class GroundTruth(BaseModel):
+    metric: Metric
+    queries: np.ndarray
+    # (nq, k) pks and distances best first, distances as Milvus reports them:
+    # squared L2, or IP/COSINE similarity
+    ids: np.ndarray
+    distances: np.ndarray
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def k(self) -> int:
+        return self.ids.shape[1]
+
+    def save(self, path: str | Path):
+        np.savez(
+            path,
+            metric=self.metric.value,
+            queries=self.queries,
+            ids=self.ids,
+            distances=self.distances,
+        )
+        logger.info(f"Saved ground truth of {len(self.queries)} queries, k={self.k} to {path}")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "GroundTruth":
+        with np.load(path) as f:
+            return cls(
+                metric=Metric(str(f["metric"])),
+                queries=f["queries"],
+                ids=f["ids"],
+                distances=f["distances"],
+            )
+
+
+def block_rows(dim: int, nq: int, k: int, memory_limit: int) -> int:
+    """Base rows per block so one worker's vectors, distances and top-k temporaries fit"""
+    qb = min(nq, QUERY_BLOCK)
+    # the block itself, its norms, pks and deleted mask, then per query of a query block
+    # float32 distances and their int64 argpartition
+    per_row = dim * 4 + 4 + 8 + 1 + qb * (4 + 8)
+    # every query with its running top-k, and a query block's merge temporaries
+    fixed = nq * (dim * 4 + k * (4 + 8)) + qb * 2 * k * (4 + 8) * 2
+    rows = (memory_limit - fixed) // per_row
+    if rows < k:
+        msg = f"memory_limit {memory_limit}B is too small for {nq} queries of dim {dim}, k={k}"
+        raise ValueError(msg)
+    return int(rows)
+
+
+def _merge_topk(
+    dists: np.ndarray, ids: np.ndarray, k: int, sort: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """The `k` smallest of each row of `dists`, with their `ids`"""
+    if dists.shape[1] > k:
+        part = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        dists = np.take_along_axis(dists, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1)
+    if sort:
+        order = np.argsort(dists, axis=1, kind="stable")
+        dists = np.take_along_axis(dists, order, axis=1)
+        ids = np.take_along_axis(ids, order, axis=1)
+    return dists, ids
+
+
+def _topk_range(
+    directory: str,
+    start: int,
+    end: int,
+    queries: np.ndarray,
+    k: int,
+    metric: Metric,
+    deleted: np.ndarray,
+    rows_per_block: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k of base rows [start, end) in blocks, smaller is better for every metric"""
+    dataset = Dataset(directory)
+    vectors, pks = dataset.vectors, dataset.pks
+    nq = len(queries)
+    best_d = np.full((nq, k), np.inf, dtype=np.float32)
+    best_i = np.full((nq, k), -1, dtype=np.int64)
+    q_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+
+    for block_start in range(start, end, rows_per_block):
+        block_end = min(end, block_start + rows_per_block)
+        block = np.asarray(vectors[block_start:block_end])
+        block_pks = np.asarray(pks[block_start:block_end])
+        if metric == Metric.COSINE:
+            block = block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-30)
+        dead = np.isin(block_pks, deleted) if len(deleted) else None
+        b_norms = np.einsum("ij,ij->i", block, block)[None, :] if metric == Metric.L2 else None
+
+        for q_start in range(0, nq, QUERY_BLOCK):
+            rows = slice(q_start, q_start + QUERY_BLOCK)
+            dists = queries[rows] @ block.T
+            if metric == Metric.L2:
+                dists *= -2
+                dists += q_norms[rows]
+                dists += b_norms
+            else:
+                np.negative(dists, out=dists)
+            if dead is not None:
+                dists[:, dead] = np.inf
+
+            d, i = _merge_topk(dists, np.broadcast_to(block_pks, dists.shape), k)
+            best_d[rows], best_i[rows] = _merge_topk(
+                np.concatenate([best_d[rows], d], axis=1),
+                np.concatenate([best_i[rows], i], axis=1),
+                k,
+            )
+    return best_d, best_i
+
+
+def compute_ground_truth(
+    dataset: Dataset,
+    queries: np.ndarray,
+    k: int = 100,
+    metric: Metric = Metric.L2,
+    deleted: np.ndarray | PKLedger | None = None,
+    memory_limit: int = 1024 * 1024 * 1024,
+    workers: int = 4,
+) -> GroundTruth:
+    """Exact top-k of `queries` among the dataset rows whose pk isn't in `deleted`.
+
+    `memory_limit` Bytes is shared by the `workers` processes. Rows short of k alive
+    neighbors are padded with pk -1.
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    if metric == Metric.COSINE:
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-30)
+    if isinstance(deleted, PKLedger):
+        deleted = np.concatenate([np.asarray(pks) for pks in deleted]) if len(deleted) else None
+    deleted = np.empty(0, np.int64) if deleted is None else np.unique(np.asarray(deleted, np.int64))
+
+    rows_per_block = block_rows(dataset.dim, len(queries), k, memory_limit // workers)
+    # a few ranges per worker to even out the stragglers, each at least a block long
+    num_ranges = max(1, min(workers * 4, math.ceil(dataset.num_rows / rows_per_block)))
+    bounds = np.linspace(0, dataset.num_rows, num_ranges + 1, dtype=np.int64)
+    logger.info(
+        f"Ground truth of {len(queries)} queries over {dataset.num_rows} rows, "
+        f"{len(deleted)} deleted, in {num_ranges} ranges of {rows_per_block} rows blocks "
+        f"by {workers} processes"
+    )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _topk_range,
+                str(dataset.directory),
+                int(start),
+                int(end),
+                queries,
+                k,
+                metric,
+                deleted,
+                rows_per_block,
+            )
+            for start, end in zip(bounds[:-1], bounds[1:], strict=True)
+            if end > start
+        ]
+        parts = [fut.result() for fut in futures]
+
+    dists, ids = _merge_topk(
+        np.concatenate([d for d, _ in parts], axis=1),
+        np.concatenate([i for _, i in parts], axis=1),
+        k,
+        sort=True,
+    )
+    ids = np.where(np.isinf(dists), -1, ids)
+    if metric != Metric.L2:
+        dists = -dists
+    return GroundTruth(metric=metric, queries=queries, ids=ids, distances=dists)
+
+
+def recall_at_k(results: Sequence[Sequence[int]], true_ids: np.ndarray, k: int) -> float:
+    """Mean fraction of each row's true top-k found in the result's first k"""
+    if len(results) == 0:
+        return 0.0
+    total = 0.0
+    for got, row in zip(results, true_ids, strict=True):
+        want = row[:k][row[:k] >= 0]
+        if len(want) == 0:
+            total += 1.0
+            continue
+        total += len(set(got[:k]) & set(want.tolist())) / len(want)
+    return total / len(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--dataset", type=str, required=True, help="DatasetRecorder dir")
+    parser.add_argument("-o", "--output", type=str, default="ground_truth.npz", help="npz path")
+    parser.add_argument("-k", "--topk", type=int, default=100, help="neighbors per query")
+    parser.add_argument("--nq", type=int, default=1000, help="queries drawn if not --queries")
+    parser.add_argument("--queries", type=str, help=".npy of float32 query vectors")
+    parser.add_argument("--metric", type=Metric, choices=list(Metric), default=Metric.L2)
+    parser.add_argument("--deleted", type=str, nargs="*", default=[], help="PKLedger dirs")
+    parser.add_argument("--memory_mb", type=int, default=1024, help="memory of all workers")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="num of processes")
+    add_vector_args(parser)
+
+    flags = parser.parse_args()
+    dataset = Dataset(flags.dataset)
+    if flags.queries:
+        queries = np.load(flags.queries)
+    else:
+        # queries from the loaded distribution, not from the loaded vectors themselves
+        rng = np.random.default_rng([flags.vector_seed, 1])
+        queries = vector_dist_from_flags(flags).generate(rng, flags.nq, dataset.dim)
+    deleted = [np.asarray(pks) for d in flags.deleted for pks in PKLedger(d)]
+    gt = compute_ground_truth(
+        dataset,
+        queries,
+        flags.topk,
+        flags.metric,
+        np.concatenate(deleted) if deleted else None,
+        flags.memory_mb * 1024 * 1024,
+        flags.workers,
+    )
+    gt.save(flags.output)
@@ -0,0 +1,173 @@
+"""Generate batches ahead in background producers while keeping several inserts in flight.
+
+producers --(bounded queue)--> consumer --(at most `in_flight` inserts)--> Milvus
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import accumulate
+from typing import Any
+
+import pymilvus
+from pydantic import BaseModel, Field
+from tqdm import tqdm
+
+from .common_func import estimate_count_by_size
+from .data_utils import gen_coloumn_data
+from .metrics import registry
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+
+class PipelineConfig(BaseModel):
+    producers: int = Field(1, ge=1)
+    in_flight: int = Field(2, ge=1)
+    queue_depth: int = 4
+
+
+class PipelineStats(BaseModel):
+    batches: int = 0
+    rows: int = 0
+    size: int = 0
+    duration: float = 0.0
+    max_queue_depth: int = 0
+    queue_depth_sum: int = 0
+    # time producers waited on a full queue, and time the consumer waited on an empty one
+    producer_blocked: float = 0.0
+    consumer_starved: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.size / 1024 / 1024 / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def avg_queue_depth(self) -> float:
+        return self.queue_depth_sum / self.batches if self.batches > 0 else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.batches} batches, {self.rows} rows, {self.size / 1024 / 1024:.2f}MB "
+            f"in {self.duration:.2f}s: {self.rows_per_sec:.0f} rows/s, {self.mb_per_sec:.2f}MB/s, "
+            f"queue depth avg {self.avg_queue_depth:.2f} max {self.max_queue_depth}, "
+            f"producer blocked {self.producer_blocked:.2f}s, "
+            f"consumer starved {self.consumer_starved:.2f}s"
+        )
+
+
+class _Failed:
+    def __init__(self, e: BaseException):
+        self.e = e
+
+
+def pipelined_insert(
+    c: Any,
+    schema: pymilvus.CollectionSchema,
+    batch_sizes: list[int],
+    config: PipelineConfig | None = None,
+    gen_func: Callable[..., Any] = gen_coloumn_data,
+    progress: bool = True,
+    pk_start: int | None = None,
+) -> tuple[list[list], PipelineStats]:
+    """Insert one batch per entry of `batch_sizes`(Bytes), returns pks in batch order and stats.
+
+    `c` is anything with `insert(data)` returning a result with `primary_keys`,
+    like Collection, Partition or an InsertSink. `gen_func(schema, count, pk_offset)` generates
+    a batch, `pk_offset` is None unless `pk_start` is given for sequential primary keys.
+    """
+    config = PipelineConfig() if config is None else config
+    stats = PipelineStats()
+    stats_lock = threading.Lock()
+    stop = threading.Event()
+    ready = queue.Queue(maxsize=config.queue_depth)
+
+    counts = [estimate_count_by_size(batch_size, schema) for batch_size in batch_sizes]
+    offsets = [None] * len(counts)
+    if pk_start is not None:
+        offsets = list(accumulate(counts[:-1], initial=pk_start))
+
+    def produce(worker: int):
+        for i in range(worker, len(batch_sizes), config.producers):
+            try:
+                with registry.stage("generate", rows=counts[i], nbytes=batch_sizes[i]):
+                    item = (i, counts[i], gen_func(schema, counts[i], offsets[i]))
+            except Exception as e:
+                item = (i, 0, _Failed(e))
+
+            start = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            with stats_lock:
+                stats.producer_blocked += time.perf_counter() - start
+            if stop.is_set() or isinstance(item[2], _Failed):
+                return
+
+    producers = [
+        threading.Thread(target=produce, args=(w,), daemon=True) for w in range(config.producers)
+    ]
+
+    pks: list[list] = [[] for _ in batch_sizes]
+    in_flight = threading.Semaphore(config.in_flight)
+    futures: list[Future] = []
+    failed: list[Future] = []
+    pbar = tqdm(total=len(batch_sizes), disable=not progress)
+
+    def on_done(fut: Future):
+        in_flight.release()
+        pbar.update(1)
+        if fut.exception() is not None:
+            failed.append(fut)
+
+    def do_insert(i: int, data: Any):
+        with registry.stage("insert", rows=counts[i], nbytes=batch_sizes[i]):
+            pks[i] = c.insert(data).primary_keys
+
+    start_time = time.perf_counter()
+    for t in producers:
+        t.start()
+    try:
+        with ThreadPoolExecutor(max_workers=config.in_flight) as executor:
+            for _ in batch_sizes:
+                depth = ready.qsize()
+                wait_start = time.perf_counter()
+                i, count, data = ready.get()
+                stats.consumer_starved += time.perf_counter() - wait_start
+                if isinstance(data, _Failed):
+                    raise data.e
+
+                stats.batches += 1
+                stats.rows += count
+                stats.size += batch_sizes[i]
+                stats.queue_depth_sum += depth
+                stats.max_queue_depth = max(stats.max_queue_depth, depth)
+                registry.set_gauge("pipeline_queue_depth", depth)
+
+                in_flight.acquire()
+                fut = executor.submit(do_insert, i, data)
+                fut.add_done_callback(on_done)
+                futures.append(fut)
+
+                # fail fast instead of generating the rest of the load
+                if failed:
+                    failed[0].result()
+            for fut in futures:
+                fut.result()
+    finally:
+        stop.set()
+        pbar.close()
+
+    stats.duration = time.perf_counter() - start_time
+    logger.info(f"Pipelined insert: {stats}")
+    return pks, stats
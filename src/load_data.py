@@ -1,8 +1,10 @@
-"""python load_data.py -c test1"""
+"""python -m src.load_data -c test1 -n -r 10000000 -w 8"""
 
 import argparse
 import concurrent
 import logging
+import math
+import sys
 import threading
 import time
 from multiprocessing import get_context
@@ -17,6 +19,11 @@ from pymilvus import (
     utility,
 )
 
+from .data_utils import alloc_batch_buffers, gen_batch_columns
+from .metrics import registry
+from .sinks import InsertSink, add_sink_args, sink_from_flags
+from .vector_dist import VectorDistribution, add_vector_args, vector_dist_from_flags
+
 logger = logging.getLogger("pymilvus")
 logger.setLevel(logging.INFO)
 
@@ -24,7 +31,8 @@ logger.setLevel(logging.INFO)
 def delete(name: str, expr: str):
     from pymilvus import connections
 
-    connections.connect()
+    if not connections.has_connection("default"):
+        connections.connect()
     c = Collection(name)
 
     logger.info(f"delete {expr}")
@@ -38,21 +46,28 @@ def delete(name: str, expr: str):
     c.flush()
 
 
+def default_schema(dim: int) -> CollectionSchema:
+    return CollectionSchema(
+        [
+            FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True),
+            FieldSchema(name="random", dtype=DataType.DOUBLE),
+            FieldSchema(name="embeddings", dtype=DataType.FLOAT_VECTOR, dim=dim),
+        ]
+    )
+
+
 def prepare_collection(
     name: str, dim: int, recreate_if_exist: bool = False, schema: CollectionSchema = None, **kwargs
 ):
     from pymilvus import connections
 
-    connections.connect(**kwargs)
+    # reuse the caller's connection, only connect(and disconnect after) if there's none
+    connected = connections.has_connection("default")
+    if not connected:
+        connections.connect(**kwargs)
 
     def create():
-        fields = [
-            FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True),
-            FieldSchema(name="random", dtype=DataType.DOUBLE),
-            FieldSchema(name="embeddings", dtype=DataType.FLOAT_VECTOR, dim=dim),
-        ]
-
-        local_schema = CollectionSchema(fields) if schema is None else schema
+        local_schema = default_schema(dim) if schema is None else schema
         Collection(name, local_schema, **kwargs)
 
     if not utility.has_collection(name):
@@ -61,11 +76,22 @@ def prepare_collection(
     elif recreate_if_exist is True:
         utility.drop_collection(name)
         create()
-    connections.disconnect("default")
+
+    if not connected:
+        connections.disconnect("default")
 
 
 class MilvusMultiThreadingInsert:
-    def __init__(self, collection_name: str, total_count: int, num_per_batch: int, dim: int):
+    def __init__(
+        self,
+        collection_name: str,
+        total_count: int,
+        num_per_batch: int,
+        dim: int,
+        max_workers: int = 12,
+        sink: InsertSink | None = None,
+        vector_dist: VectorDistribution | None = None,
+    ):
         batch_count = int(total_count / num_per_batch)
 
         self.thread_local = threading.local()
@@ -73,14 +99,21 @@ class MilvusMultiThreadingInsert:
         self.dim = dim
         self.total_count = total_count
         self.num_per_batch = num_per_batch
+        self.max_workers = max_workers
         self.batchs = list(range(batch_count))
+        # None inserts into the collection
+        self.sink = sink
+        # None draws uniform vectors
+        self.vector_dist = vector_dist
 
     def connect(self, uri: str):
         from pymilvus import connections
 
         connections.connect(uri=uri)
 
-    def get_thread_local_collection(self):
+    def get_thread_local_collection(self) -> Collection | InsertSink:
+        if self.sink is not None:
+            return self.sink
         if not hasattr(self.thread_local, "collection"):
             self.thread_local.collection = Collection(self.collection_name)
         return self.thread_local.collection
@@ -88,19 +121,27 @@ class MilvusMultiThreadingInsert:
     def insert_work(self, number: int):
         logger.info(f"No.{number:2}: Start inserting entities")
         rng = np.random.default_rng(seed=number)
-        entities = [
-            list(range(self.num_per_batch * number, self.num_per_batch * (number + 1))),
-            rng.random(self.num_per_batch).tolist(),
-            rng.random((self.num_per_batch, self.dim)),
-        ]
-
-        insert_result = self.get_thread_local_collection().insert(entities)
-        assert len(insert_result.primary_keys) == self.num_per_batch
+        with registry.stage("generate", rows=self.num_per_batch):
+            vectors = (
+                rng.random((self.num_per_batch, self.dim))
+                if self.vector_dist is None
+                else self.vector_dist.generate(rng, self.num_per_batch, self.dim)
+            )
+            entities = [
+                list(range(self.num_per_batch * number, self.num_per_batch * (number + 1))),
+                rng.random(self.num_per_batch).tolist(),
+                vectors,
+            ]
+
+        with registry.stage("insert", rows=self.num_per_batch):
+            insert_result = self.get_thread_local_collection().insert(entities)
+        assert insert_result.insert_count == self.num_per_batch
         logger.info(f"No.{number:2}: Finish inserting entities")
 
     def _insert_all_batches(self):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=12) as executor:
-            executor.map(self.insert_work, self.batchs)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # consume the results so a failed batch raises here instead of being dropped
+            list(executor.map(self.insert_work, self.batchs))
 
     def run(self):
         start_time = time.time()
@@ -108,73 +149,130 @@ class MilvusMultiThreadingInsert:
         duration = time.time() - start_time
         logger.info(f"Inserted {len(self.batchs)} batches of entities in {duration} seconds")
         self.get_thread_local_collection().flush()
-        logger.info(
-            f"Inserted num_entities: {self.total_count}. \
-                Actual num_entites: {self.get_thread_local_collection().num_entities}"
-        )
+        logger.info(f"Inserted num_entities: {self.total_count}. \
+                Actual num_entites: {self.get_thread_local_collection().num_entities}")
 
 
 class MilvusUploader:
+    """Per worker process state, set up once by `init_client` and reused by every batch"""
+
     client = None
     upload_params = {}
     collection: Collection = None
     distance: str = None
+    schema: CollectionSchema = None
+    num_per_batch: int = 5000
+    total_count: int = 0
+    # preallocated on the first batch, every later batch is generated into them
+    buffers: dict[str, np.ndarray] | None = None
+    vector_dist: VectorDistribution | None = None
 
     @classmethod
     def get_mp_start_method(cls):
         return "spawn"
 
     @classmethod
-    def init_client(cls, kwargs: dict):
+    def init_client(
+        cls,
+        kwargs: dict,
+        collection_name: str = "bench",
+        num_per_batch: int = 5000,
+        total_count: int = 0,
+        vector_dist: VectorDistribution | None = None,
+    ):
         from pymilvus import connections
 
         cls.client = connections.connect(**kwargs)
-        cls.collection = Collection("bench")
+        cls.collection = Collection(collection_name)
+        cls.schema = cls.collection.schema
+        cls.num_per_batch = num_per_batch
+        cls.total_count = total_count
+        cls.buffers = None
+        cls.vector_dist = vector_dist
         logger.info("connected")
 
     @classmethod
-    def upload_batch(cls, number: int):
-        rng = np.random.default_rng(seed=number)
-        num_per_batch = 5000
-        entities = [
-            list(range(num_per_batch * number, num_per_batch * (number + 1))),
-            rng.random(num_per_batch).tolist(),
-            rng.random((num_per_batch, 768)),
-        ]
+    def upload_batch(cls, number: int) -> int:
+        start = cls.num_per_batch * number
+        count = min(cls.num_per_batch, cls.total_count - start)
+        if cls.buffers is None:
+            # the insert is done with a batch before the next one is generated, so one set of
+            # buffers per process is enough, and the batches are never pickled
+            cls.buffers = alloc_batch_buffers(cls.schema, cls.num_per_batch)
+        entities = gen_batch_columns(
+            cls.schema,
+            count,
+            start_id=start,
+            rng=np.random.default_rng(seed=number),
+            sequential_pk=True,
+            out=cls.buffers,
+            vector_dist=cls.vector_dist,
+        )
 
         logger.info(f"No.{number:2}: Start inserting entities")
         try:
-            ret = cls.collection.insert(entities)
-        except exception as e:
-            logger.info(f"error, e={e}")
+            ret = cls.collection.insert(list(entities.values()))
+        except Exception as e:
+            logger.error(f"No.{number:2}: insert failed, e={e}")
+            raise
 
         logger.info(f"Inserted {ret.insert_count} records")
+        return ret.insert_count
 
 
 class MilvusMultiProcessing(MilvusUploader):
-    def __init__(self, **connection_params):
+    def __init__(
+        self,
+        collection_name: str = "bench",
+        total_count: int = 1_000_000,
+        num_per_batch: int = 5000,
+        num_workers: int = 1,
+        vector_dist: VectorDistribution | None = None,
+        **connection_params,
+    ):
+        self.collection_name = collection_name
+        self.total_count = total_count
+        self.num_per_batch = num_per_batch
+        self.num_workers = num_workers
+        self.vector_dist = vector_dist
         self.connection_params = connection_params
 
-    def upload(self):
-        self.init_client(self.connection_params)
-        logger.info("connected")
+    def upload(self) -> int:
+        self.init_client(self.connection_params, self.collection_name)
+        batch_count = math.ceil(self.total_count / self.num_per_batch)
 
         ctx = get_context(self.__class__.get_mp_start_method())
+        inserted = 0
+        start_time = time.time()
         with ctx.Pool(
-            processes=1,
+            processes=self.num_workers,
             initializer=self.__class__.init_client,
-            initargs=(self.connection_params,),
+            initargs=(
+                self.connection_params,
+                self.collection_name,
+                self.num_per_batch,
+                self.total_count,
+                self.vector_dist,
+            ),
         ) as pool:
-            for res in pool.imap(self.__class__._upload_batch, range(1000000 // 5000)):
-                logger.info("OK")
+            for count in pool.imap_unordered(self.__class__._upload_batch, range(batch_count)):
+                inserted += count
+
+        duration = time.time() - start_time
+        logger.info(
+            f"Inserted {inserted} rows in {batch_count} batches by {self.num_workers} processes "
+            f"in {duration:.2f}s, {inserted / duration:.0f} rows/s"
+        )
+        return inserted
 
     @classmethod
-    def _upload_batch(cls, number):
+    def _upload_batch(cls, number: int) -> int:
         return cls.upload_batch(number)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", type=str, default="http://localhost:19530", help="uri to connect")
     parser.add_argument("-c", "--collection", type=str, required=True, help="collection name")
     parser.add_argument("-d", "--dim", type=int, default=768, help="dimension of the vectors")
     parser.add_argument(
@@ -183,6 +281,36 @@ if __name__ == "__main__":
         action="store_true",
         help="Whether to create a new collection or use the existing one",
     )
+    parser.add_argument(
+        "-r", "--num_rows", type=int, default=1_000_000, help="total num rows inserted"
+    )
+    parser.add_argument("-b", "--batch", type=int, default=5000, help="num rows per insert")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="num of insert processes")
+    add_vector_args(parser)
+    add_sink_args(parser)
 
     flags = parser.parse_args()
-    #  TODO
+    sink = sink_from_flags(flags, default_schema(flags.dim))
+    if sink is not None:
+        # the sinks live in this process, the workers are threads inserting the default schema
+        MilvusMultiThreadingInsert(
+            flags.collection,
+            flags.num_rows,
+            flags.batch,
+            flags.dim,
+            max_workers=flags.workers,
+            sink=sink,
+            vector_dist=vector_dist_from_flags(flags),
+        ).run()
+        logger.info(f"Sink {type(sink).__name__}: {sink.stats}")
+        sys.exit(0)
+
+    prepare_collection(flags.collection, flags.dim, flags.new, uri=flags.uri)
+    MilvusMultiProcessing(
+        collection_name=flags.collection,
+        total_count=flags.num_rows,
+        num_per_batch=flags.batch,
+        num_workers=flags.workers,
+        vector_dist=vector_dist_from_flags(flags),
+        uri=flags.uri,
+    ).upload()
@@ -0,0 +1,211 @@
+"""Per stage latency and throughput of the load paths, to tell client CPU from the network and
+from server flush time when ingestion slows down.
+
+Stages: generate and serialize run on the client, insert/delete/query are RPCs, flush and
+load wait on the server.
+
+    with registry.stage("insert", rows=len(data), nbytes=size):
+        c.insert(data)
+
+    registry.serve(9100)              # Prometheus text at http://localhost:9100/metrics
+    registry.dump_at_exit("run.json") # p50/p95/p99, counters and gauges when the script exits
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+PREFIX = "milvus_script"
+QUANTILES = (0.5, 0.95, 0.99, 0.999)
+
+# log scale buckets ~9% wide from 1us, quantiles are within a bucket of the truth
+_MIN_SECONDS = 1e-6
+_GROWTH = 2**0.125
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets: dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        i = 0
+        if seconds > _MIN_SECONDS:
+            i = math.ceil(math.log(seconds / _MIN_SECONDS, _GROWTH))
+        self.buckets[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        target, seen = q * self.count, 0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen >= target:
+                return min(self.max, _MIN_SECONDS * _GROWTH**i)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            **{f"p{q * 100:g}": self.quantile(q) for q in QUANTILES},
+            "max": self.max,
+            "sum": self.sum,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._latency: dict[str, Histogram] = defaultdict(Histogram)
+        self._rows: dict[str, int] = defaultdict(int)
+        self._bytes: dict[str, int] = defaultdict(int)
+        self._in_flight: dict[str, int] = defaultdict(int)
+        self._gauges: dict[str, float] = {}
+        self._server: ThreadingHTTPServer | None = None
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0, nbytes: int = 0) -> Iterator[None]:
+        """Time the block as one `name` operation, counting it in flight while it runs"""
+        with self._lock:
+            self._in_flight[name] += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._in_flight[name] -= 1
+                self._latency[name].observe(elapsed)
+                self._rows[name] += rows
+                self._bytes[name] += nbytes
+
+    def observe(self, name: str, seconds: float, rows: int = 0, nbytes: int = 0):
+        """Record an operation timed elsewhere"""
+        with self._lock:
+            self._latency[name].observe(seconds)
+            self._rows[name] += rows
+            self._bytes[name] += nbytes
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def summary(self) -> dict:
+        with self._lock:
+            uptime = time.monotonic() - self.started
+            return {
+                "uptime": uptime,
+                "stages": {
+                    name: {
+                        **hist.summary(),
+                        "rows": self._rows[name],
+                        "bytes": self._bytes[name],
+                        "rows_per_sec": self._rows[name] / uptime if uptime > 0 else 0.0,
+                        "in_flight": self._in_flight[name],
+                    }
+                    for name, hist in self._latency.items()
+                },
+                "gauges": dict(self._gauges),
+            }
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            lines.append(f"# TYPE {PREFIX}_stage_seconds summary")
+            for name, hist in self._latency.items():
+                lines.extend(
+                    f'{PREFIX}_stage_seconds{{stage="{name}",quantile="{q}"}} {hist.quantile(q)}'
+                    for q in QUANTILES
+                )
+                lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{name}"}} {hist.sum}')
+                lines.append(f'{PREFIX}_stage_seconds_count{{stage="{name}"}} {hist.count}')
+            for metric, values in (("rows", self._rows), ("bytes", self._bytes)):
+                lines.append(f"# TYPE {PREFIX}_{metric}_total counter")
+                lines.extend(
+                    f'{PREFIX}_{metric}_total{{stage="{name}"}} {v}' for name, v in values.items()
+                )
+            lines.append(f"# TYPE {PREFIX}_in_flight gauge")
+            lines.extend(
+                f'{PREFIX}_in_flight{{stage="{name}"}} {v}' for name, v in self._in_flight.items()
+            )
+            for name, v in self._gauges.items():
+                lines.append(f"# TYPE {PREFIX}_{name} gauge")
+                lines.append(f"{PREFIX}_{name} {v}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:  # noqa: S104
+        """Prometheus text on every path of `host:port`, from a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{self._server.server_port}/metrics")
+        return self._server
+
+    def dump(self, path: str | Path):
+        with Path(path).open("w") as f:
+            json.dump(self.summary(), f, indent=2)
+        logger.info(f"Saved metrics summary to {path}")
+
+    def dump_at_exit(self, path: str | Path):
+        atexit.register(self.dump, path)
+
+    def report(self) -> str:
+        return "\n".join(
+            f"{name:<10} n={s['count']:<8} p50={s['p50'] * 1000:.2f}ms p95={s['p95'] * 1000:.2f}ms "
+            f"p99={s['p99'] * 1000:.2f}ms max={s['max'] * 1000:.2f}ms rows={s['rows']}"
+            for name, s in self.summary()["stages"].items()
+        )
+
+
+# the process wide registry every load path records into
+registry = MetricsRegistry()
+
+
+def add_metrics_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--metrics_port", type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument("--metrics_json", type=str, help="save a metrics summary here at exit")
+
+
+def setup_metrics(flags: argparse.Namespace):
+    if flags.metrics_port is not None:
+        registry.serve(flags.metrics_port)
+    if flags.metrics_json is not None:
+        registry.dump_at_exit(flags.metrics_json)
+    atexit.register(_log_report)
+
+
+def _log_report():
+    if registry.summary()["stages"]:
+        logger.info(f"Stage latency:\n{registry.report()}")
@@ -0,0 +1,644 @@
+"""Ingest, upsert, delete and read streams running at the same time against one collection,
+each at its own rate and with its own latency, to see how L0 delete buffering, compaction and
+search latency get in each other's way under concurrent load.
+
+python -m src.mixed_workload -c test_mixed --new --duration 600 \
+    --ingest_workers 2 --ingest_mb_per_sec 8 \
+    --upsert_workers 2 --upsert_mb_per_sec 8 --upsert_overlap 0.8 \
+    --delete_ratio 0.2 \
+    --read_workers 8 --read_qps 200 --nprobe 16
+
+Deletes take random pks out of the live ones, inserted by this run(or recorded in `--pk_ledger`
+by an earlier load) and not deleted yet. With `ratio` the delete stream keeps up with `ratio`
+of the rows inserted so far, with `rows_per_sec` it deletes at that rate as long as there are
+pks left, with both the ratio is capped by it.
+
+Upserts re-target `overlap` of each batch at live pks, which stay live, the rest are fresh
+pks that become live. Every re-targeted pk deletes its old row, so the result reports them as
+`replaced` next to the L0 segments and their delete rows, sampled at every report.
+
+Every `report_interval` seconds each stream logs its rate and latency over the interval,
+kept in the result's timeline. Latencies are the RPCs', a stream falling behind its target
+shows as an achieved rate under it.
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel
+from pymilvus import CollectionSchema, MilvusClient
+from pymilvus.client.types import SegmentState
+
+from .common_func import estimate_count_by_size, estimate_size_by_count
+from .connection_pool import DEFAULT_POOL_SIZE, get_pool
+from .data_utils import columns_to_rows, gen_batch_columns
+from .delete_engine import build_delete_exprs
+from .generate_segment import MAX_BATCH_SIZE
+from .metrics import Histogram, add_metrics_args, registry, setup_metrics
+from .pk_ledger import PKLedger
+from .rate_limiter import TokenBucket
+from .read_load import ReadKind, ReadLoadDriver, ReadRequest
+from .scenario import CollectionSpec
+from .vector_dist import VectorDistribution, add_vector_args, vector_dist_from_flags
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+MB = 1024 * 1024
+# seconds a delete worker waits for the ingest to owe it a batch
+_DELETE_POLL = 0.05
+
+
+class IngestStream(BaseModel):
+    workers: int = 1
+    batch: int = 1000
+    # as fast as possible if neither is set
+    rows_per_sec: float | None = None
+    mb_per_sec: float | None = None
+    # sequential INT64 pks from it, random ones if None
+    pk_start: int | None = None
+    # None draws uniform vectors
+    vector_dist: VectorDistribution | None = None
+
+
+class UpsertStream(BaseModel):
+    workers: int = 1
+    # rows per upsert, None for the 5MB batches of stream_insert
+    batch: int | None = None
+    # fraction of each batch re-targeted at live pks, the rest are fresh pks
+    overlap: float = 0.5
+    # as fast as possible if neither is set
+    rows_per_sec: float | None = None
+    mb_per_sec: float | None = None
+    vector_dist: VectorDistribution | None = None
+
+
+class DeleteStream(BaseModel):
+    workers: int = 1
+    # pks per delete request
+    batch: int = 1000
+    # deleted rows per inserted row
+    ratio: float | None = 0.2
+    rows_per_sec: float | None = None
+
+
+class ReadStream(BaseModel):
+    workers: int = 1
+    # None runs closed loop
+    qps: float | None = None
+    request: ReadRequest = ReadRequest()
+    vector_dist: VectorDistribution | None = None
+
+
+class MixedWorkload(BaseModel):
+    collection_name: str
+    duration: float = 60.0
+    report_interval: float = 10.0
+    # None leaves the stream out
+    ingest: IngestStream | None = IngestStream()
+    upsert: UpsertStream | None = None
+    delete: DeleteStream | None = DeleteStream()
+    read: ReadStream | None = ReadStream()
+    # sample the collection's segments at every report, for the L0 growth
+    watch_segments: bool = True
+    connection_config: dict = {"uri": "http://localhost:19530"}
+
+
+class StreamStats(BaseModel):
+    name: str
+    # seconds since the start, at the end of the interval
+    at: float
+    seconds: float
+    ops: int
+    rows: int
+    errors: int
+    ops_per_sec: float
+    rows_per_sec: float
+    mean: float
+    p50: float
+    p99: float
+    p999: float
+    max: float
+
+    def __str__(self):
+        return (
+            f"{self.name:<8} {self.ops_per_sec:>9.1f} ops/s {self.rows_per_sec:>11.1f} rows/s "
+            f"{self.errors} errors, p50 {self.p50 * 1000:.2f}ms p99 {self.p99 * 1000:.2f}ms "
+            f"p999 {self.p999 * 1000:.2f}ms max {self.max * 1000:.2f}ms"
+        )
+
+
+class SegmentSnapshot(BaseModel):
+    at: float
+    segments: int
+    rows: int
+    l0_segments: int
+    # delete records buffered in the L0 segments
+    l0_rows: int
+
+    def __str__(self):
+        return (
+            f"segments {self.segments} of {self.rows} rows, "
+            f"L0 {self.l0_segments} of {self.l0_rows} deletes"
+        )
+
+
+class MixedResult(BaseModel):
+    duration: float
+    inserted: int
+    deleted: int
+    upserted: int = 0
+    # upserted rows that replaced a live pk, each one a delete record
+    replaced: int = 0
+    streams: list[StreamStats]
+    timeline: list[StreamStats]
+    segments: list[SegmentSnapshot] = []
+
+    def __str__(self):
+        head = (
+            f"Mixed workload: {self.duration:.2f}s, inserted {self.inserted}, "
+            f"deleted {self.deleted}, upserted {self.upserted}, replaced {self.replaced}"
+        )
+        lines = [head]
+        lines.extend(f"  {s}" for s in self.streams)
+        if self.segments:
+            first, last = self.segments[0], self.segments[-1]
+            lines.append(
+                f"  L0 segments {first.l0_segments} -> {last.l0_segments}, "
+                f"max {max(s.l0_segments for s in self.segments)}, "
+                f"L0 deletes {first.l0_rows} -> {last.l0_rows}"
+            )
+        return "\n".join(lines)
+
+
+class LivePKs:
+    """PKs inserted and not taken for deletion yet, in a growable array"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pks: np.ndarray | None = None
+        self._size = 0
+        self.inserted = 0
+        self.taken = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, pks: list | np.ndarray, inserted: bool = True) -> None:
+        """`inserted` False for pks loaded before the run, the delete ratio doesn't owe them"""
+        if len(pks) == 0:
+            return
+        new = PKLedger.as_array(pks)
+        with self._lock:
+            if self._pks is None:
+                self._pks = np.empty(max(1024, 2 * len(new)), dtype=new.dtype)
+            elif self._size + len(new) > len(self._pks):
+                grown = np.empty(2 * (self._size + len(new)), dtype=self._pks.dtype)
+                grown[: self._size] = self._pks[: self._size]
+                self._pks = grown
+            self._pks[self._size : self._size + len(new)] = new
+            self._size += len(new)
+            if inserted:
+                self.inserted += len(new)
+
+    def due(self, ratio: float | None) -> int:
+        """PKs the deletes may take now to stay at `ratio` of the inserted ones"""
+        if ratio is None:
+            return self._size
+        return min(self._size, int(ratio * self.inserted) - self.taken)
+
+    def take(self, n: int, rng: np.random.Generator, ratio: float | None = None) -> np.ndarray:
+        """Up to `n` random pks, removed so they're never taken twice"""
+        with self._lock:
+            taken = self._remove(min(n, self.due(ratio)), rng)
+            self.taken += len(taken)
+        return taken
+
+    def hold(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """Up to `n` random pks out of reach of `take` and other holds until `release`d"""
+        with self._lock:
+            return self._remove(min(n, self._size), rng)
+
+    def release(self, pks: np.ndarray) -> None:
+        self.add(pks, inserted=False)
+
+    def _remove(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """Up to `n` distinct random pks, removed, under the lock"""
+        if n <= 0:
+            return np.empty(0, dtype=np.int64)
+        idx = np.unique(rng.integers(0, self._size, n))
+        removed = self._pks[idx].copy()
+        # the tail rows that weren't removed fill the holes the removed ones left
+        tail_start = self._size - len(idx)
+        tail = np.arange(tail_start, self._size)
+        holes = idx[idx < tail_start]
+        self._pks[holes] = self._pks[tail[~np.isin(tail, idx)]]
+        self._size = tail_start
+        return removed
+
+
+class _Stream:
+    """Latency of one stream since the start and since the last report"""
+
+    def __init__(self, name: str, stage: str, rate: float | None = None):
+        self.name = name
+        self.stage = stage
+        self.bucket = None if rate is None else TokenBucket(rate)
+        self._lock = threading.Lock()
+        self.total, self.window = Histogram(), Histogram()
+        self.rows, self.window_rows = 0, 0
+        self.errors, self.window_errors = 0, 0
+
+    def throttle(self, amount: float):
+        if self.bucket is not None:
+            self.bucket.acquire(amount)
+
+    def observe(self, seconds: float, rows: int, nbytes: int = 0):
+        registry.observe(self.stage, seconds, rows, nbytes)
+        with self._lock:
+            self.total.observe(seconds)
+            self.window.observe(seconds)
+            self.rows += rows
+            self.window_rows += rows
+
+    def fail(self, e: Exception):
+        with self._lock:
+            self.errors += 1
+            self.window_errors += 1
+            first = self.errors == 1
+        if first:
+            logger.warning(f"{self.name}: {self.stage} failed, e={e}")
+
+    def _stats(self, hist: Histogram, rows: int, errors: int, at: float, seconds: float):
+        return StreamStats(
+            name=self.name,
+            at=at,
+            seconds=seconds,
+            ops=hist.count,
+            rows=rows,
+            errors=errors,
+            ops_per_sec=hist.count / seconds if seconds > 0 else 0.0,
+            rows_per_sec=rows / seconds if seconds > 0 else 0.0,
+            mean=hist.sum / hist.count if hist.count else 0.0,
+            p50=hist.quantile(0.5),
+            p99=hist.quantile(0.99),
+            p999=hist.quantile(0.999),
+            max=hist.max,
+        )
+
+    def stats(self, at: float) -> StreamStats:
+        with self._lock:
+            return self._stats(self.total, self.rows, self.errors, at, at)
+
+    def roll(self, at: float, seconds: float) -> StreamStats:
+        """Stats of the interval, and start the next one"""
+        with self._lock:
+            stats = self._stats(self.window, self.window_rows, self.window_errors, at, seconds)
+            self.window, self.window_rows, self.window_errors = Histogram(), 0, 0
+        return stats
+
+
+class MixedWorkloadRunner:
+    def __init__(self, workload: MixedWorkload, pool_size: int | None = None):
+        self.workload = workload
+        self.collection_name = workload.collection_name
+        streams = (workload.ingest, workload.upsert, workload.delete, workload.read)
+        workers = sum(s.workers for s in streams if s is not None)
+        self.pool_size = max(DEFAULT_POOL_SIZE, workers) if pool_size is None else pool_size
+        self.live = LivePKs()
+        self.stop = threading.Event()
+        self._schema: CollectionSchema | None = None
+        self._pk_lock = threading.Lock()
+        self._next_pk = None if workload.ingest is None else workload.ingest.pk_start
+        self.replaced = 0
+
+    def client(self) -> MilvusClient:
+        return get_pool(self.pool_size, **self.workload.connection_config).get()
+
+    def schema(self) -> CollectionSchema:
+        if self._schema is None:
+            desc = self.client().describe_collection(self.collection_name)
+            self._schema = CollectionSchema.construct_from_dict(desc)
+        return self._schema
+
+    def _pk_start(self, count: int) -> int | None:
+        if self._next_pk is None:
+            return None
+        with self._pk_lock:
+            start = self._next_pk
+            self._next_pk += count
+        return start
+
+    def _ingest(self, worker: int, stream: _Stream):
+        cfg = self.workload.ingest
+        schema = self.schema()
+        rng = np.random.default_rng([worker, time.time_ns()])
+        nbytes = estimate_size_by_count(cfg.batch, schema)
+        while not self.stop.is_set():
+            stream.throttle(cfg.batch if cfg.mb_per_sec is None else nbytes)
+            pk_start = self._pk_start(cfg.batch)
+            columns = gen_batch_columns(
+                schema,
+                cfg.batch,
+                start_id=0 if pk_start is None else pk_start,
+                rng=rng,
+                sequential_pk=pk_start is not None,
+                vector_dist=cfg.vector_dist,
+            )
+            rows = columns_to_rows(columns)
+            start = time.perf_counter()
+            try:
+                rt = self.client().insert(self.collection_name, rows)
+            except Exception as e:
+                stream.fail(e)
+                continue
+            stream.observe(time.perf_counter() - start, len(rows), nbytes)
+            self.live.add(rt["ids"])
+
+    def _upsert(self, worker: int, stream: _Stream):
+        cfg = self.workload.upsert
+        schema = self.schema()
+        pk_field = schema.primary_field.name
+        if schema.primary_field.auto_id:
+            msg = "Upserts re-target pks, the collection can't have auto id"
+            raise ValueError(msg)
+        batch = cfg.batch or estimate_count_by_size(MAX_BATCH_SIZE, schema)
+        nbytes = estimate_size_by_count(batch, schema)
+        rng = np.random.default_rng([worker, time.time_ns()])
+        while not self.stop.is_set():
+            stream.throttle(batch if cfg.mb_per_sec is None else nbytes)
+            pk_start = self._pk_start(batch)
+            columns = gen_batch_columns(
+                schema,
+                batch,
+                start_id=0 if pk_start is None else pk_start,
+                rng=rng,
+                sequential_pk=pk_start is not None,
+                vector_dist=cfg.vector_dist,
+            )
+            # held until the upsert returns, so the deletes can't take a pk it's re-targeting
+            existing = self.live.hold(int(cfg.overlap * batch), rng)
+            try:
+                pks = columns[pk_field]
+                pks[: len(existing)] = existing if pks.dtype.kind in "iu" else existing.astype(str)
+                rows = columns_to_rows(columns)
+                start = time.perf_counter()
+                try:
+                    self.client().upsert(self.collection_name, rows)
+                except Exception as e:
+                    stream.fail(e)
+                    continue
+                stream.observe(time.perf_counter() - start, len(rows), nbytes)
+                self.live.add(pks[len(existing) :])
+                with self._pk_lock:
+                    self.replaced += len(existing)
+            finally:
+                self.live.release(existing)
+
+    def segments(self, at: float) -> SegmentSnapshot:
+        segments = self.client().list_persistent_segments(
+            self.collection_name, states=[SegmentState.Flushed]
+        )
+        l0 = [s for s in segments if s.level_name == "L0"]
+        registry.set_gauge("l0_segments", len(l0))
+        return SegmentSnapshot(
+            at=at,
+            segments=len(segments) - len(l0),
+            rows=sum(s.num_rows for s in segments if s.level_name != "L0"),
+            l0_segments=len(l0),
+            l0_rows=sum(s.num_rows for s in l0),
+        )
+
+    def _delete(self, worker: int, stream: _Stream):
+        cfg = self.workload.delete
+        pk_field = self.schema().primary_field.name
+        rng = np.random.default_rng([worker, time.time_ns()])
+        while not self.stop.is_set():
+            # wait for a whole batch, deleting as soon as one pk is due makes tiny deletes
+            if self.live.due(cfg.ratio) < min(cfg.batch, max(1, len(self.live))):
+                self.stop.wait(_DELETE_POLL)
+                continue
+            stream.throttle(cfg.batch)
+            pks = self.live.take(cfg.batch, rng, cfg.ratio)
+            for expr in build_delete_exprs(pk_field, pks):
+                start = time.perf_counter()
+                try:
+                    rt = self.client().delete(self.collection_name, filter=expr)
+                except Exception as e:
+                    stream.fail(e)
+                    continue
+                stream.observe(time.perf_counter() - start, rt["delete_count"])
+
+    def _read(self, worker: int, stream: _Stream, send: Callable[[np.random.Generator], int]):
+        rng = np.random.default_rng([worker, time.time_ns()])
+        while not self.stop.is_set():
+            stream.throttle(1)
+            start = time.perf_counter()
+            try:
+                hits = send(rng)
+            except Exception as e:
+                stream.fail(e)
+                continue
+            stream.observe(time.perf_counter() - start, hits)
+
+    def _workers(self) -> list[tuple[_Stream, Callable[[int], None], int]]:
+        """(stream, worker function taking its index, num of workers) of the streams run"""
+        w = self.workload
+        workers = []
+        if w.ingest is not None and w.ingest.workers > 0:
+            rate = w.ingest.rows_per_sec
+            if w.ingest.mb_per_sec is not None:
+                rate = w.ingest.mb_per_sec * MB
+            stream = _Stream("ingest", "insert", rate)
+            workers.append((stream, lambda i, s=stream: self._ingest(i, s), w.ingest.workers))
+        if w.upsert is not None and w.upsert.workers > 0:
+            rate = w.upsert.rows_per_sec
+            if w.upsert.mb_per_sec is not None:
+                rate = w.upsert.mb_per_sec * MB
+            stream = _Stream("upsert", "upsert", rate)
+            workers.append((stream, lambda i, s=stream: self._upsert(i, s), w.upsert.workers))
+        if w.delete is not None and w.delete.workers > 0:
+            stream = _Stream("delete", "delete", w.delete.rows_per_sec)
+            workers.append((stream, lambda i, s=stream: self._delete(i, s), w.delete.workers))
+        if w.read is not None and w.read.workers > 0:
+            stream = _Stream(w.read.request.kind.value, w.read.request.kind.value, w.read.qps)
+            driver = ReadLoadDriver(
+                self.collection_name,
+                w.read.vector_dist,
+                pool_size=self.pool_size,
+                **w.connection_config,
+            )
+            send = driver.request_func(w.read.request)
+            workers.append((stream, lambda i, s=stream: self._read(i, s, send), w.read.workers))
+        return workers
+
+    def _watch(self, segments: list[SegmentSnapshot], at: float) -> bool:
+        """Append a snapshot of the segments, False if they can't be listed, not worth failing
+        the workload for
+        """
+        try:
+            segments.append(self.segments(at))
+        except Exception as e:
+            logger.warning(f"Stop watching the segments, e={e}")
+            return False
+        logger.info(f"[{at:>7.1f}s] {segments[-1]}")
+        return True
+
+    def run(self) -> MixedResult:
+        workers = self._workers()
+        streams = [s for s, _, _ in workers]
+        names = ", ".join(f"{s.name} x{n}" for s, _, n in workers)
+        logger.info(
+            f"Mixed workload on {self.collection_name} for {self.workload.duration}s: {names}"
+        )
+        timeline, segments = [], []
+        watch_segments = self.workload.watch_segments
+        self.stop.clear()
+        start = time.perf_counter()
+        last = start
+        if watch_segments:
+            watch_segments = self._watch(segments, 0.0)
+        executor = ThreadPoolExecutor(max_workers=sum(n for _, _, n in workers))
+        try:
+            futures = [executor.submit(f, i) for _, f, n in workers for i in range(n)]
+            deadline = start + self.workload.duration
+            while last < deadline:
+                self.stop.wait(min(self.workload.report_interval, deadline - last))
+                now = time.perf_counter()
+                for s in streams:
+                    stats = s.roll(now - start, now - last)
+                    logger.info(f"[{now - start:>7.1f}s] {stats}")
+                    timeline.append(stats)
+                if watch_segments:
+                    watch_segments = self._watch(segments, now - start)
+                last = now
+                # a worker only returns early on a bug, don't run the rest without it
+                for f in futures:
+                    if f.done():
+                        f.result()
+        finally:
+            self.stop.set()
+            executor.shutdown(wait=True)
+
+        duration = time.perf_counter() - start
+        result = MixedResult(
+            duration=duration,
+            inserted=self.live.inserted,
+            deleted=sum(s.rows for s in streams if s.name == "delete"),
+            upserted=sum(s.rows for s in streams if s.name == "upsert"),
+            replaced=self.replaced,
+            streams=[s.stats(duration) for s in streams],
+            timeline=timeline,
+            segments=segments,
+        )
+        logger.info(str(result))
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", type=str, default="http://localhost:19530", help="uri to connect")
+    parser.add_argument("-c", "--collection", type=str, required=True, help="collection name")
+    parser.add_argument("--new", action="store_true", help="recreate the collection, FLAT indexed")
+    parser.add_argument("-d", "--dim", type=int, default=128, help="dim of a new collection")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--report_interval", type=float, default=10, help="seconds per report")
+
+    parser.add_argument("--ingest_workers", type=int, default=1, help="0 to not insert")
+    parser.add_argument("--ingest_batch", type=int, default=1000, help="rows per insert")
+    parser.add_argument("--ingest_rows_per_sec", type=float, help="insert rate in rows/s")
+    parser.add_argument("--ingest_mb_per_sec", type=float, help="insert rate in MB/s")
+    parser.add_argument("--pk_start", type=int, help="sequential pks from it, random if not set")
+
+    parser.add_argument("--upsert_workers", type=int, default=0, help="0 to not upsert")
+    parser.add_argument("--upsert_batch", type=int, help="rows per upsert, 5MB if not set")
+    parser.add_argument("--upsert_overlap", type=float, default=0.5, help="re-targeted pks")
+    parser.add_argument("--upsert_rows_per_sec", type=float, help="upsert rate in rows/s")
+    parser.add_argument("--upsert_mb_per_sec", type=float, help="upsert rate in MB/s")
+    parser.add_argument("--pk_ledger", type=str, help="PKLedger dir of pks loaded before")
+
+    parser.add_argument("--delete_workers", type=int, default=1, help="0 to not delete")
+    parser.add_argument("--delete_batch", type=int, default=1000, help="pks per delete")
+    parser.add_argument("--delete_ratio", type=float, help="deleted per inserted row")
+    parser.add_argument("--delete_rows_per_sec", type=float, help="delete rate in rows/s")
+
+    parser.add_argument("--read_workers", type=int, default=1, help="0 to not read")
+    parser.add_argument("--read_qps", type=float, help="fixed rate, closed loop if not set")
+    parser.add_argument("--kind", type=ReadKind, choices=list(ReadKind), default=ReadKind.SEARCH)
+    parser.add_argument("--filter", type=str, default="", help='e.g. "pk > {key}"')
+    parser.add_argument("--num_keys", type=int, default=1, help="keys the {key} filter draws")
+    parser.add_argument("--topk", type=int, default=10, help="search topk, or query limit")
+    parser.add_argument("--nq", type=int, default=1, help="vectors per search")
+    parser.add_argument("--nprobe", type=int, help="search param nprobe")
+
+    parser.add_argument("--no_segments", action="store_true", help="don't sample the segments")
+    parser.add_argument("-o", "--output", type=str, help="save the result as json")
+    add_vector_args(parser)
+    add_metrics_args(parser)
+
+    flags = parser.parse_args()
+    setup_metrics(flags)
+    vector_dist = vector_dist_from_flags(flags)
+    delete_ratio = flags.delete_ratio
+    if delete_ratio is None and flags.delete_rows_per_sec is None:
+        delete_ratio = 0.2
+    workload = MixedWorkload(
+        collection_name=flags.collection,
+        duration=flags.duration,
+        report_interval=flags.report_interval,
+        ingest=IngestStream(
+            workers=flags.ingest_workers,
+            batch=flags.ingest_batch,
+            rows_per_sec=flags.ingest_rows_per_sec,
+            mb_per_sec=flags.ingest_mb_per_sec,
+            pk_start=flags.pk_start,
+            vector_dist=vector_dist,
+        ),
+        upsert=UpsertStream(
+            workers=flags.upsert_workers,
+            batch=flags.upsert_batch,
+            overlap=flags.upsert_overlap,
+            rows_per_sec=flags.upsert_rows_per_sec,
+            mb_per_sec=flags.upsert_mb_per_sec,
+            vector_dist=vector_dist,
+        ),
+        delete=DeleteStream(
+            workers=flags.delete_workers,
+            batch=flags.delete_batch,
+            ratio=delete_ratio,
+            rows_per_sec=flags.delete_rows_per_sec,
+        ),
+        read=ReadStream(
+            workers=flags.read_workers,
+            qps=flags.read_qps,
+            request=ReadRequest(
+                kind=flags.kind,
+                filter=flags.filter,
+                num_keys=flags.num_keys,
+                topk=flags.topk,
+                nq=flags.nq,
+                search_params={} if flags.nprobe is None else {"params": {"nprobe": flags.nprobe}},
+            ),
+            vector_dist=vector_dist,
+        ),
+        watch_segments=not flags.no_segments,
+        connection_config={"uri": flags.uri},
+    )
+    runner = MixedWorkloadRunner(workload)
+    if flags.new:
+        CollectionSpec(name=flags.collection, dim=flags.dim).create(runner.client())
+    elif flags.pk_ledger:
+        for pks in PKLedger(flags.pk_ledger):
+            runner.live.add(np.asarray(pks), inserted=False)
+        logger.info(f"{len(runner.live)} live pks from {flags.pk_ledger}")
+    result = runner.run()
+    if flags.output:
+        with Path(flags.output).open("w") as f:
+            json.dump(result.model_dump(), f, indent=2)
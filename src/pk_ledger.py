@@ -0,0 +1,67 @@
+"""Primary keys of inserted segments kept on disk instead of in python lists.
+
+One `.npy` per segment(or batch) in a directory, int64 for INT64 pks and fixed width bytes for
+VARCHAR pks, read back memory-mapped so sampling only touches the sampled pages.
+
+    ledger = PKLedger("pks/test1")
+    ledger.append(rt.primary_keys)
+    for i in range(len(ledger)):
+        to_delete = ledger.sample(i, 0.2)
+"""
+
+import logging
+import shutil
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+
+class PKLedger:
+    def __init__(self, directory: str | Path, clear: bool = False):
+        self.directory = Path(directory)
+        if clear and self.directory.exists():
+            shutil.rmtree(self.directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._files = sorted(self.directory.glob("pks_*.npy"))
+
+    @staticmethod
+    def as_array(pks: Sequence[int | str] | np.ndarray) -> np.ndarray:
+        pks = np.asarray(pks)
+        if pks.dtype.kind in "iu":
+            return pks.astype(np.int64, copy=False)
+        return pks.astype(bytes)
+
+    def append(self, pks: Sequence[int | str] | np.ndarray) -> int:
+        """Persist one segment of pks, returns its index"""
+        path = self.directory / f"pks_{len(self._files):06d}.npy"
+        np.save(path, self.as_array(pks))
+        self._files.append(path)
+        return len(self._files) - 1
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __getitem__(self, i: int | slice) -> np.ndarray | list[np.ndarray]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return np.load(self._files[i], mmap_mode="r")
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def num_rows(self) -> int:
+        return sum(len(pks) for pks in self)
+
+    def sample(self, i: int, fraction: float, rng: np.random.Generator | None = None) -> np.ndarray:
+        """`fraction` of segment `i`'s pks without replacement, reading only the sampled rows"""
+        rng = np.random.default_rng() if rng is None else rng
+        pks = self[i]
+        idx = rng.choice(len(pks), size=int(fraction * len(pks)), replace=False)
+        idx.sort()
+        return np.asarray(pks[idx])
@@ -0,0 +1,98 @@
+"""Token bucket pacing for ingestion at a known rate, in Bytes/s or rows/s.
+
+Tokens accrue with wall time whatever the RPC latency is, so a slow request is made up
+by shorter waits after it and the long run average stays on target.
+"""
+
+import logging
+import threading
+import time
+
+from pydantic import BaseModel, model_validator
+
+from .segment_distribution import Size
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+
+class RateLimit(BaseModel):
+    size_per_sec: Size | None = None
+    rows_per_sec: float | None = None
+    # Bytes or rows allowed above the rate after being idle, default one second worth
+    burst: float | None = None
+    # seconds to run, None to run forever
+    duration: float | None = None
+
+    @model_validator(mode="after")
+    def check_one_rate(self):
+        if (self.size_per_sec is None) == (self.rows_per_sec is None):
+            msg = "Exactly one of size_per_sec and rows_per_sec is required"
+            raise ValueError(msg)
+        return self
+
+    @property
+    def by_rows(self) -> bool:
+        return self.rows_per_sec is not None
+
+    @property
+    def rate(self) -> float:
+        return self.rows_per_sec if self.by_rows else self.size_per_sec.as_bytes()
+
+    @property
+    def unit(self) -> str:
+        return "rows" if self.by_rows else "Bytes"
+
+    def bucket(self) -> "TokenBucket":
+        return TokenBucket(self.rate, self.burst)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+
+        self._lock = threading.Lock()
+        # start empty, the burst only builds up while idle so the average isn't inflated
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self.started = self._last
+        self.consumed = 0.0
+        self.waited = 0.0
+
+    def acquire(self, amount: float) -> float:
+        """Take `amount` tokens at once, the balance may go negative, then sleep until it's back
+        at zero. Returns the seconds slept.
+
+        A request larger than the burst runs into debt: its caller sleeps the debt off, and the
+        next callers wait behind it until the refill has paid it back.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            self.consumed += amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += wait
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def achieved(self) -> float:
+        return self.consumed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def report(self, unit: str = "Bytes") -> str:
+        scale = 1024 * 1024 if unit == "Bytes" else 1
+        unit = "MB" if unit == "Bytes" else unit
+        return (
+            f"achieved {self.achieved / scale:.2f} {unit}/s, target {self.rate / scale:.2f} {unit}/s "
+            f"({self.achieved / self.rate:.1%}), {self.consumed / scale:.2f} {unit} "
+            f"in {self.elapsed:.2f}s, throttled {self.waited:.2f}s"
+        )
@@ -0,0 +1,341 @@
+"""Search/query traffic against a collection, to see read latency while segments and L0 deletes
+pile up under the loaders.
+
+python -m src.read_load -c test_segment_rate_coll --concurrency 8 --qps 200 \
+    --filter "session_id == {key}" --num_keys 16 --nprobe 16 --phases 10 --duration 60
+
+Closed loop, the default, has `concurrency` threads each sending its next request as soon as
+the last one returns, it finds the max QPS. With `qps` requests are scheduled at a fixed rate
+and a request's latency runs from its scheduled time, so a stalled server shows up as
+latency instead of as fewer requests(coordinated omission).
+
+With `--ground_truth gt.npz` from src.ground_truth, searches draw their vectors from its
+queries and the phases report recall@topk next to the latency.
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel
+from pymilvus import DataType, MilvusClient
+
+from .connection_pool import DEFAULT_POOL_SIZE, get_pool
+from .ground_truth import GroundTruth, recall_at_k
+from .metrics import Histogram, add_metrics_args, registry, setup_metrics
+from .vector_dist import VectorDistribution, add_vector_args, vector_dist_from_flags
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+
+class ReadKind(str, Enum):
+    SEARCH = "search"
+    QUERY = "query"
+
+
+class ReadRequest(BaseModel):
+    kind: ReadKind = ReadKind.SEARCH
+    # `{key}` is replaced by a random key in [0, num_keys) per request, e.g. "session_id == {key}"
+    filter: str = ""
+    num_keys: int = 1
+    topk: int = 10
+    nq: int = 1
+    search_params: dict = {}
+    output_fields: list[str] = []
+    # the first FLOAT_VECTOR field of the collection if None
+    anns_field: str | None = None
+
+    def expr(self, rng: np.random.Generator) -> str:
+        if "{key}" not in self.filter:
+            return self.filter
+        return self.filter.format(key=int(rng.integers(self.num_keys)))
+
+
+class Phase(BaseModel):
+    name: str
+    duration: float = 60.0
+    concurrency: int = 1
+    # None runs closed loop
+    qps: float | None = None
+    request: ReadRequest = ReadRequest()
+
+
+class PhaseResult(BaseModel):
+    name: str
+    requests: int
+    errors: int
+    duration: float
+    qps: float
+    target_qps: float | None = None
+    mean: float
+    p50: float
+    p99: float
+    p999: float
+    max: float
+    # mean recall@topk of the searches, with a ground truth
+    recall: float | None = None
+
+    def __str__(self):
+        target = "closed loop" if self.target_qps is None else f"target {self.target_qps:.0f}"
+        recall = "" if self.recall is None else f", recall {self.recall:.4f}"
+        return (
+            f"{self.name}: {self.requests} requests, {self.errors} errors in {self.duration:.2f}s, "
+            f"{self.qps:.1f} QPS ({target}), p50 {self.p50 * 1000:.2f}ms "
+            f"p99 {self.p99 * 1000:.2f}ms p999 {self.p999 * 1000:.2f}ms "
+            f"max {self.max * 1000:.2f}ms{recall}"
+        )
+
+
+class _Schedule:
+    """Send times of a fixed rate, shared by the workers so the rate is their total"""
+
+    def __init__(self, qps: float, start: float):
+        self.interval = 1.0 / qps
+        self.start = start
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def next(self) -> float:
+        with self._lock:
+            i = self._next
+            self._next += 1
+        return self.start + i * self.interval
+
+
+class _Mean:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, total: float, count: int):
+        with self._lock:
+            self.sum += total
+            self.count += count
+
+    @property
+    def value(self) -> float | None:
+        return self.sum / self.count if self.count else None
+
+
+class ReadLoadDriver:
+    def __init__(
+        self,
+        collection_name: str,
+        vector_dist: VectorDistribution | None = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        ground_truth: GroundTruth | None = None,
+        **connection_config,
+    ):
+        self.collection_name = collection_name
+        # query vectors come from the same distribution as the loaded ones for realistic recall
+        self.vector_dist = VectorDistribution() if vector_dist is None else vector_dist
+        # searches take their vectors from its queries and measure recall against it
+        self.ground_truth = ground_truth
+        self.pool_size = pool_size
+        self.connection_config = connection_config
+        self._vector_fields: dict[str, int] | None = None
+
+    def client(self) -> MilvusClient:
+        return get_pool(self.pool_size, **self.connection_config).get()
+
+    def vector_fields(self) -> dict[str, int]:
+        """Name to dim of the collection's FLOAT_VECTOR fields"""
+        if self._vector_fields is None:
+            desc = self.client().describe_collection(self.collection_name)
+            self._vector_fields = {
+                f["name"]: f["params"]["dim"]
+                for f in desc["fields"]
+                if f["type"] == DataType.FLOAT_VECTOR
+            }
+        return self._vector_fields
+
+    def request_func(
+        self, req: ReadRequest, recall: _Mean | None = None
+    ) -> Callable[[np.random.Generator], int]:
+        """One request of `req` per call, returns the num of hits or rows.
+
+        With a ground truth, searches add their recall@topk to `recall`.
+        """
+        if req.kind == ReadKind.QUERY:
+            if not req.filter:
+                msg = "A query needs a filter"
+                raise ValueError(msg)
+
+            def query(rng: np.random.Generator) -> int:
+                got = self.client().query(
+                    self.collection_name,
+                    filter=req.expr(rng),
+                    output_fields=req.output_fields,
+                    limit=req.topk,
+                )
+                return len(got)
+
+            return query
+
+        fields = self.vector_fields()
+        anns_field = next(iter(fields)) if req.anns_field is None else req.anns_field
+        dim = fields[anns_field]
+        gt = self.ground_truth
+        if gt is not None:
+            if req.filter:
+                logger.warning("The ground truth ignores filters, recall is only a lower bound")
+            if gt.k < req.topk:
+                msg = f"Ground truth has top {gt.k}, can't check recall@{req.topk}"
+                raise ValueError(msg)
+
+        def search(rng: np.random.Generator) -> int:
+            if gt is None:
+                vectors = self.vector_dist.generate(rng, req.nq, dim)
+            else:
+                rows = rng.integers(len(gt.queries), size=req.nq)
+                vectors = gt.queries[rows]
+            got = self.client().search(
+                self.collection_name,
+                data=list(vectors),
+                filter=req.expr(rng),
+                limit=req.topk,
+                output_fields=req.output_fields,
+                search_params=req.search_params,
+                anns_field=anns_field,
+            )
+            if gt is not None and recall is not None:
+                ids = [[hit["id"] for hit in hits] for hits in got]
+                recall.add(recall_at_k(ids, gt.ids[rows], req.topk) * len(ids), len(ids))
+            return sum(len(hits) for hits in got)
+
+        return search
+
+    def run_phase(self, phase: Phase) -> PhaseResult:
+        recall = _Mean()
+        send = self.request_func(phase.request, recall)
+        stage = phase.request.kind.value
+        hist = Histogram()
+        lock = threading.Lock()
+        errors = [0]
+        start = time.perf_counter()
+        deadline = start + phase.duration
+        schedule = None if phase.qps is None else _Schedule(phase.qps, start)
+
+        def worker(i: int):
+            rng = np.random.default_rng([self.vector_dist.seed, i, int(start * 1e6)])
+            while True:
+                sent = time.perf_counter() if schedule is None else schedule.next()
+                if sent >= deadline:
+                    return
+                if schedule is not None:
+                    time.sleep(max(0.0, sent - time.perf_counter()))
+                try:
+                    send(rng)
+                except Exception as e:
+                    with lock:
+                        errors[0] += 1
+                        first = errors[0] == 1
+                    if first:
+                        logger.warning(f"{phase.name}: {stage} failed, e={e}")
+                    continue
+                latency = time.perf_counter() - sent
+                registry.observe(stage, latency)
+                with lock:
+                    hist.observe(latency)
+
+        logger.info(
+            f"Phase {phase.name}: {phase.concurrency} workers, "
+            f"{'closed loop' if phase.qps is None else f'{phase.qps} QPS'} "
+            f"for {phase.duration}s"
+        )
+        with ThreadPoolExecutor(max_workers=phase.concurrency) as executor:
+            list(executor.map(worker, range(phase.concurrency)))
+
+        duration = time.perf_counter() - start
+        result = PhaseResult(
+            name=phase.name,
+            requests=hist.count,
+            errors=errors[0],
+            duration=duration,
+            qps=hist.count / duration if duration > 0 else 0.0,
+            target_qps=phase.qps,
+            mean=hist.sum / hist.count if hist.count else 0.0,
+            p50=hist.quantile(0.5),
+            p99=hist.quantile(0.99),
+            p999=hist.quantile(0.999),
+            max=hist.max,
+            recall=recall.value,
+        )
+        logger.info(str(result))
+        return result
+
+    def run(self, phases: list[Phase], interval: float = 0.0) -> list[PhaseResult]:
+        """Run the phases one after another, `interval` seconds apart"""
+        results = []
+        for i, phase in enumerate(phases):
+            if i > 0 and interval > 0:
+                time.sleep(interval)
+            results.append(self.run_phase(phase))
+
+        lines = "\n".join(f"  {r}" for r in results)
+        logger.info(f"Read load:\n{lines}")
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", type=str, default="http://localhost:19530", help="uri to connect")
+    parser.add_argument("-c", "--collection", type=str, required=True, help="collection name")
+    parser.add_argument("--kind", type=ReadKind, choices=list(ReadKind), default=ReadKind.SEARCH)
+    parser.add_argument("--filter", type=str, default="", help='e.g. "session_id == {key}"')
+    parser.add_argument("--num_keys", type=int, default=1, help="keys the {key} filter draws")
+    parser.add_argument("--topk", type=int, default=10, help="search topk, or query limit")
+    parser.add_argument("--nq", type=int, default=1, help="vectors per search")
+    parser.add_argument("--nprobe", type=int, help="search param nprobe")
+    parser.add_argument("--anns_field", type=str, help="vector field to search")
+    parser.add_argument("--concurrency", type=int, default=1, help="num of threads")
+    parser.add_argument("--qps", type=float, help="fixed rate, closed loop if not set")
+    parser.add_argument("--duration", type=float, default=60, help="seconds per phase")
+    parser.add_argument("--phases", type=int, default=1, help="num of phases")
+    parser.add_argument("--interval", type=float, default=0, help="seconds between phases")
+    parser.add_argument("--ground_truth", type=str, help="npz of src.ground_truth for recall")
+    parser.add_argument("-o", "--output", type=str, help="save the phase results as json")
+    add_vector_args(parser)
+    add_metrics_args(parser)
+
+    flags = parser.parse_args()
+    setup_metrics(flags)
+    request = ReadRequest(
+        kind=flags.kind,
+        filter=flags.filter,
+        num_keys=flags.num_keys,
+        topk=flags.topk,
+        nq=flags.nq,
+        search_params={} if flags.nprobe is None else {"params": {"nprobe": flags.nprobe}},
+        anns_field=flags.anns_field,
+    )
+    phases = [
+        Phase(
+            name=f"phase-{i}",
+            duration=flags.duration,
+            concurrency=flags.concurrency,
+            qps=flags.qps,
+            request=request,
+        )
+        for i in range(flags.phases)
+    ]
+    driver = ReadLoadDriver(
+        flags.collection,
+        vector_dist_from_flags(flags),
+        pool_size=max(DEFAULT_POOL_SIZE, flags.concurrency),
+        ground_truth=GroundTruth.load(flags.ground_truth) if flags.ground_truth else None,
+        uri=flags.uri,
+    )
+    results = driver.run(phases, flags.interval)
+    if flags.output:
+        with Path(flags.output).open("w") as f:
+            json.dump([r.model_dump() for r in results], f, indent=2)
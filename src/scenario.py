@@ -0,0 +1,646 @@
+"""Insert/delete/flush/compact/read workloads described in a TOML(or YAML) scenario file,
+instead of one hand-edited script per case.
+
+python -m src.scenario scenarios/compact_n_segments.toml -o report.json
+python -m src.scenario scenarios/compact_n_segments.toml --set delete_percent=50 --set segments=4
+python -m src.scenario scenarios/l0_under_reads.toml --dry_run
+
+    name = "compact_n_segments"
+
+    [vars]
+    segments = 20
+    delete_percent = 20
+
+    [sweep]                             # every combination runs, one report per variant
+    delete_percent = [10, 20, 50]
+
+    [collection]
+    name = "test_scenario"
+    dim = 768                           # pk, random and embeddings unless `fields` is given
+
+    [[phases]]
+    op = "create"
+
+    [[phases]]
+    op = "insert"
+    size_mb = 123
+    flush = true                        # one sealed segment per repeat
+    repeat = "${segments}"
+
+    [[phases]]
+    op = "parallel"                     # children run at the same time
+    [[phases.phases]]
+    op = "delete"
+    percent = "${delete_percent}"
+    [[phases.phases]]
+    op = "read"
+    duration = 30
+    qps = 100
+
+`${var}` is replaced by the value of a var, a string that is only `${var}` takes its type.
+Phases run in order, each repeat timed and reported, and a failed phase stops its variant.
+Deletes by `percent` sample the pks every insert of the variant returned, deleted or not,
+like delete_n_percent.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Annotated, Any, Literal
+
+import numpy as np
+import tomllib
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from pymilvus import CollectionSchema, DataType, FieldSchema, MilvusClient
+from pymilvus.client.types import SegmentState
+
+from .common_func import estimate_size_by_count
+from .connection_pool import DEFAULT_POOL_SIZE, get_pool
+from .delete_engine import DeleteEngine
+from .generate_segment import generate_segment_by_count, generate_segment_by_size
+from .metrics import add_metrics_args, registry, setup_metrics
+from .pk_ledger import PKLedger
+from .rate_limiter import RateLimit
+from .read_load import Phase, ReadLoadDriver, ReadRequest
+from .segment_distribution import Size
+from .sinks import MilvusClientSink
+from .vector_dist import VectorDistribution
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+MB = 1024 * 1024
+_VAR = re.compile(r"\$\{(\w+)\}")
+
+
+class CollectionSpec(BaseModel):
+    name: str
+    dim: int = 128
+    # FieldSchema kwargs with `dtype` a DataType name, e.g.
+    # {name = "pk", dtype = "INT64", is_primary = true}, pk/random/embeddings if empty
+    fields: list[dict[str, Any]] = []
+    # of the partition key, if a field is one
+    num_partitions: int | None = None
+    # MilvusClient add_index kwargs, None creates the collection without index(and unloaded)
+    index: dict[str, Any] | None = {
+        "field_name": "embeddings",
+        "index_type": "FLAT",
+        "metric_type": "L2",
+    }
+
+    model_config = ConfigDict(extra="forbid")
+
+    def schema(self) -> CollectionSchema:
+        if not self.fields:
+            return CollectionSchema(
+                [
+                    FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True),
+                    FieldSchema(name="random", dtype=DataType.DOUBLE),
+                    FieldSchema(name="embeddings", dtype=DataType.FLOAT_VECTOR, dim=self.dim),
+                ]
+            )
+        fields = []
+        for f in self.fields:
+            kwargs = {k: v for k, v in f.items() if k != "dtype"}
+            fields.append(FieldSchema(dtype=DataType[f["dtype"].upper()], **kwargs))
+        return CollectionSchema(fields)
+
+    def create(self, client: MilvusClient, drop_old: bool = True) -> bool:
+        """Create the collection, indexed and loaded if `index`. False if it's kept as it was"""
+        if client.has_collection(self.name):
+            if not drop_old:
+                return False
+            client.drop_collection(self.name)
+
+        index_params = None
+        if self.index is not None:
+            index_params = MilvusClient.prepare_index_params()
+            index_params.add_index(**self.index)
+        kwargs = {}
+        if self.num_partitions is not None:
+            kwargs["num_partitions"] = self.num_partitions
+        client.create_collection(
+            self.name, schema=self.schema(), index_params=index_params, **kwargs
+        )
+        return True
+
+
+class Step(BaseModel):
+    # in the report, the op if not set
+    name: str | None = None
+    # run the step this many times in a row, each one timed
+    repeat: int = 1
+
+    model_config = ConfigDict(extra="forbid")
+
+    @property
+    def label(self) -> str:
+        return self.name or self.op
+
+
+class CreateStep(Step):
+    op: Literal["create"]
+    # an existing collection is kept, and its pks unknown to deletes by percent, if False
+    drop_old: bool = True
+    partitions: list[str] = []
+
+
+class InsertStep(Step):
+    op: Literal["insert"]
+    size_mb: float | None = None
+    rows: int | None = None
+    # as fast as possible if neither is set
+    mb_per_sec: float | None = None
+    rows_per_sec: float | None = None
+    partition: str | None = None
+    # seal what was inserted into a segment
+    flush: bool = False
+    # None draws uniform vectors
+    vector_dist: VectorDistribution | None = None
+
+    @model_validator(mode="after")
+    def check_amount(self):
+        if (self.size_mb is None) == (self.rows is None):
+            msg = "Insert needs exactly one of size_mb and rows"
+            raise ValueError(msg)
+        return self
+
+    def rate(self) -> RateLimit | None:
+        if self.mb_per_sec is None and self.rows_per_sec is None:
+            return None
+        size = None if self.mb_per_sec is None else Size(count=int(self.mb_per_sec * MB))
+        return RateLimit(size_per_sec=size, rows_per_sec=self.rows_per_sec)
+
+
+class DeleteStep(Step):
+    op: Literal["delete"]
+    # of the pks inserted so far in the variant
+    percent: float | None = None
+    filter: str | None = None
+    partition: str | None = None
+    flush: bool = False
+    # delete expressions in flight
+    concurrency: int = 4
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.percent is None) == (self.filter is None):
+            msg = "Delete needs exactly one of percent and filter"
+            raise ValueError(msg)
+        return self
+
+
+class FlushStep(Step):
+    op: Literal["flush"]
+
+
+class PartitionStep(Step):
+    op: Literal["create_partition", "drop_partition"]
+    partition: str
+
+
+class LoadStep(Step):
+    op: Literal["load", "release"]
+
+
+class CompactStep(Step):
+    op: Literal["compact"]
+    # L0 compaction, deletes applied to the sealed segments
+    l0: bool = False
+    # False only waits for the auto compaction to leave no L0 segment
+    trigger: bool = True
+    timeout: float = 600.0
+    poll_interval: float = 1.0
+
+
+class CountStep(Step):
+    op: Literal["count"]
+    filter: str = ""
+    # the step fails on another count
+    expect: int | None = None
+
+
+class ReadStep(Step):
+    op: Literal["read"]
+    duration: float = 60.0
+    concurrency: int = 1
+    # None runs closed loop
+    qps: float | None = None
+    request: ReadRequest = ReadRequest()
+    vector_dist: VectorDistribution | None = None
+
+
+class SleepStep(Step):
+    op: Literal["sleep"]
+    seconds: float
+
+
+class ParallelStep(Step):
+    op: Literal["parallel"]
+    phases: list["AnyStep"]
+
+
+AnyStep = Annotated[
+    CreateStep
+    | InsertStep
+    | DeleteStep
+    | FlushStep
+    | PartitionStep
+    | LoadStep
+    | CompactStep
+    | CountStep
+    | ReadStep
+    | SleepStep
+    | ParallelStep,
+    Field(discriminator="op"),
+]
+ParallelStep.model_rebuild()
+
+
+class Scenario(BaseModel):
+    name: str
+    collection: CollectionSpec
+    phases: list[AnyStep]
+    connection_config: dict = {"uri": "http://localhost:19530"}
+    # where the inserted pks are kept for the deletes by percent
+    work_dir: str = "scenario_pks"
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class StepResult(BaseModel):
+    name: str
+    op: str
+    seconds: float
+    rows: int = 0
+    bytes: int = 0
+    detail: dict = {}
+    error: str | None = None
+    children: list["StepResult"] = []
+
+    def lines(self, indent: int = 2) -> list[str]:
+        line = f"{' ' * indent}{self.name:<{32 - indent}} {self.seconds:>10.2f}s"
+        if self.rows:
+            line += f" {self.rows:>12,} rows"
+        if self.bytes:
+            line += f" {self.bytes / MB:>10.1f}MB"
+        if self.error is not None:
+            line += f"  FAILED: {self.error}"
+        return [line] + [line for c in self.children for line in c.lines(indent + 2)]
+
+
+class ScenarioReport(BaseModel):
+    variant: str
+    vars: dict
+    seconds: float
+    results: list[StepResult]
+
+    @property
+    def failed(self) -> bool:
+        return any(r.error is not None for r in self.results)
+
+    def __str__(self):
+        status = "FAILED" if self.failed else "done"
+        lines = [f"{self.variant} {status} in {self.seconds:.2f}s"]
+        lines.extend(line for r in self.results for line in r.lines())
+        return "\n".join(lines)
+
+
+class ScenarioRunner:
+    def __init__(self, scenario: Scenario, pool_size: int = DEFAULT_POOL_SIZE):
+        self.scenario = scenario
+        self.collection_name = scenario.collection.name
+        self.schema = scenario.collection.schema()
+        self.pool_size = pool_size
+        self.ledger = PKLedger(Path(scenario.work_dir) / self.collection_name, clear=True)
+        self._ledger_lock = threading.Lock()
+        self._rng = np.random.default_rng()
+
+    def client(self) -> MilvusClient:
+        return get_pool(self.pool_size, **self.scenario.connection_config).get()
+
+    def run(self) -> list[StepResult]:
+        results = []
+        for step in self.scenario.phases:
+            step_results = self.run_step(step)
+            results.extend(step_results)
+            if any(r.error is not None for r in step_results):
+                break
+        return results
+
+    def run_step(self, step: Step) -> list[StepResult]:
+        """Every repeat of `step`, up to the first failed one"""
+        results = []
+        for i in range(step.repeat):
+            name = step.label if step.repeat == 1 else f"{step.label}#{i + 1}"
+            logger.info(f"Phase {name} ({step.op})")
+            start = time.perf_counter()
+            try:
+                outcome = getattr(self, f"_{step.op}")(step, name)
+                error = None
+            except Exception as e:
+                logger.exception(f"Phase {name} failed")
+                outcome, error = {}, f"{type(e).__name__}: {e}"
+            result = StepResult(
+                name=name, op=step.op, seconds=time.perf_counter() - start, error=error, **outcome
+            )
+            registry.observe(f"phase_{step.op}", result.seconds, result.rows, result.bytes)
+            results.append(result)
+            if result.error is not None:
+                break
+        return results
+
+    def _create(self, step: CreateStep, _name: str) -> dict:
+        c = self.client()
+        if not self.scenario.collection.create(c, step.drop_old):
+            return {"detail": {"existed": True}}
+        with self._ledger_lock:
+            self.ledger = PKLedger(self.ledger.directory, clear=True)
+        for partition in step.partitions:
+            c.create_partition(self.collection_name, partition)
+        return {"detail": {"existed": False}}
+
+    def _insert(self, step: InsertStep, _name: str) -> dict:
+        # size_mb is an amount of Bytes, rows an exact num of rows
+        if step.size_mb is not None:
+            size = int(step.size_mb * MB)
+            batches = generate_segment_by_size(size, self.schema, vector_dist=step.vector_dist)
+        else:
+            size = estimate_size_by_count(step.rows, self.schema)
+            batches = generate_segment_by_count(
+                step.rows, self.schema, vector_dist=step.vector_dist
+            )
+        rate = step.rate()
+        limiter = None if rate is None else rate.bucket()
+        sink = MilvusClientSink(self.client, self.collection_name, step.partition)
+
+        pks, rows = [], 0
+        for data in batches:
+            nbytes = estimate_size_by_count(len(data), self.schema)
+            if limiter is not None:
+                limiter.acquire(len(data) if rate.by_rows else nbytes)
+            with registry.stage("insert", rows=len(data), nbytes=nbytes):
+                rt = sink.insert(data)
+            pks.extend(rt.primary_keys)
+            rows += len(data)
+        with self._ledger_lock:
+            self.ledger.append(pks)
+
+        if step.flush:
+            with registry.stage("flush"):
+                sink.flush()
+        detail = {} if limiter is None else {"rate": limiter.report(rate.unit)}
+        return {"rows": rows, "bytes": size, "detail": detail}
+
+    def _delete(self, step: DeleteStep, _name: str) -> dict:
+        c = self.client()
+        partition = step.partition or ""
+
+        def delete(expr: str) -> int:
+            with registry.stage("delete"):
+                rt = c.delete(self.collection_name, filter=expr, partition_name=partition)
+            return rt["delete_count"]
+
+        if step.filter is not None:
+            deleted = delete(step.filter)
+        else:
+            with self._ledger_lock:
+                samples = [
+                    self.ledger.sample(i, step.percent / 100, self._rng)
+                    for i in range(len(self.ledger))
+                ]
+            pks = np.concatenate(samples) if samples else []
+            engine = DeleteEngine(delete, concurrency=step.concurrency)
+            deleted = engine.delete(self.schema.primary_field.name, pks)
+
+        if step.flush:
+            with registry.stage("flush"):
+                c.flush(self.collection_name)
+        return {"rows": deleted}
+
+    def _flush(self, _step: FlushStep, _name: str) -> dict:
+        with registry.stage("flush"):
+            self.client().flush(self.collection_name)
+        return {}
+
+    def _create_partition(self, step: PartitionStep, _name: str) -> dict:
+        c = self.client()
+        if not c.has_partition(self.collection_name, step.partition):
+            c.create_partition(self.collection_name, step.partition)
+        return {}
+
+    def _drop_partition(self, step: PartitionStep, _name: str) -> dict:
+        c = self.client()
+        # a loaded partition can't be dropped
+        c.release_partitions(self.collection_name, [step.partition])
+        c.drop_partition(self.collection_name, step.partition)
+        return {}
+
+    def _load(self, _step: LoadStep, _name: str) -> dict:
+        with registry.stage("load"):
+            self.client().load_collection(self.collection_name)
+        return {}
+
+    def _release(self, _step: LoadStep, _name: str) -> dict:
+        self.client().release_collection(self.collection_name)
+        return {}
+
+    def l0_segments(self) -> int:
+        segments = self.client().list_persistent_segments(
+            self.collection_name, states=[SegmentState.Flushed]
+        )
+        return sum(1 for s in segments if s.level_name == "L0")
+
+    def _compact(self, step: CompactStep, _name: str) -> dict:
+        c = self.client()
+        l0_before = self.l0_segments()
+        job_id = c.compact(self.collection_name, is_l0=step.l0) if step.trigger else None
+        # only L0 segments tell when the auto compaction is done
+        wait_l0 = step.l0 or not step.trigger
+
+        start = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - start
+            job_done = job_id is None or c.get_compaction_state(job_id) == "Completed"
+            l0_left = self.l0_segments() if wait_l0 else 0
+            if job_done and l0_left == 0:
+                registry.observe("compaction", elapsed)
+                return {"detail": {"job_id": job_id, "l0_before": l0_before}}
+            if elapsed > step.timeout:
+                msg = f"Compaction of {self.collection_name} not done after {elapsed:.0f}s"
+                raise TimeoutError(msg)
+            time.sleep(step.poll_interval)
+
+    def _count(self, step: CountStep, _name: str) -> dict:
+        with registry.stage("query"):
+            got = self.client().query(
+                self.collection_name, filter=step.filter, output_fields=["count(*)"]
+            )
+        count = got[0]["count(*)"]
+        if step.expect is not None and count != step.expect:
+            msg = f"count(*) {count} != expected {step.expect}"
+            raise AssertionError(msg)
+        return {"rows": count}
+
+    def _read(self, step: ReadStep, name: str) -> dict:
+        driver = ReadLoadDriver(
+            self.collection_name,
+            step.vector_dist,
+            pool_size=max(DEFAULT_POOL_SIZE, step.concurrency),
+            **self.scenario.connection_config,
+        )
+        phase = Phase(
+            name=name,
+            duration=step.duration,
+            concurrency=step.concurrency,
+            qps=step.qps,
+            request=step.request,
+        )
+        result = driver.run_phase(phase)
+        return {"rows": result.requests, "detail": result.model_dump()}
+
+    def _sleep(self, step: SleepStep, _name: str) -> dict:
+        time.sleep(step.seconds)
+        return {}
+
+    def _parallel(self, step: ParallelStep, _name: str) -> dict:
+        with ThreadPoolExecutor(max_workers=len(step.phases)) as executor:
+            children = [r for rs in executor.map(self.run_step, step.phases) for r in rs]
+        failed = [c.name for c in children if c.error is not None]
+        if failed:
+            msg = f"{', '.join(failed)} failed"
+            raise RuntimeError(msg)
+        return {"children": children}
+
+
+def _outline(step: Step) -> str:
+    """create, segment x20, parallel(delete, read)"""
+    outline = step.label
+    if isinstance(step, ParallelStep):
+        outline += f"({', '.join(_outline(p) for p in step.phases)})"
+    return outline if step.repeat == 1 else f"{outline} x{step.repeat}"
+
+
+def _substitute(value: Any, variables: dict[str, Any]) -> Any:
+    if isinstance(value, dict):
+        return {k: _substitute(v, variables) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, variables) for v in value]
+    if not isinstance(value, str):
+        return value
+
+    def lookup(m: re.Match) -> Any:
+        if m.group(1) not in variables:
+            msg = f"Undefined variable ${{{m.group(1)}}}"
+            raise ValueError(msg)
+        return variables[m.group(1)]
+
+    whole = _VAR.fullmatch(value)
+    if whole is not None:
+        return lookup(whole)
+    return _VAR.sub(lambda m: str(lookup(m)), value)
+
+
+def expand(raw: dict, overrides: dict[str, Any] | None = None) -> list[tuple[str, dict, Scenario]]:
+    """(variant, vars, scenario) of every combination of the sweep, `overrides` pin vars"""
+    raw = dict(raw)
+    defaults = raw.pop("vars", {})
+    overrides = overrides or {}
+    sweep = {k: v for k, v in raw.pop("sweep", {}).items() if k not in overrides}
+
+    variants = []
+    for combo in itertools.product(*sweep.values()):
+        swept = dict(zip(sweep, combo, strict=True))
+        variables = {**defaults, **swept, **overrides}
+        scenario = Scenario.model_validate(_substitute(raw, variables))
+        label = ",".join(f"{k}={v}" for k, v in {**swept, **overrides}.items())
+        variant = f"{scenario.name}[{label}]" if label else scenario.name
+        variants.append((variant, variables, scenario))
+    return variants
+
+
+def load_scenario_file(path: str | Path) -> dict:
+    path = Path(path)
+    if path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml  # noqa: PLC0415
+        except ImportError as e:
+            msg = "YAML scenarios need pyyaml, pip install milvus-script[scenario]"
+            raise ImportError(msg) from e
+        with path.open() as f:
+            return yaml.safe_load(f)
+    with path.open("rb") as f:
+        return tomllib.load(f)
+
+
+def parse_override(text: str) -> tuple[str, Any]:
+    """KEY=VALUE with VALUE as a TOML value, or a plain string if it isn't one"""
+    key, _, value = text.partition("=")
+    try:
+        return key.strip(), tomllib.loads(f"v = {value}")["v"]
+    except tomllib.TOMLDecodeError:
+        return key.strip(), value
+
+
+def run_scenarios(
+    paths: list[str], overrides: dict[str, Any] | None = None, uri: str | None = None
+) -> list[ScenarioReport]:
+    reports = []
+    for path in paths:
+        for variant, variables, scenario in expand(load_scenario_file(path), overrides):
+            if uri is not None:
+                scenario.connection_config = {**scenario.connection_config, "uri": uri}
+            logger.info(f"Scenario {variant}")
+            start = time.perf_counter()
+            results = ScenarioRunner(scenario).run()
+            report = ScenarioReport(
+                variant=variant,
+                vars=variables,
+                seconds=time.perf_counter() - start,
+                results=results,
+            )
+            logger.info(f"Scenario report:\n{report}")
+            reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scenarios", type=str, nargs="+", help="scenario .toml/.yaml files")
+    parser.add_argument("--uri", type=str, help="uri to connect, overrides the scenario's")
+    parser.add_argument(
+        "--set",
+        type=parse_override,
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="pin a var, swept or not",
+    )
+    parser.add_argument("--dry_run", action="store_true", help="only list the variants' phases")
+    parser.add_argument("-o", "--output", type=str, help="save the reports as json")
+    add_metrics_args(parser)
+
+    flags = parser.parse_args()
+    overrides = dict(flags.set)
+    if flags.dry_run:
+        for path in flags.scenarios:
+            for variant, _, scenario in expand(load_scenario_file(path), overrides):
+                phases = ", ".join(_outline(p) for p in scenario.phases)
+                logger.info(f"{variant}: {phases}")
+        raise SystemExit(0)
+
+    setup_metrics(flags)
+    reports = run_scenarios(flags.scenarios, overrides, flags.uri)
+    summary = "\n".join(str(r) for r in reports)
+    logger.info(f"Scenarios:\n{summary}")
+    if flags.output:
+        with Path(flags.output).open("w") as f:
+            json.dump([r.model_dump() for r in reports], f, indent=2)
+    if any(r.failed for r in reports):
+        raise SystemExit(1)
@@ -27,5 +27,5 @@ class Size(BaseModel):
 
 class SegmentDistribution(BaseModel):
     collection_name: str
-    size_dist: tuple[Size]
+    size_dist: tuple[Size, ...]
     partition_name: str = "_default"
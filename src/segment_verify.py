@@ -0,0 +1,266 @@
+"""Check the segments a load really made against the SegmentDistribution it asked for.
+
+One flush after N bytes only makes one segment of N bytes if nothing else is growing in the
+partition, and if N is below the server's seal threshold
+(dataCoord.segment.maxSize * dataCoord.segment.sealProportion). Otherwise the segment is
+split, or merged with leftovers, and a compaction benchmark runs on another layout than the
+one it reports.
+
+    layout = verify_layout(client, dist, schema)
+    assert layout.ok, layout.report()
+
+`generate_scheduled_segments` loads a distribution segment by segment, flushing any
+leftovers first and checking each flush's outcome. It learns the server's row cap from split
+segments, and the real bytes per row from loaded segments, so the next segments are sized
+by what the server counts rather than by the estimate.
+"""
+
+import argparse
+import logging
+
+import pymilvus
+from pydantic import BaseModel
+from pymilvus import Collection, MilvusClient, Partition
+from pymilvus.client.types import SegmentState
+
+from .common_func import Unit, estimate_count_by_size, estimate_size_by_count
+from .generate_segment import generate_one_segment
+from .insert_pipeline import PipelineConfig
+from .segment_distribution import SegmentDistribution, Size
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+# L0 segments only hold deletes, they're not part of the data layout
+DATA_LEVELS = ("L1", "L2", "Legacy")
+
+
+class SegmentReport(BaseModel):
+    segment_id: int
+    partition_id: int
+    num_rows: int
+    level: str
+    state: str
+    # bytes as the loaders estimate them, and as the query node holds them if loaded
+    est_size: int
+    mem_size: int | None = None
+
+
+class SegmentCheck(BaseModel):
+    target_size: int
+    target_rows: int
+    actual_rows: int | None = None
+    segment_id: int | None = None
+
+    @property
+    def error(self) -> float:
+        if self.actual_rows is None:
+            return 1.0
+        return abs(self.actual_rows - self.target_rows) / max(1, self.target_rows)
+
+
+class LayoutCheck(BaseModel):
+    collection_name: str
+    tolerance: float
+    checks: list[SegmentCheck]
+    # realized segments no requested one matches
+    extra: list[SegmentReport] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.extra and all(c.error <= self.tolerance for c in self.checks)
+
+    def report(self) -> str:
+        lines = [f"Segment layout of {self.collection_name}: {'OK' if self.ok else 'MISMATCH'}"]
+        for c in self.checks:
+            mark = "ok" if c.error <= self.tolerance else "!!"
+            lines.append(
+                f"  {mark} target {c.target_size / 1024 / 1024:.2f}MB {c.target_rows} rows -> "
+                f"segment {c.segment_id} {c.actual_rows} rows ({c.error:.1%} off)"
+            )
+        lines.extend(f"  !! extra segment {s.segment_id} {s.num_rows} rows" for s in self.extra)
+        return "\n".join(lines)
+
+
+def fetch_segments(
+    client: MilvusClient,
+    collection_name: str,
+    schema: pymilvus.CollectionSchema,
+    partition_id: int | None = None,
+) -> list[SegmentReport]:
+    """Flushed data segments of the collection, with their memory size if it's loaded"""
+    loaded = {}
+    try:
+        loaded = {s.segment_id: s.mem_size for s in client.list_loaded_segments(collection_name)}
+    except Exception as e:
+        logger.debug(f"No loaded segments info for {collection_name}, e={e}")
+
+    segments = [
+        SegmentReport(
+            segment_id=s.segment_id,
+            partition_id=s.partition_id,
+            num_rows=s.num_rows,
+            level=s.level_name,
+            state=s.state_name,
+            est_size=estimate_size_by_count(s.num_rows, schema),
+            mem_size=loaded.get(s.segment_id),
+        )
+        for s in client.list_persistent_segments(collection_name, states=[SegmentState.Flushed])
+        if s.level_name in DATA_LEVELS
+    ]
+    if partition_id is not None:
+        segments = [s for s in segments if s.partition_id == partition_id]
+    return sorted(segments, key=lambda s: s.segment_id)
+
+
+def match_layout(
+    dist: SegmentDistribution,
+    segments: list[SegmentReport],
+    schema: pymilvus.CollectionSchema,
+    tolerance: float = 0.05,
+    target_rows: list[int] | None = None,
+) -> LayoutCheck:
+    """Pair every requested size with the realized segment closest in rows, largest first.
+
+    Requested rows are estimated from the sizes, unless given in `target_rows`.
+    """
+    if target_rows is None:
+        target_rows = [estimate_count_by_size(size.as_bytes(), schema) for size in dist.size_dist]
+    checks = [
+        SegmentCheck(target_size=size.as_bytes(), target_rows=rows)
+        for size, rows in zip(dist.size_dist, target_rows, strict=True)
+    ]
+    left = list(segments)
+    for check in sorted(checks, key=lambda c: -c.target_rows):
+        if not left:
+            break
+        best = min(left, key=lambda s: abs(s.num_rows - check.target_rows))
+        left.remove(best)
+        check.actual_rows, check.segment_id = best.num_rows, best.segment_id
+    return LayoutCheck(
+        collection_name=dist.collection_name, tolerance=tolerance, checks=checks, extra=left
+    )
+
+
+def verify_layout(
+    client: MilvusClient,
+    dist: SegmentDistribution,
+    schema: pymilvus.CollectionSchema,
+    tolerance: float = 0.05,
+    partition_id: int | None = None,
+) -> LayoutCheck:
+    segments = fetch_segments(client, dist.collection_name, schema, partition_id)
+    layout = match_layout(dist, segments, schema, tolerance)
+    logger.info(layout.report())
+    return layout
+
+
+class FlushScheduler:
+    """Rows per segment from what the server did with the previous ones.
+
+    `bytes_per_row` starts from the estimator and moves to the loaded segments' memory size,
+    `max_rows` is learned from a flush that sealed more than one segment.
+    """
+
+    def __init__(self, schema: pymilvus.CollectionSchema):
+        self.schema = schema
+        self.bytes_per_row = estimate_size_by_count(1, schema)
+        self.max_rows: int | None = None
+
+    def rows_for(self, size: int) -> list[int]:
+        """Rows of each flush for a segment of `size` bytes, split evenly so none is over
+        `max_rows`, as the server would seal a bigger one in pieces anyway
+        """
+        rows = int(size / self.bytes_per_row)
+        if self.max_rows is None or rows <= self.max_rows:
+            return [rows]
+
+        n = -(-rows // self.max_rows)
+        logger.warning(
+            f"{size / 1024 / 1024:.2f}MB is {rows} rows, over the {self.max_rows} rows the "
+            f"server seals at, loading it as {n} segments, raise "
+            f"dataCoord.segment.sealProportion to get it in one segment"
+        )
+        return [rows // n + (1 if j < rows % n else 0) for j in range(n)]
+
+    def observe(self, new_segments: list[SegmentReport]):
+        if len(new_segments) > 1:
+            cap = max(s.num_rows for s in new_segments)
+            self.max_rows = cap if self.max_rows is None else min(self.max_rows, cap)
+            logger.info(f"Flush sealed {len(new_segments)} segments, server cap ~{cap} rows")
+
+        sized = [s for s in new_segments if s.mem_size]
+        if sized:
+            self.bytes_per_row = sum(s.mem_size for s in sized) / sum(s.num_rows for s in sized)
+            logger.info(f"Calibrated {self.bytes_per_row:.1f} bytes per row from loaded segments")
+
+
+def generate_scheduled_segments(
+    c: Collection | Partition,
+    schema: pymilvus.CollectionSchema,
+    client: MilvusClient,
+    dist: SegmentDistribution,
+    scheduler: FlushScheduler | None = None,
+    pipeline: PipelineConfig | None = None,
+    tolerance: float = 0.05,
+) -> LayoutCheck:
+    """Load `dist` one segment at a time into `c`, checking each flush made one segment.
+
+    The flushes are checked against the rows planned for them, the result is the layout
+    against the requested sizes, so a segment the server can't hold in one piece fails it.
+    """
+    scheduler = FlushScheduler(schema) if scheduler is None else scheduler
+
+    # seal whatever is growing, so it doesn't end up in the first segment
+    c.flush()
+    known = {s.segment_id for s in fetch_segments(client, dist.collection_name, schema)}
+    new_ids: list[int] = []
+    planned: list[int] = []
+    for i, size in enumerate(dist.size_dist):
+        for rows in scheduler.rows_for(size.as_bytes()):
+            planned.append(rows)
+            generate_one_segment(c, schema, estimate_size_by_count(rows, schema), pipeline)
+
+            segments = fetch_segments(client, dist.collection_name, schema)
+            new = [s for s in segments if s.segment_id not in known]
+            known.update(s.segment_id for s in new)
+            new_ids.extend(s.segment_id for s in new)
+            logger.info(
+                f"Segment {i}: planned {rows} rows, sealed {[s.num_rows for s in new]} "
+                f"in {len(new)} segment(s)"
+            )
+            scheduler.observe(new)
+
+    realized = [
+        s for s in fetch_segments(client, dist.collection_name, schema) if s.segment_id in new_ids
+    ]
+    flushes = dist.model_copy(
+        update={"size_dist": tuple(Size(count=estimate_size_by_count(r, schema)) for r in planned)}
+    )
+    logger.info(match_layout(flushes, realized, schema, tolerance, planned).report())
+
+    layout = match_layout(dist, realized, schema, tolerance)
+    logger.info(layout.report())
+    return layout
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", type=str, default="http://localhost:19530", help="uri to connect")
+    parser.add_argument("-c", "--collection", type=str, required=True, help="collection name")
+    parser.add_argument(
+        "-s", "--segment_mb", type=int, nargs="+", required=True, help="expected segments in MB"
+    )
+    parser.add_argument("-t", "--tolerance", type=float, default=0.05, help="allowed rows error")
+
+    flags = parser.parse_args()
+    client = MilvusClient(uri=flags.uri)
+    schema = pymilvus.CollectionSchema.construct_from_dict(
+        client.describe_collection(flags.collection)
+    )
+    dist = SegmentDistribution(
+        collection_name=flags.collection,
+        size_dist=tuple(Size(count=mb, unit=Unit.MB) for mb in flags.segment_mb),
+    )
+    if not verify_layout(client, dist, schema, flags.tolerance).ok:
+        raise SystemExit(1)
@@ -0,0 +1,306 @@
+"""Where the loaders send their batches, so the client side can run without a server.
+
+A sink quacks like Collection: `insert(data).primary_keys`, `delete(expr).delete_count`,
+`flush()` and `num_entities`, so Collection and Partition can be passed wherever a sink is
+expected, and every sink wherever the loaders took a Collection.
+
+    MilvusClientSink(pool.get, "test1")  # MilvusClient behind the Collection like API
+    NullSink()                           # counts rows and bytes, the max client throughput
+    FileSink("batches/test1")            # records every batch to .npz for a later look
+    FakeSink(latency=0.01)               # in process Milvus stand in, pks and delete counts
+
+`data` is either columns(Collection.insert) or row dicts(MilvusClient.insert).
+"""
+
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Sequence
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from pydantic import BaseModel
+from pymilvus import CollectionSchema, MilvusClient
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+
+class SinkResult(BaseModel):
+    primary_keys: list = []
+    insert_count: int = 0
+    delete_count: int = 0
+
+
+class SinkStats(BaseModel):
+    batches: int = 0
+    rows: int = 0
+    bytes: int = 0
+    deletes: int = 0
+    flushes: int = 0
+
+
+def _value_nbytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, str | bytes):
+        return len(value)
+    if isinstance(value, list | tuple):
+        return 8 * len(value) if value and isinstance(value[0], int) else 4 * len(value)
+    return 8
+
+
+def num_rows(data: Sequence) -> int:
+    if len(data) == 0:
+        return 0
+    return len(data) if isinstance(data[0], dict) else len(data[0])
+
+
+def batch_nbytes(data: Sequence) -> int:
+    """Approximate payload size of a batch, from its first row times the num of rows"""
+    rows = num_rows(data)
+    if rows == 0:
+        return 0
+    if isinstance(data[0], dict):
+        return rows * sum(_value_nbytes(v) for v in data[0].values())
+    return sum(
+        col.nbytes if isinstance(col, np.ndarray) else rows * _value_nbytes(col[0]) for col in data
+    )
+
+
+class InsertSink(ABC):
+    """Base of the sinks, counts what goes through it in `stats`"""
+
+    def __init__(self):
+        self.stats = SinkStats()
+        self._lock = threading.Lock()
+
+    def _count(self, data: Sequence) -> int:
+        rows = num_rows(data)
+        with self._lock:
+            self.stats.batches += 1
+            self.stats.rows += rows
+            self.stats.bytes += batch_nbytes(data)
+        return rows
+
+    @abstractmethod
+    def insert(self, data: Sequence) -> SinkResult: ...
+
+    @abstractmethod
+    def delete(self, expr: str) -> SinkResult: ...
+
+    def flush(self):
+        with self._lock:
+            self.stats.flushes += 1
+
+    @property
+    def num_entities(self) -> int:
+        return self.stats.rows
+
+
+class MilvusClientSink(InsertSink):
+    """`client` is a MilvusClient, or a callable returning one, e.g. `pool.get` to use the
+    client pinned to the calling thread.
+    """
+
+    def __init__(
+        self,
+        client: MilvusClient | Callable[[], MilvusClient],
+        collection_name: str,
+        partition_name: str | None = None,
+    ):
+        super().__init__()
+        self._client = client
+        self.collection_name = collection_name
+        self.partition_name = partition_name
+
+    def client(self) -> MilvusClient:
+        return self._client if isinstance(self._client, MilvusClient) else self._client()
+
+    def insert(self, data: Sequence) -> SinkResult:
+        self._count(data)
+        rt = self.client().insert(
+            self.collection_name, data, partition_name=self.partition_name or ""
+        )
+        return SinkResult(primary_keys=list(rt.get("ids", [])), insert_count=rt["insert_count"])
+
+    def delete(self, expr: str) -> SinkResult:
+        rt = self.client().delete(
+            self.collection_name, filter=expr, partition_name=self.partition_name
+        )
+        with self._lock:
+            self.stats.deletes += rt["delete_count"]
+        return SinkResult(delete_count=rt["delete_count"])
+
+    def flush(self):
+        super().flush()
+        self.client().flush(self.collection_name)
+
+    @property
+    def num_entities(self) -> int:
+        return self.client().get_collection_stats(self.collection_name)["row_count"]
+
+
+class NullSink(InsertSink):
+    """Drops everything, only counts"""
+
+    def insert(self, data: Sequence) -> SinkResult:
+        return SinkResult(insert_count=self._count(data))
+
+    def delete(self, expr: str) -> SinkResult:
+        return SinkResult()
+
+
+class FileSink(InsertSink):
+    """Every batch to `directory/batch_000000.npz`, one array per field, deletes appended to
+    `directory/deletes.jsonl`. Columns without names are saved as field_0, field_1...
+    """
+
+    def __init__(self, directory: str | Path, field_names: Sequence[str] | None = None):
+        super().__init__()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.field_names = field_names
+        self._files = 0
+
+    def insert(self, data: Sequence) -> SinkResult:
+        rows = self._count(data)
+        if rows > 0 and isinstance(data[0], dict):
+            columns = {name: [row[name] for row in data] for name in data[0]}
+        else:
+            names = self.field_names or [f"field_{i}" for i in range(len(data))]
+            columns = dict(zip(names, data, strict=True))
+
+        with self._lock:
+            path = self.directory / f"batch_{self._files:06d}.npz"
+            self._files += 1
+        np.savez(path, **{name: np.asarray(col) for name, col in columns.items()})
+        return SinkResult(insert_count=rows)
+
+    def delete(self, expr: str) -> SinkResult:
+        with self._lock, (self.directory / "deletes.jsonl").open("a") as f:
+            f.write(json.dumps({"expr": expr, "ts": time.time()}) + "\n")
+        return SinkResult()
+
+
+_RANGE = re.compile(r"(\w+) >= (-?\d+) and \1 < (-?\d+)")
+_IN = re.compile(r"(\w+) in (\[.*?\])")
+
+
+class FakeSink(InsertSink):
+    """In process stand in for Milvus, it keeps the pks to answer delete counts.
+
+    Inserted pks are taken from the `pk_field` of row dicts(or their first field), or made up
+    sequentially for auto id. Columnar batches, in schema order, need the `schema` to find
+    the pk column, it also gives `pk_field` and `auto_id` if set. Deletes understand the
+    expressions of DeleteEngine: `pk in [...]` and `(pk >= a and pk < b)` joined by `or`,
+    anything else deletes nothing.
+    `latency` seconds are slept per request, to play a server.
+    """
+
+    def __init__(
+        self,
+        pk_field: str | None = None,
+        auto_id: bool = False,
+        latency: float = 0.0,
+        schema: CollectionSchema | None = None,
+    ):
+        super().__init__()
+        self.pk_field = pk_field
+        self.auto_id = auto_id
+        self.latency = latency
+        self._pks: set = set()
+        self._next_id = 0
+        # index of the pk among the columns of a columnar batch
+        self._pk_index = None
+        if schema is not None:
+            pk = schema.primary_field
+            self.pk_field, self.auto_id = pk.name, pk.auto_id
+            self._pk_index = [fs.name for fs in schema.fields].index(pk.name)
+
+    def _batch_pks(self, data: Sequence, rows: int) -> list:
+        if self.auto_id:
+            with self._lock:
+                start, self._next_id = self._next_id, self._next_id + rows
+            return list(range(start, start + rows))
+        if isinstance(data[0], dict):
+            name = self.pk_field or next(iter(data[0]))
+            return [row[name] for row in data]
+        if self._pk_index is None:
+            msg = "FakeSink needs the schema to find the pk column of columnar batches"
+            raise ValueError(msg)
+        pks = data[self._pk_index]
+        return pks.tolist() if isinstance(pks, np.ndarray) else list(pks)
+
+    def insert(self, data: Sequence) -> SinkResult:
+        rows = self._count(data)
+        time.sleep(self.latency)
+        pks = self._batch_pks(data, rows) if rows > 0 else []
+        with self._lock:
+            self._pks.update(pks)
+        return SinkResult(primary_keys=pks, insert_count=rows)
+
+    def delete(self, expr: str) -> SinkResult:
+        time.sleep(self.latency)
+        with self._lock:
+            matched = set()
+            for _, a, b in _RANGE.findall(expr):
+                start, end = int(a), int(b)
+                if end - start < len(self._pks):
+                    matched.update(pk for pk in range(start, end) if pk in self._pks)
+                else:
+                    matched.update(pk for pk in self._pks if start <= pk < end)
+            for _, values in _IN.findall(expr):
+                matched.update(pk for pk in json.loads(values) if pk in self._pks)
+            self._pks -= matched
+            self.stats.deletes += len(matched)
+        return SinkResult(delete_count=len(matched))
+
+    @property
+    def num_entities(self) -> int:
+        return len(self._pks)
+
+
+class SinkKind(str, Enum):
+    MILVUS = "milvus"
+    NULL = "null"
+    FILE = "file"
+    FAKE = "fake"
+
+
+def make_sink(
+    kind: SinkKind, directory: str | None = None, schema: CollectionSchema | None = None
+) -> InsertSink | None:
+    """The offline sinks by name, None for milvus so the caller keeps its own connection.
+    `schema` lets the fake sink find the pks of columnar batches.
+    """
+    if kind == SinkKind.NULL:
+        return NullSink()
+    if kind == SinkKind.FILE:
+        return FileSink(directory or "sink_batches")
+    if kind == SinkKind.FAKE:
+        return FakeSink(schema=schema)
+    return None
+
+
+def add_sink_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--sink",
+        type=SinkKind,
+        choices=[k.value for k in SinkKind],
+        default=SinkKind.MILVUS,
+        help="null, file or fake to run without a server",
+    )
+    parser.add_argument("--sink_dir", type=str, help="directory of the file sink")
+
+
+def sink_from_flags(
+    flags: argparse.Namespace, schema: CollectionSchema | None = None
+) -> InsertSink | None:
+    return make_sink(flags.sink, flags.sink_dir, schema)
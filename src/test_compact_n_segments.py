@@ -1,93 +1,140 @@
-from pathlib import Path
+import argparse
 
 from pymilvus import Collection, connections
 
-from generate_segment import SegmentDistribution, Size, Unit, generate_segments
-
-# local
-from load_data import prepare_collection
-
-
-def generate_n_segments(name: str, n: int = 20):
-    prepare_collection(name, 768, False)
-    connections.connect()
-    c = Collection(name)
-    if not c.has_index():
-        c.create_index("embeddings", {"index_type": "FLAT", "params": {"metric_type": "L2"}})
-
-    ten_segs = [Size(123, Unit.MB) for i in range(n)]
+from .common_func import Unit
+from .delete_engine import DeleteEngine
+from .generate_segment import generate_segments
+from .ground_truth import DatasetRecorder
+from .load_data import default_schema, prepare_collection
+from .metrics import registry
+from .pk_ledger import PKLedger
+from .segment_distribution import SegmentDistribution, Size
+from .sinks import InsertSink, add_sink_args, sink_from_flags
+
+
+def generate_n_segments(
+    name: str,
+    n: int = 20,
+    ledger: PKLedger | None = None,
+    dataset: str | None = None,
+    sink: InsertSink | None = None,
+):
+    """`dataset` records the vectors there for src.ground_truth, `sink` takes the segments
+    instead of the collection, no server needed
+    """
+    ten_segs = [Size(count=123, unit=Unit.MB) for i in range(n)]
     dist = SegmentDistribution(
         collection_name=name,
         size_dist=ten_segs,
     )
-    return generate_segments(dist)
-
+    if sink is None:
+        prepare_collection(name, 768, False)
+        connections.connect()
+        c = Collection(name)
+        if not c.has_index():
+            c.create_index("embeddings", {"index_type": "FLAT", "params": {"metric_type": "L2"}})
+        sink, schema = c.partition(dist.partition_name), c.schema
+    else:
+        schema = default_schema(768)
+
+    if dataset is None:
+        return generate_segments(dist, ledger=ledger, sink=sink, schema=schema)
+    recorder = DatasetRecorder(sink, dataset, schema)
+    try:
+        return generate_segments(dist, ledger=ledger, sink=recorder, schema=schema)
+    finally:
+        recorder.close()
+
+
+def sample_n_percent(all_pks: list[list] | PKLedger, n: int) -> list:
+    import numpy as np
 
-def delete_n_percent(name: str, all_pks: list[list] | None = None, n: int = 20, flush: bool = True):
+    if isinstance(all_pks, PKLedger):
+        return [all_pks.sample(i, n * 0.01) for i in range(len(all_pks))]
+    return [np.random.choice(pks, size=int(n * 0.01 * len(pks)), replace=False) for pks in all_pks]
+
+
+def delete_n_percent(
+    name: str,
+    all_pks: list[list] | PKLedger | None = None,
+    n: int = 20,
+    flush: bool = True,
+    deleted: PKLedger | None = None,
+    target: InsertSink | None = None,
+):
+    """`deleted` keeps the deleted pks, for the ground truth to leave them out. `target` takes
+    the deletes instead of the collection
+    """
     if n == 0:
         print("No deletion, return...")
         return 0
 
     import numpy as np
 
-    c = Collection(name)
-    c.load()
-    delete_count = 0
+    c = target
+    if c is None:
+        c = Collection(name)
+        with registry.stage("load"):
+            c.load()
 
-    if not isinstance(all_pks, list):
-        raise TypeError(f"pks should be a list, but got {type(all_pks)}")
+    if not isinstance(all_pks, list | PKLedger):
+        raise TypeError(f"pks should be a list or PKLedger, but got {type(all_pks)}")
 
-    for i, pks in enumerate(all_pks):
-        sample_pks = np.random.choice(pks, size=int(n * 0.01 * len(pks)), replace=False)
-        expr = f"pk in {sample_pks.tolist()}"
-        rt = c.delete(expr)
-        delete_count += rt.delete_count
+    def _delete(expr: str) -> int:
+        with registry.stage("delete"):
+            return c.delete(expr).delete_count
+
+    engine = DeleteEngine(_delete)
+    sample_pks = sample_n_percent(all_pks, n)
+    if deleted is not None:
+        for pks in sample_pks:
+            deleted.append(pks)
+    delete_count = engine.delete("pk", np.concatenate(sample_pks) if sample_pks else [])
 
     print(
         f"PK count = {sum(len(pks) for pks in all_pks)}, Delete percent = {n}%, Delete count = {delete_count}"
     )
     if flush is True:
         print("Delete done and flush done")
-        c.flush()
+        with registry.stage("flush"):
+            c.flush()
     return delete_count
 
 
-def delete_n_percent_to_files(name: str, all_pks: list[list] = None, n: int = 20):
-    import numpy as np
-
+def delete_n_percent_to_files(
+    name: str, all_pks: list[list] | PKLedger = None, n: int = 20, directory: str = "deleted_pks"
+):
     c = Collection(name)
     c.load()
 
-    if not isinstance(all_pks, list) or not isinstance(all_pks[0], list):
-        raise TypeError(f"pks should be a list, but got {type(all_pks)}")
+    if not isinstance(all_pks, list | PKLedger):
+        raise TypeError(f"pks should be a list or PKLedger, but got {type(all_pks)}")
 
-    for i, pks in enumerate(all_pks):
-        sample_pks = np.random.choice(pks, size=int(n * 0.01 * len(pks)), replace=False)
-        with Path(f"pks_{i}.txt").open("w") as f:
-            for pk in sample_pks:
-                f.write(f"{pk}\n")
+    deleted = PKLedger(directory, clear=True)
+    for sample_pks in sample_n_percent(all_pks, n):
+        deleted.append(sample_pks)
 
 
-def delete_all(name):
-    c = Collection(name)
-    c.load()
+def delete_all(name: str, target: InsertSink | None = None):
+    c = target
+    if c is None:
+        c = Collection(name)
+        c.load()
     ret = c.delete("pk > 1")
     c.flush()
     print(f"delete counts: {ret.delete_count}")
 
 
-def delete_by_files(name: str):
+def delete_by_files(name: str, directory: str = "deleted_pks"):
     c = Collection(name)
     c.load()
     del_count = 0
+    engine = DeleteEngine(lambda expr: c.delete(expr).delete_count)
 
-    for i in range(20):
-        with Path(f"pks_{i}.txt").open("r") as f:
-            pks = [int(line.strip()) for line in f.readlines()]
-        expr = f"pk in {pks}"
-        ret = c.delete(expr)
+    for pks in PKLedger(directory):
+        del_count += engine.delete("pk", pks)
         print(f"sampled pk counts: {len(pks)} and delete done")
-        del_count += ret.delete_count
         c.flush()
 
     print(f"delete counts: {del_count}")
@@ -102,14 +149,14 @@ def test_case_generate_20_segments_del_20perc():
 
 def test_case_generate_20_segments_del_20perc_to_files():
     name = "test_l0_compact_20_seg"
-    pks = generate_n_segments(name, 20)
+    pks = generate_n_segments(name, 20, PKLedger(f"pks/{name}", clear=True))
     delete_n_percent_to_files(name, pks, 20)
 
 
-def test_case_generate_20_segments_del_all():
+def test_case_generate_20_segments_del_all(sink: InsertSink | None = None):
     name = "test_l0_compact_20_seg_clean_all"
-    generate_n_segments(name, 20)
-    delete_all(name)
+    generate_n_segments(name, 20, sink=sink)
+    delete_all(name, sink)
 
 
 def test_case_generate_20_segments_no_del():
@@ -118,6 +165,11 @@ def test_case_generate_20_segments_no_del():
 
 
 if __name__ == "__main__":
-    connections.connect()
+    parser = argparse.ArgumentParser()
+    add_sink_args(parser)
+    flags = parser.parse_args()
+    sink = sink_from_flags(flags, default_schema(768))
+    if sink is None:
+        connections.connect()
     #  test_case_generate_20_segments_no_del()
-    test_case_generate_20_segments_del_all()
+    test_case_generate_20_segments_del_all(sink)
@@ -1,9 +1,9 @@
 from pymilvus import Collection, connections
 
-from generate_segment import SegmentDistribution, generate_segments
-
-# local
-from load_data import prepare_collection
+from .common_func import Unit
+from .generate_segment import generate_segments
+from .load_data import prepare_collection
+from .segment_distribution import SegmentDistribution, Size
 
 if __name__ == "__main__":
 
@@ -18,7 +18,7 @@ if __name__ == "__main__":
     else:
         test_p = c.partition(test_partition_name)
 
-    dist = [512, 512, 512, 512]
+    dist = [Size(count=512, unit=Unit.MB) for _ in range(4)]
     pks = generate_segments(
         SegmentDistribution(
             collection_name=name, partition_name=test_partition_name, size_dist=dist
@@ -1,5 +1,5 @@
 """
-python test_sync_compact.py -h
+python -m src.test_sync_compact -h
 
 options:
   -h, --help            show this help message and exit
@@ -10,17 +10,54 @@ options:
                         delete proportion
   -n NUM_ROWS, --num_rows NUM_ROWS
                         total num rows inserted
+  -np NUM_PARTITIONS, --num_partitions NUM_PARTITIONS
+                        total num partitions
+  --producers PRODUCERS
+                        pipelined insert: num of threads generating batches ahead, 0 to disable
+  --in_flight IN_FLIGHT
+                        pipelined insert: max num of inserts in flight
+  --journal JOURNAL     checkpoint journal path, default ./COLLECTION.journal
+  --resume              continue from the journal against the existing collection
+  --text_dist {fixed,uniform,normal}
+                        distribution of the VARCHAR lengths
+  --text_len TEXT_LEN   mean VARCHAR length, Bytes
+  --text_spread TEXT_SPREAD
+                        VARCHAR length +-/std
+  --text_min_len TEXT_MIN_LEN
+                        min VARCHAR length
+  --text_cardinality TEXT_CARDINALITY
+                        distinct VARCHAR values
+  --text_seed TEXT_SEED
+                        seed of the text pool
+  --sink {milvus,null,file,fake}
+                        null, file or fake to run without a server
+  --sink_dir SINK_DIR   directory of the file sink
 """
 
 import argparse
 
 from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections
 
-from generate_segment import estimate_size_by_count, stream_insert
+from .checkpoint import LoadJournal
+from .common_func import estimate_size_by_count
+from .dtype_registry import register, varchar_spec
+from .generate_segment import stream_insert
+from .insert_pipeline import PipelineConfig
+from .load_data import prepare_collection
+from .metrics import add_metrics_args, setup_metrics
+from .sinks import InsertSink, add_sink_args, sink_from_flags
+from .test_compact_n_segments import delete_n_percent
+from .text_dist import add_text_args, text_dist_from_flags
 
-# local
-from load_data import prepare_collection
-from test_compact_n_segments import delete_n_percent
+
+def text_schema(dim: int = 768) -> CollectionSchema:
+    """pk, the "text" partition key and the embeddings"""
+    fields = [
+        FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True),
+        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=256, is_partition_key=True),
+        FieldSchema(name="embeddings", dtype=DataType.FLOAT_VECTOR, dim=dim),
+    ]
+    return CollectionSchema(fields)
 
 
 def load_by_count_delete_n_per(
@@ -28,41 +65,81 @@ def load_by_count_delete_n_per(
     count: int = 10_000_000,
     num_partitions: int = 1024,
     delete_proportion: int = 20,
+    pipeline: PipelineConfig | None = None,
+    journal: LoadJournal | None = None,
+    resume: bool = False,
+    sink: InsertSink | None = None,
     **kwargs,
 ):
+    """With `journal`, every batch is checkpointed, `resume` skips the batches done already and
+    cleans up the interrupted one by its pk range. Batch i owns pks [i * batch_count, (i+1) * ...).
+    With `sink`, the batches go there instead of the collection, no server needed.
+    """
     dim = 768
-
-    fields = [
-        FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True),
-        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=256, is_partition_key=True),
-        FieldSchema(name="embeddings", dtype=DataType.FLOAT_VECTOR, dim=dim),
-    ]
-    schema = CollectionSchema(fields)
-
-    prepare_collection(name, dim, True, schema=schema, num_partitions=num_partitions, **kwargs)
-    c = Collection(name)
-    if not c.has_index():
-        c.create_index("embeddings", {"index_type": "FLAT", "params": {"metric_type": "L2"}})
+    batch = 100
+    batch_count = count // batch
+    params = {
+        "name": name,
+        "count": count,
+        "num_partitions": num_partitions,
+        "delete_proportion": delete_proportion,
+    }
+
+    schema = text_schema(dim)
+
+    if resume:
+        if journal is None or journal.params() != params:
+            msg = f"Cannot resume, journal params {journal and journal.params()} != {params}"
+            raise ValueError(msg)
+    elif journal is not None:
+        journal.start(**params)
+
+    c = sink
+    if c is None:
+        prepare_collection(
+            name, dim, not resume, schema=schema, num_partitions=num_partitions, **kwargs
+        )
+        c = Collection(name)
+        if not c.has_index():
+            c.create_index("embeddings", {"index_type": "FLAT", "params": {"metric_type": "L2"}})
 
     actual_count, actual_deleted_count = 0, 0
+    completed = {} if journal is None else journal.completed()
+    if resume:
+        for r in journal.interrupted():
+            rt = c.delete(f"pk >= {r['pk_start']} and pk < {r['pk_end']}")
+            print(f"Cleaned up interrupted batch {r['batch'] + 1}, deleted {rt.delete_count}")
+        print(f"Resume from {len(completed)}/{batch} batches done")
 
-    batch = 100
     size = estimate_size_by_count(count, schema)
     print(
         f"Try to load {count} num rows in dim={dim} in batch {batch}, size ~= {size / 1024 / 1024 / 1024:.2f}GB"
     )
     for i in range(batch):
+        if i in completed:
+            actual_count += completed[i]["rows"]
+            actual_deleted_count += completed[i]["deleted"]
+            continue
+
         print(f"------------------------------ batch {i + 1} -------------------------------")
-        batch_count = count // batch
+        pk_start, pk_end = i * batch_count, (i + 1) * batch_count
+        if journal is not None:
+            journal.begin_batch(i, pk_start, pk_end)
+
         batch_size = estimate_size_by_count(batch_count, schema)
-        batch_pks = stream_insert(c, schema, batch_size)
-        batch_deleted = delete_n_percent(name, batch_pks, n=delete_proportion, flush=False)
+        batch_pks = stream_insert(c, schema, batch_size, pipeline, pk_start=pk_start)
+        batch_deleted = delete_n_percent(
+            name, batch_pks, n=delete_proportion, flush=False, target=sink
+        )
 
-        actual_count += sum(len(pks) for pks in batch_pks)
+        batch_rows = sum(len(pks) for pks in batch_pks)
+        actual_count += batch_rows
         actual_deleted_count += batch_deleted
+        if journal is not None:
+            journal.complete_batch(i, pk_start, pk_end, batch_rows, batch_deleted)
 
     print("=============")
-    print(f"Actual loaded {count} num rows data, deleted count {actual_deleted_count}")
+    print(f"Actual loaded {actual_count} num rows data, deleted count {actual_deleted_count}")
 
 
 def test_load_by_count_multiprocess(name: str, count: int = 10_000_000, **kwargs):
@@ -115,13 +192,47 @@ if __name__ == "__main__":
     parser.add_argument(
         "-np", "--num_partitions", type=int, default="1024", help="total num partitions"
     )
+    parser.add_argument(
+        "--producers",
+        type=int,
+        default=0,
+        help="pipelined insert: num of threads generating batches ahead, 0 to disable",
+    )
+    parser.add_argument(
+        "--in_flight", type=int, default=2, help="pipelined insert: max num of inserts in flight"
+    )
+    parser.add_argument(
+        "--journal", type=str, help="checkpoint journal path, default ./COLLECTION.journal"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue from the journal against the existing collection",
+    )
+
+    add_text_args(parser)
+    add_metrics_args(parser)
+    add_sink_args(parser)
 
     flags = parser.parse_args()
+    setup_metrics(flags)
+    # the "text" partition key, generated and estimated with these lengths
+    register(DataType.VARCHAR, varchar_spec(text_dist_from_flags(flags)))
 
-    connections.connect(uri=flags.uri)
+    sink = sink_from_flags(flags, text_schema())
+    if sink is None:
+        connections.connect(uri=flags.uri)
     load_by_count_delete_n_per(
         name=flags.collection,
         count=flags.num_rows,
         num_partitions=flags.num_partitions,
         delete_proportion=flags.delete_proportion,
+        pipeline=(
+            PipelineConfig(producers=flags.producers, in_flight=flags.in_flight)
+            if flags.producers > 0
+            else None
+        ),
+        journal=LoadJournal(flags.journal or f"{flags.collection}.journal"),
+        resume=flags.resume,
+        sink=sink,
     )
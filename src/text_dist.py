@@ -0,0 +1,138 @@
+"""VARCHAR payloads cut from a preallocated pool of text, with a length distribution and
+a cardinality.
+
+A batch of strings is slices of one python str of random words at random offsets, so text
+heavy schemas cost a memcpy per row instead of formatting a python string each. With
+`cardinality` the rows are drawn from a vocabulary of that many strings, built once, like the
+tags or categories of real collections.
+
+    dist = TextDistribution(kind=LengthKind.NORMAL, mean_length=120, spread=40, cardinality=1000)
+    values = dist.generate(rng, count=5000, max_length=256)  # list of 5000 str
+    dist.expected_length(256)                                # what the size estimators charge
+
+The pool and the vocabulary only depend on `seed`, so every batch, thread and process draws
+from the same ones, while the rows of a batch come from the `rng` it's given.
+"""
+
+import argparse
+from enum import Enum
+
+import numpy as np
+from pydantic import BaseModel, PrivateAttr
+
+# 1MB of text plus room for a window of the longest VARCHAR(65535)
+POOL_NBYTES = (1 << 20) + 65_536
+# lengths sampled to estimate the mean of the distributions without a closed form
+_ESTIMATE_SAMPLES = 1 << 16
+
+
+class LengthKind(str, Enum):
+    FIXED = "fixed"
+    UNIFORM = "uniform"
+    NORMAL = "normal"
+
+
+class TextDistribution(BaseModel):
+    kind: LengthKind = LengthKind.FIXED
+    # lengths are in Bytes, the text is ascii, and clipped to [min_length, max_length]
+    mean_length: int = 256
+    # UNIFORM lengths are mean_length +- spread, NORMAL ones have it as standard deviation
+    spread: int = 0
+    min_length: int = 1
+    # num of distinct values, None cuts every row out of the pool
+    cardinality: int | None = None
+    seed: int = 0
+
+    _text: str | None = PrivateAttr(default=None)
+    _vocabularies: dict[int, np.ndarray] = PrivateAttr(default_factory=dict)
+    _expected: dict[int, float] = PrivateAttr(default_factory=dict)
+
+    def text(self) -> str:
+        """POOL_NBYTES of lowercase words, about one space every 6 chars, built once"""
+        if self._text is None:
+            rng = np.random.default_rng(self.seed)
+            pool = rng.integers(ord("a"), ord("z"), POOL_NBYTES, dtype=np.uint8, endpoint=True)
+            pool[rng.random(POOL_NBYTES) < 1 / 6] = ord(" ")
+            self._text = pool.tobytes().decode("ascii")
+        return self._text
+
+    def lengths(self, rng: np.random.Generator, count: int, max_length: int) -> np.ndarray:
+        if self.kind == LengthKind.FIXED:
+            lengths = np.full(count, self.mean_length)
+        elif self.kind == LengthKind.UNIFORM:
+            lo, hi = self.mean_length - self.spread, self.mean_length + self.spread
+            lengths = rng.integers(lo, hi, count, endpoint=True)
+        else:
+            lengths = np.rint(rng.normal(self.mean_length, self.spread, count))
+        return np.clip(lengths, min(self.min_length, max_length), max_length).astype(np.int64)
+
+    def expected_length(self, max_length: int) -> float:
+        """Mean Bytes per value in a VARCHAR(max_length)"""
+        if max_length not in self._expected:
+            if self.cardinality is not None:
+                vocabulary = self.vocabulary(max_length)
+                expected = float(np.mean([len(v) for v in vocabulary]))
+            elif self.kind == LengthKind.NORMAL:
+                rng = np.random.default_rng(self.seed)
+                expected = float(self.lengths(rng, _ESTIMATE_SAMPLES, max_length).mean())
+            else:
+                # every length of FIXED/UNIFORM is equally likely, their mean is exact
+                spread = self.spread if self.kind == LengthKind.UNIFORM else 0
+                lengths = np.arange(self.mean_length - spread, self.mean_length + spread + 1)
+                lo = min(self.min_length, max_length)
+                expected = float(np.clip(lengths, lo, max_length).mean())
+            self._expected[max_length] = expected
+        return self._expected[max_length]
+
+    def vocabulary(self, max_length: int) -> np.ndarray:
+        """The `cardinality` distinct-ish values of a VARCHAR(max_length) as an object array,
+        built once
+        """
+        if max_length not in self._vocabularies:
+            rng = np.random.default_rng([self.seed, max_length])
+            values = np.empty(self.cardinality, dtype=object)
+            values[:] = self._cut(rng, self.cardinality, max_length)
+            self._vocabularies[max_length] = values
+        return self._vocabularies[max_length]
+
+    def generate(self, rng: np.random.Generator, count: int, max_length: int) -> list[str]:
+        """`count` values, none longer than `max_length`"""
+        if self.cardinality is not None:
+            vocabulary = self.vocabulary(max_length)
+            return vocabulary[rng.integers(0, len(vocabulary), count)].tolist()
+        return self._cut(rng, count, max_length)
+
+    def _cut(self, rng: np.random.Generator, count: int, max_length: int) -> list[str]:
+        """Slices of the pool at random offsets, each one a single copy into the python str
+        insert needs anyway
+        """
+        text = self.text()
+        lengths = self.lengths(rng, count, max_length)
+        starts = rng.integers(0, len(text) - lengths + 1)
+        return [text[s : s + n] for s, n in zip(starts.tolist(), lengths.tolist(), strict=True)]
+
+
+def add_text_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--text_dist",
+        type=LengthKind,
+        choices=list(LengthKind),
+        default=LengthKind.FIXED,
+        help="distribution of the VARCHAR lengths",
+    )
+    parser.add_argument("--text_len", type=int, default=256, help="mean VARCHAR length, Bytes")
+    parser.add_argument("--text_spread", type=int, default=0, help="VARCHAR length +-/std")
+    parser.add_argument("--text_min_len", type=int, default=1, help="min VARCHAR length")
+    parser.add_argument("--text_cardinality", type=int, help="distinct VARCHAR values")
+    parser.add_argument("--text_seed", type=int, default=0, help="seed of the text pool")
+
+
+def text_dist_from_flags(flags: argparse.Namespace) -> TextDistribution:
+    return TextDistribution(
+        kind=flags.text_dist,
+        mean_length=flags.text_len,
+        spread=flags.text_spread,
+        min_length=flags.text_min_len,
+        cardinality=flags.text_cardinality,
+        seed=flags.text_seed,
+    )
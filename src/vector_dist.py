@@ -0,0 +1,108 @@
+"""Vector distributions closer to real embeddings than uniform [0, 1) noise.
+
+Uniform vectors have no cluster structure, so IVF lists come out evenly filled and every
+probe costs the same, which is not what an index sees in production. A Gaussian mixture
+gives skewed lists and near neighbors inside clusters, `normalize` gives the unit vectors
+COSINE/IP collections hold, and `duplicate_ratio` copies rows like re-ingested documents.
+
+    dist = VectorDistribution(kind=VectorKind.GAUSSIAN_MIXTURE, clusters=256, spread=0.2)
+    vectors = dist.generate(rng, count=5000, dim=128)  # float32 (5000, 128)
+
+Centroids only depend on `seed` and `dim`, so every batch, thread and process draws from the
+same mixture, while the rows of a batch come from the `rng` it's given.
+"""
+
+import argparse
+import logging
+from enum import Enum
+
+import numpy as np
+from pydantic import BaseModel, PrivateAttr
+
+logger = logging.getLogger("pymilvus")
+logger.setLevel(logging.INFO)
+
+
+class VectorKind(str, Enum):
+    UNIFORM = "uniform"
+    GAUSSIAN_MIXTURE = "gaussian_mixture"
+
+
+class VectorDistribution(BaseModel):
+    kind: VectorKind = VectorKind.GAUSSIAN_MIXTURE
+    clusters: int = 100
+    # within cluster standard deviation relative to the centroids' norm, ~1 blurs the clusters
+    spread: float = 0.2
+    # cluster weights go as 1 / (i + 1) ** skew, 0 makes equally sized clusters
+    skew: float = 0.0
+    # L2 normalize the vectors, for COSINE/IP collections
+    normalize: bool = False
+    # fraction of rows of a batch that are copies of other rows of it
+    duplicate_ratio: float = 0.0
+    seed: int = 0
+
+    _mixtures: dict[int, tuple[np.ndarray, np.ndarray]] = PrivateAttr(default_factory=dict)
+
+    def mixture(self, dim: int) -> tuple[np.ndarray, np.ndarray]:
+        """Centroids(clusters, dim) and the cdf of their weights, built once per dim"""
+        if dim not in self._mixtures:
+            rng = np.random.default_rng(self.seed)
+            # unit-ish norm whatever the dim, so `spread` means the same for all of them
+            centroids = rng.standard_normal((self.clusters, dim), dtype=np.float32)
+            centroids /= np.float32(np.sqrt(dim))
+            weights = 1.0 / np.arange(1, self.clusters + 1) ** self.skew
+            self._mixtures[dim] = (centroids, np.cumsum(weights / weights.sum()))
+        return self._mixtures[dim]
+
+    def generate(
+        self, rng: np.random.Generator, count: int, dim: int, out: np.ndarray | None = None
+    ) -> np.ndarray:
+        """float32 vectors of shape (count, dim), written into `out[:count]` if given"""
+        out = np.empty((count, dim), dtype=np.float32) if out is None else out[:count]
+        if self.kind == VectorKind.UNIFORM:
+            rng.random(dtype=np.float32, out=out)
+        else:
+            centroids, cdf = self.mixture(dim)
+            labels = np.minimum(np.searchsorted(cdf, rng.random(count)), self.clusters - 1)
+            rng.standard_normal(dtype=np.float32, out=out)
+            out *= np.float32(self.spread / np.sqrt(dim))
+            out += centroids[labels]
+
+        if self.normalize:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.maximum(norms, np.finfo(np.float32).tiny)
+
+        num_dups = int(count * self.duplicate_ratio)
+        if 0 < num_dups < count:
+            rows = rng.permutation(count)
+            dups, sources = rows[:num_dups], rows[num_dups:]
+            out[dups] = out[rng.choice(sources, num_dups)]
+        return out
+
+
+def add_vector_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--vector_dist",
+        type=VectorKind,
+        choices=list(VectorKind),
+        default=VectorKind.UNIFORM,
+        help="distribution of the vectors",
+    )
+    parser.add_argument("--clusters", type=int, default=100, help="num of mixture clusters")
+    parser.add_argument("--spread", type=float, default=0.2, help="cluster std to centroid norm")
+    parser.add_argument("--skew", type=float, default=0.0, help="cluster size skew, 0 for equal")
+    parser.add_argument("--normalize", action="store_true", help="L2 normalize the vectors")
+    parser.add_argument("--duplicates", type=float, default=0.0, help="ratio of duplicate rows")
+    parser.add_argument("--vector_seed", type=int, default=0, help="seed of the centroids")
+
+
+def vector_dist_from_flags(flags: argparse.Namespace) -> VectorDistribution:
+    return VectorDistribution(
+        kind=flags.vector_dist,
+        clusters=flags.clusters,
+        spread=flags.spread,
+        skew=flags.skew,
+        normalize=flags.normalize,
+        duplicate_ratio=flags.duplicates,
+        seed=flags.vector_seed,
+    )
@@ -1,19 +1,58 @@
-"""Giving a rate and target segment size, generating segment forever"""
+"""L0 compaction order test, run unattended for several rounds
 
+python test_l0_compaction.py --rounds 5 --mode trigger --output l0.json
+"""
+
+import argparse
+import json
 import logging
+import time
+from enum import Enum
+from pathlib import Path
 
+import numpy as np
 import pymilvus
 from pydantic import BaseModel, ConfigDict
 from pymilvus import DataType, MilvusClient
+from pymilvus.client.types import SegmentState
 
 from src.common_func import Unit
+from src.connection_pool import DEFAULT_POOL_SIZE, get_pool
+from src.delete_engine import DeleteEngine
 from src.generate_segment import generate_segment_by_size
+from src.metrics import add_metrics_args, registry, setup_metrics
 from src.segment_distribution import Size
 
 logger = logging.getLogger("pymilvus")
 logger.setLevel(logging.INFO)
 
 
+class CompactionMode(str, Enum):
+    TRIGGER = "trigger"  # compact(is_l0=True) and poll the job, needs no server config change
+    WAIT = "wait"  # wait for auto compaction to remove the L0 segments
+
+
+class RoundResult(BaseModel):
+    round: int
+    num_rows: int
+    expected: int
+    count: int
+    l0_segments: int
+    # seconds from the trigger(or the deletes' flush) until compaction was seen running,
+    # then until it was seen done, both as precise as `poll_interval`
+    start_delay: float
+    compaction: float
+    load: float
+    query: float
+
+    def __str__(self):
+        return (
+            f"Round {self.round}: count {self.count}/{self.expected} of {self.num_rows} rows, "
+            f"{self.l0_segments} L0 compacted after {self.start_delay:.2f}s in "
+            f"{self.compaction:.2f}s, load {self.load:.2f}s, query {self.query * 1000:.1f}ms"
+        )
+
+
 class TestCompactionOrder(BaseModel):
     """Test case:
     Pre: [Server] change trigger L0, when meet 2 L0, select the later one
@@ -30,22 +69,52 @@ class TestCompactionOrder(BaseModel):
         - disable auto compaction
     3. release load
         - assert count(*) == 20% * num_rows
+
+    `run` automates it for `rounds` rounds, in CompactionMode.TRIGGER step 2 is a manual L0
+    compaction instead of a server config change.
     """
 
     collection_name: str = "test_compaction_order"
     connection_config: dict = {"uri": "http://localhost:19530"}
     cschema: pymilvus.CollectionSchema | None = None
-    pks: list[int] = []
+    pks: np.ndarray = np.empty(0, dtype=np.int64)
+
+    pool_size: int = DEFAULT_POOL_SIZE
+
+    rounds: int = 1
+    mode: CompactionMode = CompactionMode.TRIGGER
+    poll_interval: float = 1.0
+    timeout: float = 600.0
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.connection_config = kwargs
+        # kwargs other than the fields above are connection params
+        conn_kwargs = {k: v for k, v in kwargs.items() if k not in type(self).model_fields}
+        if conn_kwargs:
+            self.connection_config = conn_kwargs
+
+    def client(self) -> MilvusClient:
+        return get_pool(self.pool_size, **self.connection_config).get()
 
-    def run(self, size: Size, drop_old: bool = True):
+    def run(self, size: Size, drop_old: bool = True) -> list[RoundResult]:
+        results = []
+        for i in range(self.rounds):
+            results.append(self.run_round(i, size, drop_old))
+            logger.info(str(results[-1]))
+
+        for field in ("start_delay", "compaction", "load", "query"):
+            values = [getattr(r, field) for r in results]
+            logger.info(
+                f"{field}: mean {np.mean(values):.3f}s, max {max(values):.3f}s "
+                f"over {len(values)} rounds"
+            )
+        return results
+
+    def run_round(self, number: int, size: Size, drop_old: bool = True) -> RoundResult:
         self.prep_collection(drop_old)
-        self.pks.extend(self.load_one_segment(size))
+        self.pks = self.load_one_segment(size)
 
         pct50, pct80 = int(len(self.pks) * 0.5), int(len(self.pks) * 0.8)
         first_del, second_del = self.pks[:pct50], self.pks[pct50:pct80]
@@ -53,39 +122,115 @@ class TestCompactionOrder(BaseModel):
         self.delete_by_pk(second_del)
         logger.info("Finish deletes, start tests")
 
-        c = MilvusClient(**self.connection_config)
-        left_count = int(0.2 * len(self.pks)) if len(self.pks) > 0 else int(201640 * 0.2)
-        while True:
-            got = input("Do you want to continue? (y/n)")
-            if got == "n":
-                return
+        expected = len(self.pks) - pct80
+        self.check_count(expected)
 
+        l0_segments = len(self.l0_segments())
+        start_delay, compaction = self.wait_for_compaction(l0_segments)
+
+        c = self.client()
+        start = time.perf_counter()
+        with registry.stage("load"):
             c.release_collection(self.collection_name)
             c.load_collection(self.collection_name)
-            count = c.query(self.collection_name, output_fields=["count(*)"])[0]["count(*)"]
-            logger.info(f"query count ={count}, left_count = {left_count}")
-            assert count == left_count
+        load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        count = self.check_count(expected)
+        query = time.perf_counter() - start
+        return RoundResult(
+            round=number,
+            num_rows=len(self.pks),
+            expected=expected,
+            count=count,
+            l0_segments=l0_segments,
+            start_delay=start_delay,
+            compaction=compaction,
+            load=load,
+            query=query,
+        )
+
+    def check_count(self, expected: int) -> int:
+        with registry.stage("query"):
+            got = self.client().query(self.collection_name, output_fields=["count(*)"])
+        count = got[0]["count(*)"]
+        logger.info(f"query count = {count}, expected = {expected}")
+        if count != expected:
+            msg = f"count(*) of {self.collection_name} is {count}, expected {expected}"
+            raise AssertionError(msg)
+        return count
+
+    def l0_segments(self) -> list:
+        return [
+            s
+            for s in self.client().list_persistent_segments(
+                self.collection_name, states=[SegmentState.Flushed]
+            )
+            if s.level_name == "L0"
+        ]
+
+    def wait_for_compaction(self, l0_before: int) -> tuple[float, float]:
+        """Returns the seconds until compaction started, and then until no L0 segment is left.
+
+        TRIGGER sees the start as the job executing, WAIT as the first L0 segment gone.
+        """
+        c = self.client()
+        job_id = None
+        if self.mode == CompactionMode.TRIGGER:
+            job_id = c.compact(self.collection_name, is_l0=True)
+            logger.info(f"Triggered L0 compaction {job_id} of {l0_before} L0 segments")
 
-    def load_one_segment(self, size: Size) -> list[int | str]:
-        c = MilvusClient(**self.connection_config)
-        pks = []
+        start = time.perf_counter()
+        started = None
+        while True:
+            elapsed = time.perf_counter() - start
+            job_done = True
+            if job_id is not None:
+                state = c.get_compaction_state(job_id)
+                job_done = state == "Completed"
+                if started is None and state == "Executing":
+                    started = elapsed
+
+            l0_left = len(self.l0_segments())
+            if started is None and l0_left < l0_before:
+                started = elapsed
+            if job_done and l0_left == 0:
+                started = elapsed if started is None else started
+                registry.observe("compaction", elapsed - started)
+                return started, elapsed - started
+
+            if elapsed > self.timeout:
+                msg = f"{l0_left} L0 segments of {self.collection_name} left after {elapsed:.0f}s"
+                raise TimeoutError(msg)
+            time.sleep(self.poll_interval)
+
+    def load_one_segment(self, size: Size) -> np.ndarray:
+        c = self.client()
+        pks = [np.empty(0, dtype=np.int64)]
         for data in generate_segment_by_size(size.as_bytes(), self.cschema):
             logger.info(f"Inserting {len(data)} rows")
-            pks.extend(c.insert(self.collection_name, data).get("ids"))
+            with registry.stage("insert", rows=len(data)):
+                rt = c.insert(self.collection_name, data)
+            pks.append(np.asarray(rt.get("ids"), dtype=np.int64))
         logger.info(f"Flush {self.collection_name}")
-        c.flush(self.collection_name)
-        return pks
+        with registry.stage("flush"):
+            c.flush(self.collection_name)
+        return np.concatenate(pks)
+
+    def delete_by_pk(self, pks: np.ndarray):
+        c = self.client()
 
-    def delete_by_pk(self, pks: list[int | str]):
-        c = MilvusClient(**self.connection_config)
-        expr = f"id in {pks}"
+        def _delete(expr: str) -> int:
+            with registry.stage("delete"):
+                return c.delete(self.collection_name, filter=expr)["delete_count"]
 
-        count = c.delete(self.collection_name, filter=expr)["delete_count"]
+        count = DeleteEngine(_delete).delete("id", pks)
         logger.info(f"Delete count {count}")
-        c.flush(self.collection_name)
+        with registry.stage("flush"):
+            c.flush(self.collection_name)
 
     def prep_collection(self, drp_old: bool):
-        c = MilvusClient(**self.connection_config)
+        c = self.client()
         if c.has_collection(self.collection_name):
             c.drop_collection(self.collection_name)
 
@@ -107,6 +252,28 @@ class TestCompactionOrder(BaseModel):
 
 
 if __name__ == "__main__":
-    runner = TestCompactionOrder()
-    size = Size(count=100, unit=Unit.MB)
-    runner.run(size, False)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", type=str, default="http://localhost:19530", help="uri to connect")
+    parser.add_argument("-s", "--segment_size", type=int, default=100, help="segment size in MB")
+    parser.add_argument("--rounds", type=int, default=1, help="num of rounds")
+    parser.add_argument(
+        "--mode", type=CompactionMode, choices=list(CompactionMode), default=CompactionMode.TRIGGER
+    )
+    parser.add_argument("--poll_interval", type=float, default=1.0, help="seconds between polls")
+    parser.add_argument("--timeout", type=float, default=600, help="max seconds to compact")
+    parser.add_argument("-o", "--output", type=str, help="save the round results as json")
+    add_metrics_args(parser)
+
+    flags = parser.parse_args()
+    setup_metrics(flags)
+    runner = TestCompactionOrder(
+        uri=flags.uri,
+        rounds=flags.rounds,
+        mode=flags.mode,
+        poll_interval=flags.poll_interval,
+        timeout=flags.timeout,
+    )
+    results = runner.run(Size(count=flags.segment_size, unit=Unit.MB), False)
+    if flags.output:
+        with Path(flags.output).open("w") as f:
+            json.dump([r.model_dump() for r in results], f, indent=2)